@@ -0,0 +1,257 @@
+"""
+Offline reanalysis of recorded lectures.
+
+Runs the live pipeline's per-chunk analysis over whole recordings, faster
+than real time: chunks are analysed on a process pool, transcription
+batches go to a configurable backend on a thread pool, and each lecture's
+metric timeline is written to OUTPUT_DIR/<lecture>.jsonl (one line per
+chunk). Use it to backfill analytics or to check DSP changes against a
+semester of audio.
+
+Recordings (in RECORDINGS_DIR):
+- <name>.wav: WAV files (mixed down to mono)
+- <lecture_id>.idx + <lecture_id>.pcm: raw audio archives (see AUDIO_ARCHIVE_DIR)
+
+Transcription backends (--transcriber):
+- none: no transcription (filler rate and WPM stay empty)
+- whisper: OpenAI Whisper (needs OPENAI_API_KEY)
+- package.module:function: any callable taking (audio, sample_rate) and returning text
+
+Usage:
+    python ai_assistant/reanalyze.py RECORDINGS_DIR OUTPUT_DIR [--workers 8] [--transcriber whisper]
+"""
+
+import argparse
+import importlib
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import soundfile as sf
+
+from voice_pipeline.audio_archive import AudioArchiveReader
+from voice_pipeline.fast_dsp import analyze_voice_chunk, calculate_filler_rate, calculate_wpm
+
+# Defaults match the live audio handler
+CHUNK_DURATION = 2.0  # seconds per analysed chunk
+TRANSCRIPTION_BATCH_DURATION = 10.0  # seconds of audio per transcription request
+PCM16_SCALE = 1.0 / 32768.0
+
+
+class Recording:
+    """One lecture's audio on disk (picklable, so workers can read their own chunks)."""
+
+    def __init__(self, name: str, kind: str, path: str, sample_rate: int, samples: int):
+        self.name = name
+        self.kind = kind  # "wav" or "archive"
+        self.path = path  # WAV file, or the archive's directory
+        self.sample_rate = sample_rate
+        self.samples = samples
+
+    @property
+    def duration(self) -> float:
+        return self.samples / self.sample_rate if self.sample_rate else 0.0
+
+    def read(self, start: int, stop: int) -> np.ndarray:
+        """Float32 mono samples [start, stop)."""
+        if self.kind == "wav":
+            audio, _ = sf.read(self.path, start=start, stop=stop, dtype='float32', always_2d=True)
+            return audio.mean(axis=1) if audio.shape[1] > 1 else audio[:, 0]
+        samples, _ = _archive_reader(self.path, self.name).read()
+        return samples[start:stop].astype(np.float32) * np.float32(PCM16_SCALE)
+
+
+# Archives opened in this process (each worker maps a file once)
+_archive_readers: Dict[Tuple[str, str], AudioArchiveReader] = {}
+
+
+def _archive_reader(directory: str, lecture_id: str) -> AudioArchiveReader:
+    reader = _archive_readers.get((directory, lecture_id))
+    if reader is None:
+        reader = _archive_readers[(directory, lecture_id)] = AudioArchiveReader(directory, lecture_id)
+    return reader
+
+
+def find_recordings(directory: str) -> List[Recording]:
+    """WAV files and audio archives in a directory, sorted by name."""
+    recordings = []
+    for entry in sorted(os.listdir(directory)):
+        name, extension = os.path.splitext(entry)
+        path = os.path.join(directory, entry)
+        try:
+            if extension.lower() == ".wav":
+                info = sf.info(path)
+                recordings.append(Recording(name, "wav", path, info.samplerate, info.frames))
+            elif extension == ".idx" and os.path.exists(os.path.join(directory, name + ".pcm")):
+                reader = _archive_reader(directory, name)
+                _, sample_rate = reader.read()  # Raises for mixed sample rates
+                recordings.append(Recording(name, "archive", directory, sample_rate, reader.total_samples))
+        except (OSError, RuntimeError, ValueError) as e:
+            print(f"Skipping {entry}: {e}", file=sys.stderr)
+    return recordings
+
+
+def load_transcriber(spec: str) -> Optional[Callable[[np.ndarray, int], str]]:
+    """The transcription backend for --transcriber (None for "none")."""
+    if spec == "none":
+        return None
+    if spec == "whisper":
+        from voice_pipeline.whisper_transcriber import transcribe_audio_chunk
+        return lambda audio, sr: transcribe_audio_chunk(audio, sr)
+    module_name, _, function_name = spec.partition(":")
+    if not function_name:
+        raise ValueError(f"unknown transcriber {spec!r} (use none, whisper or module:function)")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def _analyze_chunk(task: Tuple[Recording, int, int]) -> Dict:
+    """Process pool job: fast DSP metrics for one chunk (no transcript yet)."""
+    recording, start, stop = task
+    audio = recording.read(start, stop)
+    return analyze_voice_chunk(audio, "", len(audio) / recording.sample_rate, recording.sample_rate)
+
+
+def _transcribe_batch(transcriber: Callable[[np.ndarray, int], str], recording: Recording,
+                      start: int, stop: int) -> str:
+    """Thread pool job: transcript of one batch (empty if the backend fails)."""
+    try:
+        return transcriber(recording.read(start, stop), recording.sample_rate).strip()
+    except Exception as e:
+        print(f"Transcription failed for {recording.name} at {start / recording.sample_rate:.0f}s: {e}",
+              file=sys.stderr)
+        return ""
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class LecturePlan:
+    """Chunk and batch boundaries of one recording."""
+
+    def __init__(self, recording: Recording, chunk_seconds: float, batch_seconds: float):
+        self.recording = recording
+        chunk_size = max(int(recording.sample_rate * chunk_seconds), 1)
+        self.chunks = [(start, min(start + chunk_size, recording.samples))
+                       for start in range(0, recording.samples, chunk_size)]
+        # Like the live pipeline, a batch closes on the first chunk that reaches the batch duration
+        self.chunks_per_batch = max(math.ceil(batch_seconds / chunk_seconds), 1)
+        self.batches = [(self.chunks[i][0], self.chunks[min(i + self.chunks_per_batch, len(self.chunks)) - 1][1])
+                        for i in range(0, len(self.chunks), self.chunks_per_batch)]
+        self.transcripts: List[Future] = []
+
+
+def write_timeline(plan: LecturePlan, metrics: List[Dict], transcripts: Optional[List[str]],
+                   output_dir: str) -> None:
+    """Write a lecture's per-chunk metrics (and transcript, if any) to the output directory."""
+    recording = plan.recording
+    if transcripts is not None:
+        # Filler rate and WPM come from the batch transcript, shared by the batch's chunks
+        for number, (start, stop) in enumerate(plan.batches):
+            filler = calculate_filler_rate(transcripts[number])
+            wpm = calculate_wpm(transcripts[number], (stop - start) / recording.sample_rate)
+            for chunk_metrics in metrics[number * plan.chunks_per_batch:(number + 1) * plan.chunks_per_batch]:
+                chunk_metrics['filler'] = filler.copy()
+                chunk_metrics['wpm'] = wpm.copy()
+        with open(os.path.join(output_dir, f"{recording.name}.txt"), "w", encoding="utf-8") as transcript_file:
+            transcript_file.write(" ".join(text for text in transcripts if text))
+
+    with open(os.path.join(output_dir, f"{recording.name}.jsonl"), "w", encoding="utf-8") as timeline:
+        for index, ((start, _), chunk_metrics) in enumerate(zip(plan.chunks, metrics)):
+            chunk_metrics['timestamp'] = round(start / recording.sample_rate, 3)  # Seconds into the lecture
+            line = {'chunk': index, 'batch': index // plan.chunks_per_batch, **chunk_metrics}
+            timeline.write(json.dumps(line, default=_json_default) + "\n")
+
+
+def reanalyze(recordings: List[Recording], output_dir: str, workers: int,
+              transcriber: Optional[Callable[[np.ndarray, int], str]], transcribe_workers: int = 2,
+              chunk_seconds: float = CHUNK_DURATION, batch_seconds: float = TRANSCRIPTION_BATCH_DURATION) -> Dict:
+    """
+    Reanalyse recordings and write their timelines.
+
+    Returns:
+        Summary with audio seconds, wall seconds and the real-time factor, overall and per lecture
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    plans = [LecturePlan(recording, chunk_seconds, batch_seconds) for recording in recordings]
+    summary = {'lectures': {}, 'workers': workers, 'transcriber': transcriber is not None}
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as dsp_pool, \
+            ThreadPoolExecutor(max_workers=transcribe_workers) as transcribe_pool:
+        # Queue every transcription up front; they are network-bound and run alongside the DSP
+        if transcriber is not None:
+            for plan in plans:
+                plan.transcripts = [transcribe_pool.submit(_transcribe_batch, transcriber, plan.recording, start, stop)
+                                    for start, stop in plan.batches]
+
+        for plan in plans:
+            lecture_started = time.perf_counter()
+            tasks = [(plan.recording, start, stop) for start, stop in plan.chunks]
+            chunksize = max(len(tasks) // (workers * 4), 1)
+            metrics = list(dsp_pool.map(_analyze_chunk, tasks, chunksize=chunksize))
+            transcripts = [future.result() for future in plan.transcripts] if transcriber is not None else None
+            write_timeline(plan, metrics, transcripts, output_dir)
+
+            seconds = time.perf_counter() - lecture_started
+            audio_seconds = plan.recording.duration
+            summary['lectures'][plan.recording.name] = {
+                'audio_seconds': round(audio_seconds, 1),
+                'wall_seconds': round(seconds, 2),
+                'realtime_factor': round(audio_seconds / seconds, 1) if seconds > 0 else None,
+                'chunks': len(plan.chunks),
+            }
+            print(f"✓ {plan.recording.name}: {audio_seconds / 60:.1f} min of audio in {seconds:.1f}s "
+                  f"({summary['lectures'][plan.recording.name]['realtime_factor']}x real time)")
+
+    wall_seconds = time.perf_counter() - started
+    audio_seconds = sum(plan.recording.duration for plan in plans)
+    summary.update({
+        'audio_seconds': round(audio_seconds, 1),
+        'wall_seconds': round(wall_seconds, 2),
+        'realtime_factor': round(audio_seconds / wall_seconds, 1) if wall_seconds > 0 else None,
+    })
+    with open(os.path.join(output_dir, "summary.json"), "w", encoding="utf-8") as summary_file:
+        json.dump(summary, summary_file, indent=2)
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Reanalyse recorded lectures faster than real time.")
+    parser.add_argument("recordings", help="Directory of WAV files and/or audio archives")
+    parser.add_argument("output", help="Directory for the metric timelines")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="DSP worker processes")
+    parser.add_argument("--transcriber", default="none", help="none, whisper or module:function (default: none)")
+    parser.add_argument("--transcribe-workers", type=int, default=2, help="Concurrent transcription requests")
+    parser.add_argument("--chunk-seconds", type=float, default=CHUNK_DURATION)
+    parser.add_argument("--batch-seconds", type=float, default=TRANSCRIPTION_BATCH_DURATION)
+    args = parser.parse_args(argv)
+
+    recordings = find_recordings(args.recordings)
+    if not recordings:
+        print(f"No recordings found in {args.recordings}", file=sys.stderr)
+        return 1
+    transcriber = load_transcriber(args.transcriber)
+
+    print("=" * 60)
+    print(f"Reanalysing {len(recordings)} recordings "
+          f"({sum(r.duration for r in recordings) / 3600:.1f} h of audio, {args.workers} workers)")
+    print("=" * 60)
+    summary = reanalyze(recordings, args.output, args.workers, transcriber, args.transcribe_workers,
+                        args.chunk_seconds, args.batch_seconds)
+    print(f"\nDone: {summary['audio_seconds'] / 3600:.2f} h of audio in {summary['wall_seconds']:.1f}s "
+          f"({summary['realtime_factor']}x real time)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
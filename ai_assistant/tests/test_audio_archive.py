@@ -0,0 +1,80 @@
+"""
+Tests for the memory-mapped raw audio archive.
+"""
+
+import sys
+import os
+import tempfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from voice_pipeline.audio_archive import AudioArchiveReader, AudioArchiveWriter, archive_paths
+
+
+def test_round_trip_and_time_slice():
+    """Chunks read back as written, and a time range slices across chunk boundaries."""
+    with tempfile.TemporaryDirectory() as directory:
+        writer = AudioArchiveWriter(directory, "lecture")
+        first = np.arange(100, dtype='<i2')
+        second = np.arange(100, 200, dtype='<i2')
+        writer.append(first.tobytes(), 100, ended_at=1001.0)
+        writer.append(second, 100, ended_at=1002.0)
+        writer.close()
+
+        # The preallocated tail is trimmed on close
+        assert os.path.getsize(archive_paths(directory, "lecture")[0]) == 400
+
+        with AudioArchiveReader(directory, "lecture") as reader:
+            assert len(reader) == 2
+            assert reader.start == 1000.0 and reader.end == 1002.0
+            samples, rate = reader.read(1000.5, 1001.5)
+            assert rate == 100
+            assert np.array_equal(samples, np.arange(50, 150))
+            chunk, _, start = reader.chunk(1)
+            assert start == 1001.0 and np.array_equal(chunk, second)
+    print("✓ Archive round trip and time slicing")
+
+
+def test_float_audio_is_clipped_to_int16():
+    """Float chunks are stored as clipped Int16."""
+    with tempfile.TemporaryDirectory() as directory:
+        writer = AudioArchiveWriter(directory, "lecture")
+        writer.append(np.array([0.0, 0.5, 2.0, -2.0], dtype=np.float32), 16000)
+        writer.close()
+
+        with AudioArchiveReader(directory, "lecture") as reader:
+            samples, _ = reader.read()
+            assert samples.tolist() == [0, 16383, 32767, -32767]
+    print("✓ Float audio clipped to Int16")
+
+
+def test_reopen_continues_after_last_indexed_chunk():
+    """An archive left unclosed (crash) is continued after its last complete index record."""
+    with tempfile.TemporaryDirectory() as directory:
+        writer = AudioArchiveWriter(directory, "lecture")
+        writer.append(np.ones(10, dtype='<i2'), 10, ended_at=11.0)
+        writer.sync()
+        # Simulate a crash: a half-written index record, file never trimmed
+        with open(archive_paths(directory, "lecture")[1], "ab") as index:
+            index.write(b"\x01\x02\x03")
+
+        reopened = AudioArchiveWriter(directory, "lecture")
+        assert reopened.samples == 10 and reopened.chunks == 1
+        reopened.append(np.full(5, 2, dtype='<i2'), 10, ended_at=12.0)
+        reopened.close()
+
+        with AudioArchiveReader(directory, "lecture") as reader:
+            assert len(reader) == 2
+            samples, _ = reader.read()
+            assert samples.tolist() == [1] * 10 + [2] * 5
+    print("✓ Reopened archive continues after the last chunk")
+
+
+if __name__ == "__main__":
+    test_round_trip_and_time_slice()
+    test_float_audio_is_clipped_to_int16()
+    test_reopen_continues_after_last_indexed_chunk()
+    print("\nAll audio archive tests passed")
@@ -0,0 +1,99 @@
+"""
+Tests for the student broadcast hub (per-socket send queues).
+"""
+
+import sys
+import os
+import asyncio
+
+# Add the repository root to path (the hub lives in the app package)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.websockets.broadcast import DROP, EVICT, EVICT_CLOSE_CODE, BroadcastHub
+
+
+class FakeSocket:
+    """Records sent messages; each send takes `delay` seconds (or blocks until released)."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.sent = []
+        self.closed_with = None
+        self.release = asyncio.Event()
+
+    async def send_text(self, text: str) -> None:
+        if self.delay is None:
+            await self.release.wait()
+        else:
+            await asyncio.sleep(self.delay)
+        self.sent.append(text)
+
+    async def close(self, code: int = 1000) -> None:
+        self.closed_with = code
+
+
+def test_full_queue_drop_vs_evict():
+    """DROP skips the message for a stuck socket; EVICT closes and removes it. Others get everything."""
+    async def run():
+        hub = BroadcastHub(queue_size=2, send_timeout=10.0)
+        fast, stuck = FakeSocket(), FakeSocket(delay=None)
+        hub.add("lecture", fast)
+        hub.add("lecture", stuck)
+        await asyncio.sleep(0)
+
+        # The stuck socket's writer holds message 0; 1 and 2 fill its queue, 3 overflows
+        for i in range(4):
+            hub.broadcast("lecture", {"tick": i}, policy=DROP)
+            await asyncio.sleep(0.01)
+        assert len(fast.sent) == 4
+        assert hub.dropped == 1 and hub.connections("lecture") == 2
+
+        hub.broadcast("lecture", {"question": 1}, policy=EVICT)
+        await asyncio.sleep(0.01)
+        assert hub.evicted == 1 and hub.connections("lecture") == 1
+        assert stuck.closed_with == EVICT_CLOSE_CODE
+        assert len(fast.sent) == 5
+        hub.discard("lecture", fast)
+
+    asyncio.run(run())
+    print("✓ Full queue: DROP skips, EVICT removes")
+
+
+def test_send_timeout_removes_socket():
+    """A send that takes longer than send_timeout evicts the socket."""
+    async def run():
+        hub = BroadcastHub(queue_size=4, send_timeout=0.05)
+        slow = FakeSocket(delay=1.0)
+        hub.add("lecture", slow)
+        hub.broadcast("lecture", {"tick": 0}, policy=DROP)
+        await asyncio.sleep(0.1)
+        assert hub.connections("lecture") == 0
+        assert slow.closed_with == EVICT_CLOSE_CODE
+        assert hub.broadcast("lecture", {"tick": 1}) == 0
+
+    asyncio.run(run())
+    print("✓ Send timeout removes the socket")
+
+
+def test_discard_cancels_writer():
+    """discard() removes the socket and cancels its writer task."""
+    async def run():
+        hub = BroadcastHub()
+        socket = FakeSocket()
+        hub.add("lecture", socket)
+        writer = hub._lectures["lecture"][socket].task
+        hub.discard("lecture", socket)
+        await asyncio.sleep(0)
+        assert writer.cancelled()
+        assert hub.connections("lecture") == 0
+        hub.discard("lecture", socket)  # Already removed: no-op
+
+    asyncio.run(run())
+    print("✓ discard cancels the writer")
+
+
+if __name__ == "__main__":
+    test_full_queue_drop_vs_evict()
+    test_send_timeout_removes_socket()
+    test_discard_cancels_writer()
+    print("\nAll broadcast hub tests passed")
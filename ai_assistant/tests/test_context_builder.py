@@ -0,0 +1,100 @@
+"""
+Tests for the token-budgeted prompt context builder.
+"""
+
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tiktoken
+
+from voice_pipeline.context_builder import (
+    ContextSection,
+    _get_encoding,
+    build_context,
+    count_tokens,
+    trim_to_tokens
+)
+
+
+TRANSCRIPT = (
+    "Today we cover binary search trees. "
+    "Each node has at most two children. "
+    "The left subtree holds smaller keys. "
+    "The right subtree holds larger keys."
+)
+
+
+def test_trim_keeps_recent_sentences():
+    """Tail trimming keeps whole sentences from the end."""
+    last = "The right subtree holds larger keys."
+    budget = count_tokens(last) + count_tokens("The left subtree holds smaller keys.") + 1
+    
+    text, used = trim_to_tokens(TRANSCRIPT, budget, keep='tail')
+    
+    assert text == "The left subtree holds smaller keys. The right subtree holds larger keys."
+    assert used <= budget
+    print("✓ Tail trim test passed\n")
+
+
+def test_trim_keeps_head_for_slides():
+    """Head trimming keeps the first sentences."""
+    text, _ = trim_to_tokens(TRANSCRIPT, count_tokens("Today we cover binary search trees."), keep='head')
+    
+    assert text == "Today we cover binary search trees."
+    print("✓ Head trim test passed\n")
+
+
+def test_build_context_respects_budget():
+    """Required sections are kept whole and the rest share the remaining budget."""
+    instructions = "Write one question."
+    budget = count_tokens(instructions) + 12
+    
+    result = build_context([
+        ContextSection('instructions', instructions, required=True),
+        ContextSection('transcript', TRANSCRIPT, keep='tail'),
+    ], budget)
+    
+    assert result['instructions'] == instructions
+    assert result['transcript'].endswith("larger keys.")
+    assert count_tokens(result['transcript']) <= 12
+    print("✓ Context budget test passed\n")
+
+
+def test_counts_use_the_model_tokenizer():
+    """With tiktoken installed, counts and hard cuts are exact tokenizer results."""
+    encoding = tiktoken.encoding_for_model("gpt-4")
+    assert _get_encoding("gpt-4") is not None
+    assert count_tokens(TRANSCRIPT) == len(encoding.encode(TRANSCRIPT))
+    
+    # A single sentence over budget is cut on token boundaries
+    sentence = "Balanced trees keep lookups logarithmic because rotations bound their height"
+    text, used = trim_to_tokens(sentence, 5, keep='head')
+    assert text == encoding.decode(encoding.encode(sentence)[:5])
+    assert used == len(encoding.encode(text)) <= 5
+    print("✓ Exact tokenizer test passed\n")
+
+
+def test_fallback_without_tiktoken():
+    """Without an encoding, counts fall back to ~4 characters per token."""
+    _get_encoding.cache_clear()
+    real_tiktoken = sys.modules.get('tiktoken')
+    sys.modules['tiktoken'] = None  # Makes "import tiktoken" raise ImportError
+    try:
+        assert count_tokens("abcdefgh") == 2
+        assert count_tokens("abcdefghi") == 3
+    finally:
+        sys.modules['tiktoken'] = real_tiktoken
+        _get_encoding.cache_clear()
+    print("✓ Fallback estimate test passed\n")
+
+
+if __name__ == "__main__":
+    test_trim_keeps_recent_sentences()
+    test_trim_keeps_head_for_slides()
+    test_build_context_respects_budget()
+    test_counts_use_the_model_tokenizer()
+    test_fallback_without_tiktoken()
+    print("✓ All context builder tests passed!")
@@ -0,0 +1,81 @@
+"""
+Tests for the shared executor pools.
+"""
+
+import sys
+import os
+import asyncio
+import threading
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from voice_pipeline.executor_pool import ExecutorPool
+
+
+def test_runs_off_the_event_loop():
+    """Jobs run in a pool thread and their results come back."""
+    pool = ExecutorPool("test", workers=2, queue_limit=2)
+
+    async def main():
+        name = await pool.run(lambda: threading.current_thread().name)
+        total = await pool.run(sum, [1, 2, 3])
+        return name, total
+
+    name, total = asyncio.run(main())
+    assert name.startswith("test-pool")
+    assert total == 6
+    assert pool.completed == 2 and pool.failed == 0
+    pool.shutdown()
+    print("✓ Jobs run in pool threads")
+
+
+def test_queue_limit_holds_callers_back():
+    """No more than workers + queue_limit jobs are admitted at once."""
+    pool = ExecutorPool("bounded", workers=1, queue_limit=1)
+    peak = {"pending": 0}
+
+    def job():
+        peak["pending"] = max(peak["pending"], pool.pending)
+        time.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*(pool.run(job) for _ in range(6)))
+
+    asyncio.run(main())
+    assert peak["pending"] <= 2
+    assert pool.throttled > 0
+    assert pool.completed == 6
+    pool.shutdown()
+    print("✓ Queue limit holds callers back")
+
+
+def test_errors_and_shutdown():
+    """Job errors reach the caller; a shut down pool refuses new jobs."""
+    pool = ExecutorPool("failing", workers=1, queue_limit=0)
+
+    async def main():
+        try:
+            await pool.run(lambda: 1 / 0)
+        except ZeroDivisionError:
+            pass
+        else:
+            raise AssertionError("error was swallowed")
+        pool.shutdown()
+        try:
+            await pool.run(sum, [])
+        except RuntimeError:
+            return True
+        return False
+
+    assert asyncio.run(main())
+    assert pool.failed == 1
+    print("✓ Errors propagate and shutdown refuses new jobs")
+
+
+if __name__ == "__main__":
+    test_runs_off_the_event_loop()
+    test_queue_limit_holds_callers_back()
+    test_errors_and_shutdown()
+    print("✓ All executor pool tests passed!")
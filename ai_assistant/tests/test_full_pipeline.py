@@ -150,6 +150,26 @@ async def test_pipeline_with_mock_data():
           f"{summary['sentiment_checkpoints']} sentiment checkpoints")
 
 
+def test_transcript_window():
+    """Recent-window query covers ~max_duration and old segments are evicted by age."""
+    pipeline = VoicePipelineManager(sentiment_interval=5.0, transcript_window=60.0)
+    
+    for i in range(10):
+        pipeline.add_transcript(f"segment {i}", duration_seconds=5.0)
+    
+    # 15s window -> last three 5s segments, in order
+    assert pipeline._get_recent_transcript(max_duration=15.0) == "segment 7 segment 8 segment 9"
+    
+    # Age every segment past the window; the next append evicts them
+    for segment in pipeline.transcript_segments:
+        segment['received_at'] -= 120.0
+    pipeline.add_transcript("fresh", duration_seconds=5.0)
+    
+    assert len(pipeline.transcript_segments) == 1
+    assert pipeline._get_recent_transcript(max_duration=15.0) == "fresh"
+    print("✓ Transcript window test passed\n")
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Test voice pipeline')
     parser.add_argument('--audio-file', type=str, help='Path to audio file for testing')
@@ -0,0 +1,59 @@
+"""
+Tests for the transcription batching ring buffer.
+"""
+
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from voice_pipeline.ring_buffer import AudioRingBuffer
+
+
+def test_contiguous_batch_is_a_view():
+    """A batch that doesn't wrap is returned without copying."""
+    ring = AudioRingBuffer(10)
+    ring.write(np.arange(4, dtype=np.float32))
+    ring.write(np.arange(4, 7, dtype=np.float32))
+
+    batch = ring.peek()
+    assert np.array_equal(batch, np.arange(7, dtype=np.float32))
+    assert np.shares_memory(batch, ring._data)
+    print("✓ Contiguous batch returned as a view")
+
+
+def test_wrapped_batch_keeps_order():
+    """After consuming a batch, the next one may wrap and still reads in order."""
+    ring = AudioRingBuffer(8)
+    ring.write(np.arange(6, dtype=np.float32))
+    ring.consume()
+    ring.write(np.arange(10, 15, dtype=np.float32))
+
+    assert len(ring) == 5
+    assert np.array_equal(ring.peek(), np.arange(10, 15, dtype=np.float32))
+    print("✓ Wrapped batch read in order")
+
+
+def test_overflow_drops_oldest():
+    """Writing past capacity overwrites the oldest unread samples."""
+    ring = AudioRingBuffer(5)
+    ring.write(np.arange(4, dtype=np.float32))
+    ring.write(np.arange(4, 7, dtype=np.float32))
+
+    assert len(ring) == 5
+    assert ring.overwritten == 2
+    assert np.array_equal(ring.peek(), np.arange(2, 7, dtype=np.float32))
+
+    ring.write(np.arange(100, 112, dtype=np.float32))
+    assert np.array_equal(ring.peek(), np.arange(107, 112, dtype=np.float32))
+    print("✓ Overflow keeps the newest samples")
+
+
+if __name__ == "__main__":
+    test_contiguous_batch_is_a_view()
+    test_wrapped_batch_keeps_order()
+    test_overflow_drops_oldest()
+    print("\nAll ring buffer tests passed")
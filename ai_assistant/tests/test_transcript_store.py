@@ -0,0 +1,47 @@
+"""
+Tests for the segment-list transcript store.
+"""
+
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from voice_pipeline.transcript_store import TranscriptStore
+
+
+def _store():
+    store = TranscriptStore()
+    store.append("Today we cover trees.", end=110.0, duration=10.0)
+    store.append("A node has two children.", end=120.0, duration=10.0)
+    store.append("Leaves have none.", end=130.0, duration=10.0)
+    return store
+
+
+def test_append_and_join():
+    """Segments are numbered and joined with single spaces."""
+    store = _store()
+    expected = "Today we cover trees. A node has two children. Leaves have none."
+    assert store.text() == expected
+    assert store.char_count == len(expected)
+    assert store.last_seq == 3
+    assert store.append("   ") is None
+    print("✓ Append and join test passed")
+
+
+def test_tail_reads():
+    """Tail by characters and by seconds only return the end of the transcript."""
+    store = _store()
+    assert store.tail_chars(17) == "Leaves have none."
+    assert store.tail_chars(1000) == store.text()
+    assert store.tail_seconds(15) == "A node has two children. Leaves have none."
+    assert [s.seq for s in store.between(112.0, 118.0)] == [2]
+    assert [s.seq for s in store.since(1)] == [2, 3]
+    print("✓ Tail read test passed")
+
+
+if __name__ == "__main__":
+    test_append_and_join()
+    test_tail_reads()
+    print("✓ All transcript store tests passed!")
@@ -0,0 +1,256 @@
+"""
+Append-only raw audio archive for one lecture.
+
+Audio is normally dropped once it has been analysed; archiving it lets a
+lecture be reprocessed later (new thresholds, DSP fixes). Each lecture
+gets two files in the archive directory:
+
+- <lecture_id>.pcm: Int16 mono samples, written through a memory map that
+  grows in GROW_BYTES steps (the unused tail is trimmed on close)
+- <lecture_id>.idx: one fixed-size record per chunk: sample offset, sample
+  count, sample rate and start time (epoch seconds)
+
+The index is the source of truth. It is only synced after the samples it
+points to, so after a crash every indexed chunk is on disk and anything
+past the last record (preallocated zeros, a half-written record) is
+ignored. Reopening an archive continues after its last indexed chunk.
+
+Readers map the .pcm file read-only and slice time ranges out of it as
+views, without loading the whole file.
+"""
+
+from bisect import bisect_right
+from time import monotonic
+from typing import Iterator, Optional, Tuple, Union
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+
+# offset (samples), samples, sample rate, start time (epoch seconds)
+INDEX_RECORD = struct.Struct("<QIId")
+INDEX_DTYPE = np.dtype([('offset', '<u8'), ('samples', '<u4'), ('rate', '<u4'), ('start', '<f8')])
+SAMPLE_BYTES = 2
+GROW_BYTES = 4 * 1024 * 1024  # ~2 minutes of 16 kHz audio per extension
+SYNC_INTERVAL = 5.0  # seconds between fsyncs while appending
+
+
+def archive_paths(directory: str, lecture_id: str) -> Tuple[str, str]:
+    """(.pcm path, .idx path) of a lecture's archive."""
+    base = os.path.join(directory, lecture_id)
+    return base + ".pcm", base + ".idx"
+
+
+def float_to_pcm16(audio: np.ndarray) -> np.ndarray:
+    """Float samples in [-1, 1] to little-endian Int16 (clipped)."""
+    return (np.clip(audio, -1.0, 1.0) * 32767.0).astype('<i2')
+
+
+class AudioArchiveWriter:
+    """Appends chunks to a lecture's archive. Not thread-safe: call it from one thread at a time."""
+
+    def __init__(self, directory: str, lecture_id: str, sync_interval: float = SYNC_INTERVAL):
+        """
+        Args:
+            directory: Archive directory (created if missing)
+            lecture_id: Lecture the archive belongs to (file name)
+            sync_interval: Minimum seconds between two fsyncs during appends
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.lecture_id = lecture_id
+        self.pcm_path, self.index_path = archive_paths(directory, lecture_id)
+        self.sync_interval = sync_interval
+        self.samples = 0  # Samples archived (also the offset of the next chunk)
+        self.chunks = 0
+        self.syncs = 0
+        self.closed = False
+
+        self._index = open(self.index_path, "ab")
+        # Continue after the last complete record of an existing archive
+        size = self._index.seek(0, os.SEEK_END)
+        complete = size - size % INDEX_RECORD.size
+        if complete != size:
+            self._index.truncate(complete)
+        if complete:
+            with open(self.index_path, "rb") as index:
+                index.seek(complete - INDEX_RECORD.size)
+                offset, count, _, _ = INDEX_RECORD.unpack(index.read(INDEX_RECORD.size))
+            self.samples = offset + count
+            self.chunks = complete // INDEX_RECORD.size
+
+        self._fd = os.open(self.pcm_path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._map: Optional[mmap.mmap] = None
+        self._capacity = 0
+        self._reserve(max(self.samples * SAMPLE_BYTES, 1))
+        self._last_sync = monotonic()
+
+    def _reserve(self, nbytes: int) -> None:
+        """Make the mapped file at least nbytes long."""
+        if nbytes <= self._capacity:
+            return
+        capacity = max(-(-nbytes // GROW_BYTES) * GROW_BYTES, os.fstat(self._fd).st_size)
+        os.ftruncate(self._fd, capacity)
+        if self._map is not None:
+            self._map.close()  # Written pages stay in the page cache; sync() writes them out
+        self._map = mmap.mmap(self._fd, capacity)
+        self._capacity = capacity
+
+    def append(self, audio: Union[bytes, bytearray, memoryview, np.ndarray], sample_rate: int,
+               ended_at: Optional[float] = None) -> int:
+        """
+        Archive one chunk.
+
+        Args:
+            audio: Int16 little-endian PCM bytes, or a numpy array (Int16, or
+                float in [-1, 1])
+            sample_rate: Sample rate of the chunk in Hz
+            ended_at: Epoch seconds when the chunk's audio ended (default: now)
+
+        Returns:
+            Number of samples written
+        """
+        if self.closed:
+            raise ValueError("archive is closed")
+        if isinstance(audio, np.ndarray):
+            if audio.dtype.kind == 'f':
+                audio = float_to_pcm16(audio)
+            data = memoryview(np.ascontiguousarray(audio, dtype='<i2')).cast('B')
+        else:
+            data = memoryview(audio).cast('B')
+            data = data[:len(data) - len(data) % SAMPLE_BYTES]  # Ignore a trailing half sample
+        count = len(data) // SAMPLE_BYTES
+        if count == 0:
+            return 0
+
+        start = self.samples * SAMPLE_BYTES
+        self._reserve(start + len(data))
+        self._map[start:start + len(data)] = data
+        ended_at = time.time() if ended_at is None else ended_at
+        self._index.write(INDEX_RECORD.pack(self.samples, count, sample_rate, ended_at - count / sample_rate))
+        self.samples += count
+        self.chunks += 1
+
+        if monotonic() - self._last_sync >= self.sync_interval:
+            self.sync()
+        return count
+
+    def sync(self) -> None:
+        """Flush samples, then the index, to disk."""
+        if self.closed:
+            return
+        self._map.flush()
+        os.fsync(self._fd)
+        self._index.flush()
+        os.fsync(self._index.fileno())
+        self._last_sync = monotonic()
+        self.syncs += 1
+
+    def close(self) -> None:
+        """Sync, trim the preallocated tail and close the files (idempotent)."""
+        if self.closed:
+            return
+        self.sync()
+        self.closed = True
+        self._map.close()
+        self._map = None
+        os.ftruncate(self._fd, self.samples * SAMPLE_BYTES)
+        os.fsync(self._fd)
+        os.close(self._fd)
+        self._index.close()
+
+
+class AudioArchiveReader:
+    """Read-only, memory-mapped view of a lecture's archive."""
+
+    def __init__(self, directory: str, lecture_id: str):
+        self.lecture_id = lecture_id
+        self.pcm_path, self.index_path = archive_paths(directory, lecture_id)
+        records = os.path.getsize(self.index_path) // INDEX_RECORD.size
+        self.index = np.fromfile(self.index_path, dtype=INDEX_DTYPE, count=records)
+        self.total_samples = int(self.index['offset'][-1] + self.index['samples'][-1]) if records else 0
+
+        self._map: Optional[mmap.mmap] = None
+        if self.total_samples:
+            with open(self.pcm_path, "rb") as pcm:
+                self._map = mmap.mmap(pcm.fileno(), 0, access=mmap.ACCESS_READ)
+            self.pcm = np.frombuffer(self._map, dtype='<i2', count=self.total_samples)
+        else:
+            self.pcm = np.zeros(0, dtype='<i2')
+
+    def __len__(self) -> int:
+        """Number of chunks."""
+        return len(self.index)
+
+    def __enter__(self) -> "AudioArchiveReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @property
+    def start(self) -> Optional[float]:
+        """Epoch seconds when the first chunk started."""
+        return float(self.index['start'][0]) if len(self.index) else None
+
+    @property
+    def end(self) -> Optional[float]:
+        """Epoch seconds when the last chunk ended."""
+        if not len(self.index):
+            return None
+        last = self.index[-1]
+        return float(last['start'] + last['samples'] / last['rate'])
+
+    def chunk(self, number: int) -> Tuple[np.ndarray, int, float]:
+        """(samples, sample rate, start time) of one chunk; samples are a view of the file."""
+        record = self.index[number]
+        offset = int(record['offset'])
+        return self.pcm[offset:offset + int(record['samples'])], int(record['rate']), float(record['start'])
+
+    def iter_chunks(self) -> Iterator[Tuple[np.ndarray, int, float]]:
+        for number in range(len(self.index)):
+            yield self.chunk(number)
+
+    def read(self, start: Optional[float] = None, end: Optional[float] = None) -> Tuple[np.ndarray, int]:
+        """
+        Samples recorded between two epoch times, as a view of the file.
+
+        Chunks are stored back to back, so gaps in the recording (dropped
+        chunks, reconnects) are not padded with silence.
+
+        Returns:
+            Tuple of (Int16 samples, sample_rate)
+
+        Raises:
+            ValueError: If the range spans chunks with different sample rates
+        """
+        if not len(self.index):
+            return self.pcm, 0
+        starts = self.index['start']
+        first = 0 if start is None else max(bisect_right(starts, start) - 1, 0)
+        last = len(self.index) - 1 if end is None else max(bisect_right(starts, end) - 1, first)
+        rates = self.index['rate'][first:last + 1]
+        rate = int(rates[0])
+        if (rates != rate).any():
+            raise ValueError("range spans chunks with different sample rates")
+
+        def position(number: int, at: Optional[float], default: int) -> int:
+            record = self.index[number]
+            if at is None:
+                return default
+            within = int(round((at - record['start']) * rate))
+            return int(record['offset']) + min(max(within, 0), int(record['samples']))
+
+        begin = position(first, start, int(self.index['offset'][first]))
+        stop = position(last, end, self.total_samples)
+        return self.pcm[begin:max(stop, begin)], rate
+
+    def close(self) -> None:
+        self.pcm = np.zeros(0, dtype='<i2')
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # Slices handed out still use the mapping; it closes when they are freed
+            self._map = None
@@ -0,0 +1,232 @@
+"""
+Token-budgeted context builder for LLM prompts.
+
+Counts tokens locally (tiktoken when installed, a character estimate
+otherwise) and assembles instruction, slide and transcript sections into a
+prompt that fits a configurable token budget. Trimming happens on sentence
+boundaries: transcripts keep their most recent sentences, slides and other
+reference material keep their beginning.
+"""
+
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import logging
+import math
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gpt-4"
+
+# Default context budgets (tokens) per prompt kind; override with
+# PROMPT_TOKEN_BUDGET_<KIND> environment variables, e.g. PROMPT_TOKEN_BUDGET_QUESTION=1200
+DEFAULT_BUDGETS: Dict[str, int] = {
+    'question': 1500,
+    'answers': 1000,
+    'engagement': 1500,
+    'sentiment': 400,
+}
+
+_SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?])\s+')
+MAX_CHARS_PER_TOKEN = 16  # generous upper bound; sizes the text window trim_to_tokens looks at
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: str):
+    """Load (once per model) the tiktoken encoding, or None if tiktoken is unavailable."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # The encoding files are downloaded on first use; without them, estimate
+        logger.warning("tiktoken encoding for %s unavailable, estimating token counts: %s", model, e)
+        return None
+
+
+def count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
+    """
+    Count tokens in text for the given model.
+
+    Falls back to ~4 characters per token when tiktoken is not installed.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return math.ceil(len(text) / 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def get_budget(kind: str, default: Optional[int] = None) -> int:
+    """Get the configured token budget for a prompt kind."""
+    env_value = os.getenv(f"PROMPT_TOKEN_BUDGET_{kind.upper()}")
+    if env_value:
+        try:
+            return int(env_value)
+        except ValueError:
+            pass
+    if default is not None:
+        return default
+    return DEFAULT_BUDGETS.get(kind, 1000)
+
+
+def _hard_cut(text: str, max_tokens: int, keep: str, model: str) -> str:
+    """Cut a single oversized sentence to max_tokens (no sentence boundary available)."""
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding(model)
+    if encoding is None:
+        max_chars = max_tokens * 4
+        return text[-max_chars:] if keep == 'tail' else text[:max_chars]
+    tokens = encoding.encode(text, disallowed_special=())
+    tokens = tokens[-max_tokens:] if keep == 'tail' else tokens[:max_tokens]
+    return encoding.decode(tokens)
+
+
+def trim_to_tokens(text: str, max_tokens: int, keep: str = 'tail',
+                   model: str = DEFAULT_MODEL) -> Tuple[str, int]:
+    """
+    Trim text to at most max_tokens, keeping whole sentences where possible.
+
+    Only a window of about MAX_CHARS_PER_TOKEN * max_tokens characters at the
+    kept end is split and tokenized, so trimming a long transcript costs
+    O(budget) rather than O(transcript). If the budget isn't used up inside
+    that window (unusually long tokens), the whole text is used instead.
+
+    Args:
+        text: Text to trim
+        max_tokens: Token budget
+        keep: 'tail' keeps the most recent sentences, 'head' keeps the first ones
+        model: Model whose tokenizer is used
+
+    Returns:
+        Tuple of (trimmed_text, token_count)
+    """
+    if not text or max_tokens <= 0:
+        return "", 0
+
+    text = text.strip()
+    window = max_tokens * MAX_CHARS_PER_TOKEN
+    if len(text) > window:
+        sentences = _SENTENCE_SPLIT_RE.split(text[-window:] if keep == 'tail' else text[:window])
+        # The sentence at the window's edge may be cut off
+        sentences = sentences[1:] if keep == 'tail' else sentences[:-1]
+        result = _take_sentences(sentences, max_tokens, keep, model)
+        if result is not None:
+            return result
+    return _take_sentences(_SENTENCE_SPLIT_RE.split(text), max_tokens, keep, model, complete=True)
+
+
+def _take_sentences(sentences: List[str], max_tokens: int, keep: str, model: str,
+                    complete: bool = False) -> Optional[Tuple[str, int]]:
+    """
+    Keep sentences from the kept end while they fit the budget.
+
+    Returns None if the sentences ran out before the budget did (and they
+    are only part of the text, i.e. not complete).
+    """
+    ordered = reversed(sentences) if keep == 'tail' else iter(sentences)
+
+    kept: List[str] = []
+    used = 0
+    for sentence in ordered:
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        # +1 approximates the joining space between sentences
+        cost = count_tokens(sentence, model) + (1 if kept else 0)
+        if used + cost > max_tokens:
+            if not kept:
+                # A single sentence larger than the whole budget - cut inside it
+                cut = _hard_cut(sentence, max_tokens, keep, model)
+                return cut, count_tokens(cut, model)
+            break
+        kept.append(sentence)
+        used += cost
+    else:
+        if not complete:
+            return None
+
+    if keep == 'tail':
+        kept.reverse()
+    return " ".join(kept), used
+
+
+class ContextSection:
+    """One named part of a prompt context (instructions, slides, transcript, ...)."""
+
+    def __init__(self, name: str, text: Optional[str], keep: str = 'tail',
+                 max_tokens: Optional[int] = None, required: bool = False):
+        """
+        Args:
+            name: Section name used in logs
+            text: Section text (None or empty sections are skipped)
+            keep: Which end survives trimming ('tail' for transcripts, 'head' for slides)
+            max_tokens: Optional cap for this section on top of the overall budget
+            required: Required sections are never trimmed and are budgeted first
+        """
+        self.name = name
+        self.text = text or ""
+        self.keep = keep
+        self.max_tokens = max_tokens
+        self.required = required
+
+
+def build_context(sections: List[ContextSection], budget: int,
+                  model: str = DEFAULT_MODEL, label: Optional[str] = None) -> Dict[str, str]:
+    """
+    Fit sections into a token budget.
+
+    Required sections are counted first; the remaining budget goes to the other
+    sections in list order (put the most important first).
+
+    Args:
+        sections: Sections to assemble
+        budget: Total token budget for all sections
+        model: Model whose tokenizer is used
+        label: If set, the per-section token counts are logged under this label
+
+    Returns:
+        Dictionary of section name -> trimmed text (empty string if nothing fit)
+    """
+    result: Dict[str, str] = {}
+    counts: Dict[str, int] = {}
+    remaining = budget
+
+    for section in sections:
+        if section.required:
+            result[section.name] = section.text
+            counts[section.name] = count_tokens(section.text, model)
+            remaining -= counts[section.name]
+
+    for section in sections:
+        if section.required:
+            continue
+        allowance = max(remaining, 0)
+        if section.max_tokens is not None:
+            allowance = min(allowance, section.max_tokens)
+        text, used = trim_to_tokens(section.text, allowance, section.keep, model)
+        result[section.name] = text
+        counts[section.name] = used
+        remaining -= used
+
+    if label:
+        log_prompt_tokens(label, counts, budget)
+    return result
+
+
+def log_prompt_tokens(label: str, counts: Dict[str, int], budget: Optional[int] = None) -> None:
+    """Log the token count of each prompt section (at DEBUG level)."""
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    total = sum(counts.values())
+    breakdown = ", ".join(f"{name}={n}" for name, n in counts.items())
+    budget_str = f"/{budget}" if budget is not None else ""
+    logger.debug("%s: %s%s context tokens (%s)", label, total, budget_str, breakdown)
@@ -0,0 +1,202 @@
+"""
+Process-wide executor pools for blocking audio work.
+
+Instead of one ThreadPoolExecutor per lecture, blocking work goes to a few
+shared, named pools:
+
+- decode: WebM -> PCM decoding
+- transcription: encoding batches for Whisper
+- dsp: per-chunk voice analysis
+- archive: writing raw audio to lecture archives
+
+Each pool has a fixed number of worker threads and a queue limit. Once a
+pool holds workers + queue_limit jobs, further callers wait for a slot
+(backpressure into the caller's stage) instead of piling up unbounded work.
+Sizes come from EXECUTOR_<NAME>_WORKERS / EXECUTOR_<NAME>_QUEUE.
+
+Every pool counts jobs, queue wait, busy time and utilization;
+render_pool_metrics() exposes them for /metrics. shutdown_pools() stops
+all pools on server shutdown.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from time import monotonic
+from typing import Any, Callable, Dict, Optional, Tuple
+import asyncio
+import os
+import threading
+
+# name -> (workers, queue_limit)
+POOL_DEFAULTS: Dict[str, Tuple[int, int]] = {
+    "decode": (4, 32),
+    "transcription": (2, 16),
+    "dsp": (4, 32),
+    "archive": (2, 64),
+}
+FALLBACK_SIZE = (2, 16)  # For pools not listed above
+
+
+class ExecutorPool:
+    """A named, bounded thread pool for blocking calls from async code."""
+
+    def __init__(self, name: str, workers: int, queue_limit: int):
+        """
+        Args:
+            name: Pool name (metrics label and thread name prefix)
+            workers: Worker threads
+            queue_limit: Jobs that may wait for a worker before callers are held back
+        """
+        self.name = name
+        self.workers = max(workers, 1)
+        self.queue_limit = max(queue_limit, 0)
+        self.created = monotonic()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._slots_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()  # Counters are updated from worker threads
+        self._closed = False
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.throttled = 0  # Callers that had to wait for a slot
+        self.active = 0     # Jobs running in a worker
+        self.pending = 0    # Jobs admitted (queued or running)
+        self.wait_seconds = 0.0  # Total time jobs spent queued
+        self.busy_seconds = 0.0  # Total time workers spent in jobs
+
+    @property
+    def queued(self) -> int:
+        return self.pending - self.active
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.workers + self.queue_limit)
+            self._slots_loop = loop
+        return self._slots
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"{self.name}-pool")
+        return self._executor
+
+    def _job(self, fn: Callable[[], Any], queued_at: float) -> Any:
+        started = monotonic()
+        with self._lock:
+            self.active += 1
+            self.wait_seconds += started - queued_at
+        try:
+            return fn()
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.busy_seconds += monotonic() - started
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run fn(*args, **kwargs) in the pool and return its result.
+
+        Waits for a slot first if the pool is full.
+
+        Raises:
+            RuntimeError: If the pool has been shut down
+        """
+        if self._closed:
+            raise RuntimeError(f"executor pool {self.name!r} is shut down")
+        slots = self._semaphore()
+        if slots.locked():
+            self.throttled += 1
+        async with slots:
+            self.submitted += 1
+            self.pending += 1
+            try:
+                loop = asyncio.get_running_loop()
+                job = partial(self._job, partial(fn, *args, **kwargs), monotonic())
+                result = await loop.run_in_executor(self._get_executor(), job)
+            except Exception:
+                self.failed += 1
+                raise
+            finally:
+                self.pending -= 1
+            self.completed += 1
+            return result
+
+    def utilization(self) -> float:
+        """Share of worker time spent in jobs since the pool was created (0-1)."""
+        elapsed = (monotonic() - self.created) * self.workers
+        return min(self.busy_seconds / elapsed, 1.0) if elapsed > 0 else 0.0
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop accepting jobs; wait for running ones (or cancel queued ones if not waiting)."""
+        self._closed = True
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=not wait)
+            self._executor = None
+
+    def snapshot(self) -> Dict:
+        return {
+            'workers': self.workers,
+            'queue_limit': self.queue_limit,
+            'active': self.active,
+            'queued': self.queued,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'throttled': self.throttled,
+            'avg_wait_ms': round(1000 * self.wait_seconds / max(self.completed, 1), 2),
+            'utilization': round(self.utilization(), 4),
+        }
+
+
+_pools: Dict[str, ExecutorPool] = {}
+_pools_lock = threading.Lock()
+
+
+def _configured_size(name: str) -> Tuple[int, int]:
+    workers, queue_limit = POOL_DEFAULTS.get(name, FALLBACK_SIZE)
+    prefix = f"EXECUTOR_{name.upper()}"
+    return (int(os.getenv(f"{prefix}_WORKERS", workers)),
+            int(os.getenv(f"{prefix}_QUEUE", queue_limit)))
+
+
+def get_pool(name: str) -> ExecutorPool:
+    """The shared pool with this name (created on first use with its configured size)."""
+    pool = _pools.get(name)
+    if pool is None or pool._closed:
+        with _pools_lock:
+            pool = _pools.get(name)
+            if pool is None or pool._closed:
+                pool = _pools[name] = ExecutorPool(name, *_configured_size(name))
+    return pool
+
+
+def shutdown_pools(wait: bool = True) -> None:
+    """Shut down every pool (on server shutdown)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=wait)
+
+
+def pool_snapshot() -> Dict[str, Dict]:
+    return {name: pool.snapshot() for name, pool in list(_pools.items())}
+
+
+def render_pool_metrics() -> str:
+    """Prometheus text exposition of all pools."""
+    lines = []
+    for name, pool in list(_pools.items()):
+        labels = f'pool="{name}"'
+        lines.append(f"executor_pool_workers{{{labels}}} {pool.workers}")
+        lines.append(f"executor_pool_active{{{labels}}} {pool.active}")
+        lines.append(f"executor_pool_queued{{{labels}}} {pool.queued}")
+        lines.append(f"executor_pool_submitted_total{{{labels}}} {pool.submitted}")
+        lines.append(f"executor_pool_failed_total{{{labels}}} {pool.failed}")
+        lines.append(f"executor_pool_throttled_total{{{labels}}} {pool.throttled}")
+        lines.append(f"executor_pool_wait_seconds_sum{{{labels}}} {pool.wait_seconds:g}")
+        lines.append(f"executor_pool_busy_seconds_sum{{{labels}}} {pool.busy_seconds:g}")
+        lines.append(f"executor_pool_utilization{{{labels}}} {pool.utilization():.4f}")
+    return "\n".join(lines) + ("\n" if lines else "")
@@ -0,0 +1,364 @@
+"""
+Shared async LLM gateway.
+
+Every OpenAI call (chat completions and Whisper transcriptions) goes through
+one gateway so the process has a single view of the rate limits:
+
+- Token-bucket rate limiting per model
+- Priority classes: final transcription > live transcription > question
+  generation > sentiment. Waiters are served in priority order.
+- Load shedding: low-priority requests are rejected with GatewayOverloaded
+  when their model's queue is deep, instead of piling up into 429 cascades
+- Coalescing of identical in-flight chat requests
+- Streaming chat completions (stream_chat) under the same limits
+- Prometheus-style counters (render_metrics)
+"""
+
+from collections import defaultdict
+from time import monotonic
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import heapq
+import itertools
+import json
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Priority classes (lower value = served first)
+PRIORITY_FINAL_TRANSCRIPTION = 0  # End-of-lecture transcription (must not be lost)
+PRIORITY_TRANSCRIPTION = 1        # Live transcription batches
+PRIORITY_QUESTION = 2             # Question generation
+PRIORITY_SENTIMENT = 3            # Sentiment checkpoints (best effort)
+
+PRIORITY_NAMES = {
+    PRIORITY_FINAL_TRANSCRIPTION: 'final_transcription',
+    PRIORITY_TRANSCRIPTION: 'transcription',
+    PRIORITY_QUESTION: 'question',
+    PRIORITY_SENTIMENT: 'sentiment',
+}
+
+# Queue depth (per model) above which a priority class is shed; None = never shed
+SHED_QUEUE_DEPTH = {
+    PRIORITY_FINAL_TRANSCRIPTION: None,
+    PRIORITY_TRANSCRIPTION: 64,
+    PRIORITY_QUESTION: 32,
+    PRIORITY_SENTIMENT: 4,
+}
+
+# Default limits per model: (requests per minute, burst). Override with
+# LLM_RATE_LIMIT_<MODEL>="rpm[,burst]", e.g. LLM_RATE_LIMIT_GPT_4="120,20"
+DEFAULT_RATE_LIMITS: Dict[str, Tuple[float, float]] = {
+    'gpt-4': (60.0, 10.0),
+    'whisper-1': (50.0, 10.0),
+}
+FALLBACK_RATE_LIMIT = (60.0, 10.0)
+
+MAX_RATE_LIMIT_RETRIES = 2
+DEFAULT_RETRY_AFTER = 5.0  # seconds to pause a model after a 429 without Retry-After
+
+
+class GatewayOverloaded(Exception):
+    """Raised when a request is shed because its model's queue is too deep."""
+
+
+def _env_rate_limit(model: str) -> Optional[Tuple[float, float]]:
+    value = os.getenv("LLM_RATE_LIMIT_" + model.upper().replace('-', '_').replace('.', '_'))
+    if not value:
+        return None
+    try:
+        parts = [float(p) for p in value.split(',')]
+        return (parts[0], parts[1] if len(parts) > 1 else max(1.0, parts[0] / 6))
+    except (ValueError, IndexError):
+        return None
+
+
+class _TokenBucket:
+    """Token bucket with a priority-ordered wait queue for one model."""
+
+    def __init__(self, requests_per_minute: float, burst: float):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = max(burst, 1.0)
+        self.tokens = self.capacity
+        self.updated = monotonic()
+        self.blocked_until = 0.0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+
+    def depth(self) -> int:
+        return sum(1 for _, _, fut in self._waiters if not fut.done())
+
+    async def acquire(self, priority: int) -> None:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        self._dispatch()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # Token was granted but the caller went away - give it back
+                self.tokens = min(self.capacity, self.tokens + 1)
+                self._dispatch()
+            raise
+
+    def penalize(self, retry_after: float) -> None:
+        """Pause the bucket after the upstream rate limit was hit."""
+        self.blocked_until = max(self.blocked_until, monotonic() + retry_after)
+        self.tokens = 0.0
+
+    def _on_wakeup(self) -> None:
+        self._wakeup = None
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        now = monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        while self._waiters and now >= self.blocked_until and self.tokens >= 1.0:
+            _, _, fut = heapq.heappop(self._waiters)
+            if fut.done():
+                continue  # Cancelled while waiting
+            self.tokens -= 1.0
+            fut.set_result(None)
+
+        # Drop cancelled waiters at the head so depth stays accurate
+        while self._waiters and self._waiters[0][2].done():
+            heapq.heappop(self._waiters)
+
+        if self._waiters and self._wakeup is None:
+            delay = max(self.blocked_until - now, (1.0 - self.tokens) / self.rate, 0.01)
+            self._wakeup = asyncio.get_running_loop().call_later(delay, self._on_wakeup)
+
+
+class _SharedCall:
+    """An in-flight chat request shared by identical callers."""
+
+    __slots__ = ('task', 'waiters')
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0  # Callers currently awaiting the task
+
+
+class LLMGateway:
+    """Process-wide gateway for OpenAI chat and transcription calls."""
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key
+        self._client = None
+        self._sync_client = None
+        self._buckets: Dict[str, _TokenBucket] = {}
+        self._inflight: Dict[str, _SharedCall] = {}
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = defaultdict(float)
+
+    # ------------------------------------------------------------------
+    # Clients and configuration
+    # ------------------------------------------------------------------
+
+    def _get_api_key(self) -> Optional[str]:
+        return self.api_key or os.getenv('OPENAI_API_KEY')
+
+    @property
+    def client(self):
+        """Shared AsyncOpenAI client (created on first use)."""
+        if self._client is None:
+            from openai import AsyncOpenAI
+            self._client = AsyncOpenAI(api_key=self._get_api_key())
+        return self._client
+
+    @property
+    def sync_client(self):
+        """Shared blocking OpenAI client for scripts that run outside an event loop."""
+        if self._sync_client is None:
+            from openai import OpenAI
+            self._sync_client = OpenAI(api_key=self._get_api_key())
+        return self._sync_client
+
+    def configure_rate_limit(self, model: str, requests_per_minute: float, burst: Optional[float] = None) -> None:
+        """Set the token-bucket limit for a model (replaces any existing bucket)."""
+        self._buckets[model] = _TokenBucket(requests_per_minute, burst or max(1.0, requests_per_minute / 6))
+
+    def _bucket(self, model: str) -> _TokenBucket:
+        bucket = self._buckets.get(model)
+        if bucket is None:
+            rpm, burst = _env_rate_limit(model) or DEFAULT_RATE_LIMITS.get(model, FALLBACK_RATE_LIMIT)
+            bucket = _TokenBucket(rpm, burst)
+            self._buckets[model] = bucket
+        return bucket
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+
+    def _inc(self, name: str, value: float = 1.0, **labels) -> None:
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        self._counters[key] += value
+
+    def render_metrics(self) -> str:
+        """Render counters and queue gauges in Prometheus text format."""
+        lines = []
+        for (name, labels), value in sorted(self._counters.items()):
+            label_str = ",".join(f'{k}="{v}"' for k, v in labels)
+            lines.append(f"{name}{{{label_str}}} {value:g}")
+        for model, bucket in sorted(self._buckets.items()):
+            lines.append(f'llm_gateway_queue_depth{{model="{model}"}} {bucket.depth()}')
+        lines.append(f"llm_gateway_inflight_coalesced {len(self._inflight)}")
+        return "\n".join(lines) + "\n"
+
+    # ------------------------------------------------------------------
+    # Scheduling
+    # ------------------------------------------------------------------
+
+    async def _admit(self, model: str, priority: int) -> None:
+        """Wait for a rate-limit token, or shed the request if the queue is too deep."""
+        bucket = self._bucket(model)
+        priority_name = PRIORITY_NAMES.get(priority, str(priority))
+        limit = SHED_QUEUE_DEPTH.get(priority)
+        if limit is not None and bucket.depth() >= limit:
+            self._inc('llm_gateway_shed_total', model=model, priority=priority_name)
+            raise GatewayOverloaded(f"{model} queue is full ({bucket.depth()} waiting); dropped {priority_name} request")
+
+        started = monotonic()
+        await bucket.acquire(priority)
+        self._inc('llm_gateway_queue_wait_seconds_sum', monotonic() - started, model=model)
+        self._inc('llm_gateway_queue_wait_seconds_count', model=model)
+
+    async def _call(self, model: str, priority: int, make_request):
+        """Run one upstream request under the rate limiter, retrying 429s for important work."""
+        from openai import RateLimitError
+
+        priority_name = PRIORITY_NAMES.get(priority, str(priority))
+        attempts = 0
+        while True:
+            await self._admit(model, priority)
+            try:
+                result = await make_request()
+                self._inc('llm_gateway_requests_total', model=model, priority=priority_name, outcome='ok')
+                return result
+            except RateLimitError as e:
+                self._inc('llm_gateway_rate_limited_total', model=model)
+                retry_after = DEFAULT_RETRY_AFTER
+                try:
+                    retry_after = float(e.response.headers.get('retry-after', retry_after))
+                except Exception:
+                    pass
+                self._bucket(model).penalize(retry_after)
+                # Best-effort classes give up immediately instead of adding retry load
+                if priority >= PRIORITY_SENTIMENT or attempts >= MAX_RATE_LIMIT_RETRIES:
+                    self._inc('llm_gateway_requests_total', model=model, priority=priority_name, outcome='rate_limited')
+                    raise
+                attempts += 1
+            except Exception:
+                self._inc('llm_gateway_requests_total', model=model, priority=priority_name, outcome='error')
+                raise
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    async def chat(self, messages: List[Dict], model: str = 'gpt-4',
+                   priority: int = PRIORITY_QUESTION, coalesce: bool = True, **params) -> str:
+        """
+        Run a chat completion and return the message content.
+
+        Identical concurrent requests (same model, messages and params) share
+        one upstream call when coalesce is True.
+
+        Raises:
+            GatewayOverloaded: If the request was shed under load
+        """
+        async def make_request():
+            response = await self.client.chat.completions.create(model=model, messages=messages, **params)
+            return (response.choices[0].message.content or "").strip()
+
+        if not coalesce:
+            return await self._call(model, priority, make_request)
+
+        key = hashlib.sha1(
+            json.dumps({'model': model, 'messages': messages, 'params': params}, sort_keys=True, default=str).encode()
+        ).hexdigest()
+        shared = self._inflight.get(key)
+        if shared is None:
+            # The call runs as the gateway's own task, so cancelling whichever caller
+            # started it doesn't cancel it for the callers that joined later
+            shared = self._inflight[key] = _SharedCall(
+                asyncio.create_task(self._call(model, priority, make_request))
+            )
+            shared.task.add_done_callback(lambda task: self._forget_inflight(key, shared))
+        else:
+            self._inc('llm_gateway_coalesced_total', model=model)
+
+        shared.waiters += 1
+        try:
+            return await asyncio.shield(shared.task)
+        finally:
+            shared.waiters -= 1
+            # Nobody left to use the result (all callers cancelled): stop the upstream call
+            if shared.waiters == 0 and not shared.task.done():
+                shared.task.cancel()
+
+    def _forget_inflight(self, key: str, shared: _SharedCall) -> None:
+        if self._inflight.get(key) is shared:
+            del self._inflight[key]
+        if not shared.task.cancelled():
+            shared.task.exception()  # Mark retrieved; every waiter has already seen it
+
+    async def stream_chat(self, messages: List[Dict], model: str = 'gpt-4',
+                          priority: int = PRIORITY_QUESTION, **params) -> AsyncIterator[str]:
+        """
+        Run a streaming chat completion, yielding content deltas as they arrive.
+
+        The request is admitted by the rate limiter like chat(); streamed
+        requests are never coalesced.
+
+        Raises:
+            GatewayOverloaded: If the request was shed under load
+        """
+        async def make_request():
+            return await self.client.chat.completions.create(model=model, messages=messages, stream=True, **params)
+
+        stream = await self._call(model, priority, make_request)
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+    async def transcribe(self, audio_file: Tuple[str, bytes], model: str = 'whisper-1',
+                         priority: int = PRIORITY_TRANSCRIPTION, **params) -> str:
+        """
+        Transcribe audio with Whisper.
+
+        Args:
+            audio_file: (filename, bytes) tuple, e.g. ("audio.wav", wav_bytes)
+            model: Transcription model
+            priority: Priority class (PRIORITY_FINAL_TRANSCRIPTION for end-of-lecture audio)
+        """
+        async def make_request():
+            transcript = await self.client.audio.transcriptions.create(model=model, file=audio_file, **params)
+            return transcript.text.strip()
+
+        return await self._call(model, priority, make_request)
+
+
+_gateway: Optional[LLMGateway] = None
+
+
+def get_gateway() -> LLMGateway:
+    """Get the process-wide gateway."""
+    global _gateway
+    if _gateway is None:
+        _gateway = LLMGateway()
+    return _gateway
+
+
+def render_metrics() -> str:
+    """Prometheus text exposition of the gateway counters."""
+    return get_gateway().render_metrics()
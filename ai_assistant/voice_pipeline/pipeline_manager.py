@@ -10,10 +10,12 @@ Manages:
 
 import asyncio
 from datetime import datetime
-from typing import Dict, List, Optional, Callable
+from time import monotonic
+from typing import Deque, Dict, List, Optional, Callable
 from collections import deque
 import numpy as np
 
+from .executor_pool import get_pool
 from .fast_dsp import analyze_voice_chunk
 from .sentiment_analyzer import analyze_sentiment
 
@@ -29,20 +31,22 @@ class VoicePipelineManager:
     
     def __init__(self, 
                  sentiment_interval: float = 8.0,  # 8 seconds between sentiment checks (higher temporal resolution)
-                 transcript_buffer_size: int = 1000):  # Max chars in buffer
+                 transcript_window: float = 60.0):  # Seconds of transcript kept for sentiment
         """
         Initialize pipeline manager.
         
         Args:
             sentiment_interval: Seconds between sentiment analyses (default 12s)
-            transcript_buffer_size: Maximum characters in transcript buffer
+            transcript_window: Age in seconds after which transcript segments are evicted
         """
         self.sentiment_interval = sentiment_interval
-        self.transcript_buffer_size = transcript_buffer_size
+        self.transcript_window = transcript_window
         
-        # Transcript buffer for sentiment analysis
-        self.transcript_buffer = deque(maxlen=transcript_buffer_size)
-        self.transcript_segments = []  # Timestamped segments for sentiment
+        # Time-indexed ring of transcript segments for sentiment analysis.
+        # Segments older than transcript_window are evicted on every append,
+        # so memory stays flat no matter how long the lecture runs.
+        self.transcript_segments: Deque[Dict] = deque()
+        self._recent_cache: Optional[tuple] = None  # (max_duration, text) for the current ring
         
         # Metrics storage
         self.fast_metrics_history: List[Dict] = []
@@ -88,18 +92,44 @@ class VoicePipelineManager:
             sr=sr,
             word_timestamps=word_timestamps
         )
+        return self._record_chunk(metrics, transcript, duration_seconds, timestamp)
+    
+    async def process_audio_chunk_async(self,
+                                        audio_data: np.ndarray,
+                                        transcript: str,
+                                        duration_seconds: float,
+                                        sr: int = 22050,
+                                        word_timestamps: Optional[List[Dict]] = None,
+                                        timestamp: Optional[datetime] = None) -> Dict:
+        """
+        Same as process_audio_chunk, but the DSP analysis runs in the shared
+        "dsp" executor pool instead of on the event loop.
         
+        Bookkeeping (history, sentiment scheduling, callbacks) still happens
+        on the loop, so calls for one pipeline must not overlap.
+        """
+        if timestamp is None:
+            timestamp = datetime.utcnow()
+        
+        metrics = await get_pool("dsp").run(
+            analyze_voice_chunk,
+            audio_data=audio_data,
+            transcript=transcript,
+            duration_seconds=duration_seconds,
+            sr=sr,
+            word_timestamps=word_timestamps
+        )
+        return self._record_chunk(metrics, transcript, duration_seconds, timestamp)
+    
+    def _record_chunk(self, metrics: Dict, transcript: str, duration_seconds: float,
+                      timestamp: datetime) -> Dict:
+        """Store a chunk's metrics, trigger sentiment analysis when due and call the callback."""
         # Add timestamp
         metrics['timestamp'] = timestamp.isoformat()
         
         # Store transcript for sentiment analysis
         if transcript:
-            self.transcript_buffer.append(transcript)
-            self.transcript_segments.append({
-                'transcript': transcript,
-                'timestamp': timestamp,
-                'duration': duration_seconds
-            })
+            self.add_transcript(transcript, timestamp, duration_seconds)
         
         # Store metrics
         self.fast_metrics_history.append(metrics)
@@ -145,6 +175,10 @@ class VoicePipelineManager:
         # Analyze sentiment
         sentiment_data = await analyze_sentiment(recent_transcript)
         
+        # Checkpoint was shed by the LLM gateway under load - nothing to record
+        if sentiment_data.get('skipped'):
+            return
+        
         # Add timestamp and transcript segment
         sentiment_data['timestamp'] = timestamp.isoformat()
         sentiment_data['transcript_segment'] = recent_transcript
@@ -160,6 +194,41 @@ class VoicePipelineManager:
             except Exception as e:
                 print(f"Error in sentiment callback: {e}")
     
+    def add_transcript(self,
+                       transcript: str,
+                       timestamp: Optional[datetime] = None,
+                       duration_seconds: float = 2.0):
+        """
+        Append a transcript segment to the sentiment window.
+        
+        Args:
+            transcript: Transcript text for the segment
+            timestamp: Wall-clock time of the segment (kept for display only)
+            duration_seconds: Audio duration covered by the segment
+        """
+        if not transcript:
+            return
+        
+        now = monotonic()
+        self.transcript_segments.append({
+            'transcript': transcript,
+            'timestamp': timestamp or datetime.utcnow(),
+            'duration': duration_seconds,
+            'received_at': now
+        })
+        self._recent_cache = None
+        self._evict_old_segments(now)
+    
+    def _evict_old_segments(self, now: Optional[float] = None):
+        """Drop segments older than the transcript window (monotonic clock)."""
+        if now is None:
+            now = monotonic()
+        cutoff = now - self.transcript_window
+        segments = self.transcript_segments
+        while segments and segments[0].get('received_at', now) < cutoff:
+            segments.popleft()
+            self._recent_cache = None
+    
     def _get_recent_transcript(self, max_duration: float = 15.0) -> str:
         """
         Get recent transcript segments (last ~15 seconds).
@@ -170,23 +239,29 @@ class VoicePipelineManager:
         Returns:
             Combined transcript string
         """
+        self._evict_old_segments()
         if not self.transcript_segments:
+            self._recent_cache = None
             return ""
         
-        # Get segments from last max_duration seconds
-        current_time = datetime.utcnow()
+        cache = self._recent_cache
+        if cache is not None and cache[0] == max_duration:
+            return cache[1]
+        
+        # Go backwards through segments until the window is covered, then
+        # reverse once - O(window) instead of repeated list.insert(0, ...)
         recent_segments = []
         total_duration = 0.0
-        
-        # Go backwards through segments
         for segment in reversed(self.transcript_segments):
             if total_duration >= max_duration:
                 break
-            
-            recent_segments.insert(0, segment['transcript'])
+            recent_segments.append(segment['transcript'])
             total_duration += segment.get('duration', 2.0)
+        recent_segments.reverse()
         
-        return " ".join(recent_segments)
+        text = " ".join(recent_segments)
+        self._recent_cache = (max_duration, text)
+        return text
     
     def get_metrics_summary(self) -> Dict:
         """
@@ -223,8 +298,8 @@ class VoicePipelineManager:
     
     def reset(self):
         """Reset pipeline state."""
-        self.transcript_buffer.clear()
         self.transcript_segments.clear()
+        self._recent_cache = None
         self.fast_metrics_history.clear()
         self.sentiment_history.clear()
         self.last_sentiment_time = None
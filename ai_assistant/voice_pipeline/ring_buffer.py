@@ -0,0 +1,91 @@
+"""
+Fixed-capacity audio ring buffer.
+
+Used to batch audio chunks for transcription without per-chunk copies into
+a list and a full np.concatenate per batch: chunks are written in place
+into preallocated float32 storage, and the batch (everything between the
+read and write watermarks) is handed out as a view, or as a single copy
+when it wraps around the end of the storage.
+"""
+
+import numpy as np
+
+
+class AudioRingBuffer:
+    """Preallocated float32 ring buffer with read/write watermarks."""
+
+    def __init__(self, capacity: int, dtype=np.float32):
+        """
+        Args:
+            capacity: Maximum number of samples held (older samples are
+                overwritten when a write would exceed it)
+            dtype: Sample dtype of the storage
+        """
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=dtype)
+        self._read = 0   # Absolute index of the first unread sample
+        self._write = 0  # Absolute index one past the last written sample
+        self.overwritten = 0  # Samples lost because the reader fell behind
+
+    def __len__(self) -> int:
+        """Number of unread samples (the current batch)."""
+        return self._write - self._read
+
+    @property
+    def free(self) -> int:
+        """Samples that can be written before unread audio is overwritten."""
+        return self.capacity - len(self)
+
+    def _advance_write(self, n: int) -> None:
+        self._write += n
+        overflow = len(self) - self.capacity
+        if overflow > 0:
+            self._read += overflow
+            self.overwritten += overflow
+
+    def write(self, samples: np.ndarray) -> None:
+        """Copy samples into the buffer (at most two slice copies, no allocation)."""
+        n = len(samples)
+        if n == 0:
+            return
+        if n > self.capacity:
+            # Only the newest `capacity` samples can be kept
+            self._advance_write(n - self.capacity)
+            samples = samples[n - self.capacity:]
+            n = self.capacity
+
+        start = self._write % self.capacity
+        first = min(n, self.capacity - start)
+        self._data[start:start + first] = samples[:first]
+        if first < n:
+            self._data[:n - first] = samples[first:]
+        self._advance_write(n)
+
+    def peek(self) -> np.ndarray:
+        """
+        The unread samples in order.
+
+        Returns a view into the storage when the batch is contiguous and one
+        copy when it wraps. A view is only valid until the next write.
+        """
+        n = len(self)
+        if n == 0:
+            return self._data[:0]
+        start = self._read % self.capacity
+        end = start + n
+        if end <= self.capacity:
+            return self._data[start:end]
+        return np.concatenate((self._data[start:], self._data[:end - self.capacity]))
+
+    def consume(self, n: int = None) -> None:
+        """Advance the read watermark by n samples (default: everything unread)."""
+        if n is None or n >= len(self):
+            self._read = self._write
+        else:
+            self._read += max(n, 0)
+
+    def clear(self) -> None:
+        """Drop all unread samples."""
+        self._read = self._write = 0
@@ -4,15 +4,19 @@ Sentiment Analyzer - GPT-4 based sentiment analysis (10-15s checkpoints)
 Analyzes transcript segments for emotional tone and delivery quality.
 """
 
-from openai import OpenAI
 from typing import Dict, Optional
-import os
-from dotenv import load_dotenv
+import logging
+import time
 
-load_dotenv()
+from .context_builder import ContextSection, build_context, get_budget
+from .llm_gateway import GatewayOverloaded, PRIORITY_SENTIMENT, get_gateway
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+logger = logging.getLogger(__name__)
+
+# Under load every checkpoint is skipped; log at most one line per interval
+SKIP_LOG_INTERVAL = 10.0  # seconds
+_last_skip_log = float("-inf")
+_skips_suppressed = 0
 
 
 async def analyze_sentiment(transcript_segment: str) -> Dict:
@@ -39,6 +43,13 @@ async def analyze_sentiment(transcript_segment: str) -> Dict:
             'engagement_indicators': []
         }
     
+    # Keep the prompt within the sentiment token budget (most recent sentences win)
+    transcript_segment = build_context(
+        [ContextSection('transcript', transcript_segment, keep='tail')],
+        get_budget('sentiment'),
+        label='analyze_sentiment'
+    )['transcript']
+    
     prompt = f"""Analyze the sentiment and delivery tone of this lecture transcript segment.
 
 Transcript: {transcript_segment}
@@ -55,9 +66,9 @@ Return ONLY a valid JSON object with these exact keys:
 Do not include any text outside the JSON object."""
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
+        # Sentiment is the lowest priority class: under load it is shed rather than queued
+        content = await get_gateway().chat(
+            [
                 {
                     "role": "system",
                     "content": "You are an AI teaching assistant that analyzes lecture delivery. Always respond with valid JSON only, no additional text."
@@ -67,12 +78,12 @@ Do not include any text outside the JSON object."""
                     "content": prompt
                 }
             ],
+            model="gpt-4",
+            priority=PRIORITY_SENTIMENT,
             temperature=0.3,  # Lower temperature for more consistent analysis
             max_tokens=200
         )
         
-        content = response.choices[0].message.content.strip()
-        
         # Extract JSON if wrapped in code blocks
         if content.startswith("```json"):
             content = content.replace("```json", "").replace("```", "").strip()
@@ -84,6 +95,24 @@ Do not include any text outside the JSON object."""
         
         return sentiment_data
     
+    except GatewayOverloaded as e:
+        global _last_skip_log, _skips_suppressed
+        now = time.monotonic()
+        if now - _last_skip_log >= SKIP_LOG_INTERVAL:
+            logger.warning("Skipping sentiment checkpoint under load (%d more skipped since last report): %s",
+                           _skips_suppressed, e)
+            _last_skip_log, _skips_suppressed = now, 0
+        else:
+            _skips_suppressed += 1
+        return {
+            'sentiment_score': 0.0,
+            'sentiment_label': 'neutral',
+            'confidence': 0.0,
+            'tone_description': 'Skipped (service busy)',
+            'engagement_indicators': [],
+            'skipped': True
+        }
+    
     except Exception as e:
         print(f"Error analyzing sentiment: {e}")
         return {
@@ -0,0 +1,151 @@
+"""
+Segment-list transcript store.
+
+A live lecture transcript grows by one segment per transcription batch.
+Keeping it as one string means rebuilding an ever longer string on every
+batch; this store keeps the timestamped segments in a list instead:
+
+- append is O(1)
+- the full text is joined lazily and cached until the next append
+- tail reads (last N characters or last N seconds) only touch the segments
+  they return
+- segments can be looked up by sequence number or by time
+"""
+
+from bisect import bisect_left
+from datetime import datetime
+from typing import List, Optional
+import time
+
+
+class TranscriptSegment:
+    """One transcribed batch."""
+
+    __slots__ = ('seq', 'text', 'start', 'end')
+
+    def __init__(self, seq: int, text: str, start: float, end: float):
+        self.seq = seq      # Increments by 1 per segment
+        self.text = text
+        self.start = start  # Epoch seconds
+        self.end = end
+
+    def to_dict(self) -> dict:
+        return {
+            'seq': self.seq,
+            'text': self.text,
+            'start': datetime.utcfromtimestamp(self.start).isoformat(),
+            'end': datetime.utcfromtimestamp(self.end).isoformat(),
+        }
+
+
+class TranscriptStore:
+    """Append-only list of transcript segments with a cached full-text join."""
+
+    SEPARATOR = " "
+
+    def __init__(self, start_seq: int = 0):
+        """
+        Args:
+            start_seq: Sequence number before the first segment (to continue
+                numbering from segments stored elsewhere)
+        """
+        self._base_seq = start_seq
+        self.segments: List[TranscriptSegment] = []
+        self._starts: List[float] = []  # Segment start times, for bisecting by time
+        self._chars = 0
+        self._text_cache: Optional[str] = None
+
+    def __len__(self) -> int:
+        """Number of segments."""
+        return len(self.segments)
+
+    def __bool__(self) -> bool:
+        return self._chars > 0
+
+    @property
+    def last_seq(self) -> int:
+        """Sequence number of the latest segment (start_seq if empty)."""
+        return self.segments[-1].seq if self.segments else self._base_seq
+
+    def continue_from(self, seq: int) -> None:
+        """Number new segments after seq (only while the store is still empty)."""
+        if self.segments:
+            raise ValueError("cannot renumber a non-empty transcript")
+        self._base_seq = seq
+
+    @property
+    def char_count(self) -> int:
+        """Length of text() without building it."""
+        return self._chars
+
+    def append(self, text: str, end: Optional[float] = None, duration: float = 0.0) -> Optional[TranscriptSegment]:
+        """
+        Add a segment.
+
+        Args:
+            text: Segment text (blank text is ignored)
+            end: Epoch seconds when the segment's audio ended (default: now)
+            duration: Seconds of audio the segment covers
+
+        Returns:
+            The new segment, or None if text was blank
+        """
+        text = text.strip()
+        if not text:
+            return None
+        end = time.time() if end is None else end
+        segment = TranscriptSegment(self.last_seq + 1, text, end - duration, end)
+        if self.segments:
+            self._chars += len(self.SEPARATOR)
+        self._chars += len(text)
+        self.segments.append(segment)
+        self._starts.append(segment.start)
+        self._text_cache = None
+        return segment
+
+    def text(self) -> str:
+        """The full transcript (joined once per change)."""
+        if self._text_cache is None:
+            self._text_cache = self.SEPARATOR.join(segment.text for segment in self.segments)
+        return self._text_cache
+
+    def tail_chars(self, max_chars: int) -> str:
+        """The last max_chars characters of text(), built from the trailing segments only."""
+        if max_chars <= 0 or not self.segments:
+            return ""
+        if self._text_cache is not None or max_chars >= self._chars:
+            return self.text()[-max_chars:]
+        parts = []
+        used = 0
+        for segment in reversed(self.segments):
+            parts.append(segment.text)
+            used += len(segment.text) + len(self.SEPARATOR)
+            if used >= max_chars:
+                break
+        parts.reverse()
+        return self.SEPARATOR.join(parts)[-max_chars:]
+
+    def tail_seconds(self, seconds: float, now: Optional[float] = None) -> str:
+        """Text of the segments that ended within the last `seconds` (relative to now or the last segment)."""
+        if not self.segments:
+            return ""
+        now = self.segments[-1].end if now is None else now
+        return self.SEPARATOR.join(s.text for s in self.between(now - seconds, now))
+
+    def between(self, start: float, end: float) -> List[TranscriptSegment]:
+        """Segments overlapping the [start, end] time range (epoch seconds)."""
+        # Segments are appended in time order; step back over ones that started earlier but end inside
+        index = bisect_left(self._starts, start)
+        while index > 0 and self.segments[index - 1].end > start:
+            index -= 1
+        result = []
+        for segment in self.segments[index:]:
+            if segment.start > end:
+                break
+            result.append(segment)
+        return result
+
+    def since(self, seq: int) -> List[TranscriptSegment]:
+        """Segments with a sequence number greater than seq."""
+        # seq numbers are contiguous, so they index the list directly
+        return self.segments[max(seq - self._base_seq, 0):]
@@ -4,13 +4,22 @@ Whisper transcription helper for voice pipeline.
 Handles audio transcription using OpenAI Whisper API.
 """
 
+import io
 import os
-import tempfile
 import soundfile as sf
 import numpy as np
-from openai import OpenAI
 from typing import Optional
 
+from .executor_pool import get_pool
+from .llm_gateway import PRIORITY_TRANSCRIPTION, get_gateway
+
+
+def _encode_wav(audio_data: np.ndarray, sr: int) -> bytes:
+    """Encode audio as an in-memory WAV file (no temp file on disk)."""
+    buffer = io.BytesIO()
+    sf.write(buffer, audio_data, sr, format='WAV')
+    return buffer.getvalue()
+
 
 def transcribe_audio_chunk(audio_data: np.ndarray, 
                           sr: int = 22050,
@@ -18,6 +27,9 @@ def transcribe_audio_chunk(audio_data: np.ndarray,
     """
     Transcribe audio chunk using OpenAI Whisper API.
     
+    Blocking version for scripts running outside an event loop; the server
+    uses transcribe_audio_chunk_async so requests are rate limited by the gateway.
+    
     Args:
         audio_data: Audio waveform as numpy array
         sr: Sample rate (default 22050 Hz)
@@ -33,46 +45,46 @@ def transcribe_audio_chunk(audio_data: np.ndarray,
     if not openai_api_key:
         raise ValueError("OPENAI_API_KEY not found in environment variables")
     
-    # Initialize OpenAI client
-    client = OpenAI(api_key=openai_api_key)
+    gateway = get_gateway()
+    if gateway.api_key is None:
+        gateway.api_key = openai_api_key
     
-    # Convert numpy array to temporary WAV file
-    tmp_file = None
-    try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_file:
-            tmp_file_path = tmp_file.name
-            # Write audio data as WAV file
-            sf.write(tmp_file_path, audio_data, sr, format='WAV')
-        
-        # Transcribe using Whisper API
-        with open(tmp_file_path, "rb") as audio_file:
-            transcript = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file
-            )
-        
-        # Return the transcribed text directly (Whisper returns a Transcription object with .text attribute)
-        return transcript.text.strip()
+    # Transcribe using Whisper API
+    transcript = gateway.sync_client.audio.transcriptions.create(
+        model="whisper-1",
+        file=("audio.wav", _encode_wav(audio_data, sr))
+    )
     
-    finally:
-        # Clean up temporary file
-        if tmp_file and os.path.exists(tmp_file_path):
-            try:
-                os.unlink(tmp_file_path)
-            except:
-                pass
+    # Return the transcribed text directly (Whisper returns a Transcription object with .text attribute)
+    return transcript.text.strip()
 
 
 async def transcribe_audio_chunk_async(audio_data: np.ndarray,
                                       sr: int = 22050,
-                                      openai_api_key: Optional[str] = None) -> str:
+                                      openai_api_key: Optional[str] = None,
+                                      priority: int = PRIORITY_TRANSCRIPTION) -> str:
     """
-    Async version of transcribe_audio_chunk.
+    Async version of transcribe_audio_chunk, routed through the shared LLM gateway.
+    
+    Args:
+        audio_data: Audio waveform as numpy array
+        sr: Sample rate (default 22050 Hz)
+        openai_api_key: OpenAI API key (if None, tries to get from env)
+        priority: Gateway priority class (PRIORITY_FINAL_TRANSCRIPTION for end-of-lecture audio)
     
-    Note: OpenAI API calls are synchronous, but this allows it to be awaited
-    in async contexts (you may want to run it in executor for true async).
+    Returns:
+        Transcribed text string
     """
-    # For now, just call sync version
-    # In production, you might want to run in executor for true async
-    return transcribe_audio_chunk(audio_data, sr, openai_api_key)
-
+    if openai_api_key is None:
+        openai_api_key = os.getenv("OPENAI_API_KEY")
+    
+    if not openai_api_key:
+        raise ValueError("OPENAI_API_KEY not found in environment variables")
+    
+    gateway = get_gateway()
+    if gateway.api_key is None:
+        gateway.api_key = openai_api_key
+    
+    # Encoding a 10s batch is blocking work; keep it off the event loop
+    wav = await get_pool("transcription").run(_encode_wav, audio_data, sr)
+    return await gateway.transcribe(("audio.wav", wav), priority=priority)
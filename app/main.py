@@ -1,10 +1,16 @@
 from fastapi import FastAPI, WebSocket, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from app.routes import (
     auth, classes, lectures, questions, attendance, participation, 
     students, analytics, streaks, engagement, settings
 )
 from app.websockets.audio_handler import audio_websocket_handler
+from app.websockets.audio_stages import render_stage_metrics
+from app.websockets.broadcast import render_broadcast_metrics
+from app.sharding import proxy_websocket, should_proxy_websocket
+from ai_assistant.voice_pipeline.llm_gateway import render_metrics
+from ai_assistant.voice_pipeline.executor_pool import render_pool_metrics, shutdown_pools
 
 app = FastAPI(title="XP Lab API", version="2.0.0")
 
@@ -56,8 +62,24 @@ async def root():
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """LLM gateway, audio stage, executor pool and student broadcast counters in Prometheus text format."""
+    return render_metrics() + render_stage_metrics() + render_pool_metrics() + render_broadcast_metrics()
+
+
+@app.on_event("shutdown")
+async def shutdown_executor_pools():
+    """Let running decode/DSP/transcription jobs finish, then stop the pool threads."""
+    shutdown_pools(wait=True)
+
+
 @app.websocket("/audio/stream/{lecture_id}")
 async def audio_stream_endpoint(websocket: WebSocket, lecture_id: str, professor_id: str = Query(...)):
     """WebSocket endpoint for professor to stream audio for AI analysis."""
+    # Live lecture state is kept by the worker that owns the lecture
+    if should_proxy_websocket(websocket, lecture_id):
+        await proxy_websocket(websocket, lecture_id)
+        return
     await audio_websocket_handler(websocket, lecture_id, professor_id)
 
@@ -1,5 +1,7 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 from app.database import supabase
+from app.sharding import forward_if_remote
+from app.utils.log import get_logger
 from typing import Dict, List
 from datetime import datetime, timezone
 try:
@@ -11,6 +13,7 @@ except Exception:
 import os
 
 router = APIRouter()
+log = get_logger(__name__)
 
 
 # Module-level datetime parser (used by multiple endpoints)
@@ -34,13 +37,18 @@ def _parse_dt_eastern(dt_str):
         return None
 
 @router.get("/lectures/{lecture_id}")
-async def get_lecture_analytics(lecture_id: str, professor_id: str = Query(...)):
+async def get_lecture_analytics(lecture_id: str, professor_id: str = Query(...), request: Request = None):
     """Get post-lecture analytics for a professor."""
+    # Live sentiment and talk time are only available on the worker that owns the lecture
+    forwarded = await forward_if_remote(request, lecture_id)
+    if forwarded is not None:
+        return forwarded
+    
     try:
         # Verify professor owns the lecture
         lecture_result = supabase.table("lectures").select("*").eq("lecture_id", lecture_id).execute()
         if not lecture_result.data:
-            print(f"❌ Lecture {lecture_id} not found in database")
+            log.info("analytics_lecture_missing", lecture_id=lecture_id)
             raise HTTPException(status_code=404, detail="Lecture not found")
         
         lecture = lecture_result.data[0]
@@ -49,20 +57,18 @@ async def get_lecture_analytics(lecture_id: str, professor_id: str = Query(...))
         class_result = supabase.table("classes").select("*").eq("class_id", class_id).execute()
         
         if not class_result.data:
-            print(f"❌ Class {class_id} not found for lecture {lecture_id}")
+            log.info("analytics_class_missing", lecture_id=lecture_id, class_id=class_id)
             raise HTTPException(status_code=404, detail="Class not found")
         
         if class_result.data[0]["professor_id"] != professor_id:
-            print(f"❌ Unauthorized: Professor {professor_id} does not own lecture {lecture_id}")
+            log.info("analytics_not_authorized", lecture_id=lecture_id, professor_id=professor_id)
             raise HTTPException(status_code=403, detail="Not authorized")
         
         class_data = class_result.data[0]
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Error in analytics endpoint: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("analytics_failed", lecture_id=lecture_id, error=e)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
     
     # Get lecture details
@@ -96,7 +102,7 @@ async def get_lecture_analytics(lecture_id: str, professor_id: str = Query(...))
                 dt = dt.astimezone(EASTERN_TZ)
             return dt
         except Exception as e:
-            print(f"⚠ Error parsing datetime {dt_str}: {e}")
+            log.warning("analytics_datetime_unparseable", lecture_id=lecture_id, value=dt_str, error=e, every=10.0)
             return None
     
     # Calculate duration - try multiple methods for reliability
@@ -105,24 +111,20 @@ async def get_lecture_analytics(lecture_id: str, professor_id: str = Query(...))
     # First, try to get duration_minutes directly from lectures table (saved during end_lecture)
     try:
         lecture_check = supabase.table("lectures").select("duration_minutes, start_time, end_time").eq("lecture_id", lecture_id).execute()
-        print(f"🔍 Analytics duration lookup: lecture_check.data={lecture_check.data}")
         if lecture_check.data:
             db_duration = lecture_check.data[0].get("duration_minutes")
-            print(f"🔍 DB duration_minutes value: {db_duration} (type: {type(db_duration)})")
             if db_duration is not None:
                 duration_minutes = int(db_duration) if db_duration is not None else 0
                 if duration_minutes > 0:
-                    print(f"✓ Using duration_minutes from lectures table: {duration_minutes} minutes")
+                    log.debug("analytics_duration", lecture_id=lecture_id, source="lectures", minutes=duration_minutes)
                 else:
-                    print(f"⚠ duration_minutes in DB is 0 or None for lecture {lecture_id}")
+                    log.debug("analytics_duration_zero", lecture_id=lecture_id, source="lectures")
             else:
-                print(f"⚠ duration_minutes is None in database for lecture {lecture_id}")
+                log.debug("analytics_duration_missing", lecture_id=lecture_id, source="lectures")
         else:
-            print(f"⚠ Could not find lecture {lecture_id} in database")
+            log.warning("analytics_lecture_missing", lecture_id=lecture_id)
     except Exception as e:
-        print(f"⚠ Could not get duration_minutes from lectures table: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("analytics_duration_failed", lecture_id=lecture_id, source="lectures", error=e)
     
     # Fallback: try to get from lecture_reports table
     if duration_minutes == 0:
@@ -131,9 +133,9 @@ async def get_lecture_analytics(lecture_id: str, professor_id: str = Query(...))
             if report_check.data and report_check.data[0].get("duration_minutes") is not None:
                 duration_minutes = int(report_check.data[0].get("duration_minutes", 0))
                 if duration_minutes > 0:
-                    print(f"✓ Using duration_minutes from lecture_reports table: {duration_minutes} minutes")
+                    log.debug("analytics_duration", lecture_id=lecture_id, source="lecture_reports", minutes=duration_minutes)
         except Exception as e:
-            print(f"⚠ Could not get duration_minutes from lecture_reports table: {e}")
+            log.warning("analytics_duration_failed", lecture_id=lecture_id, source="lecture_reports", error=e)
     
     # Last resort: calculate from start_time and end_time
     if duration_minutes == 0 and start_time and end_time:
@@ -144,13 +146,11 @@ async def get_lecture_analytics(lecture_id: str, professor_id: str = Query(...))
                 duration_seconds = (end_dt - start_dt).total_seconds()
                 duration_minutes = max(0, int(duration_seconds / 60))
                 if duration_minutes > 0:
-                    print(f"✓ Calculated duration from start_time/end_time: {duration_minutes} minutes ({duration_seconds:.1f} seconds)")
+                    log.debug("analytics_duration", lecture_id=lecture_id, source="start_end", minutes=duration_minutes)
                 else:
-                    print(f"⚠ Calculated duration is 0 or negative: {duration_seconds:.1f} seconds")
+                    log.warning("analytics_duration_nonpositive", lecture_id=lecture_id, seconds=duration_seconds)
         except Exception as e:
-            print(f"⚠ Error calculating duration from start_time/end_time: {e}")
-            import traceback
-            traceback.print_exc()
+            log.exception("analytics_duration_failed", lecture_id=lecture_id, source="start_end", error=e)
             duration_minutes = 0
     
     # Format date
@@ -162,7 +162,7 @@ async def get_lecture_analytics(lecture_id: str, professor_id: str = Query(...))
             else:
                 formatted_date = "N/A"
         except Exception as e:
-            print(f"⚠ Error formatting date: {e}")
+            log.warning("analytics_date_format_failed", lecture_id=lecture_id, error=e)
             formatted_date = "N/A"
     else:
         formatted_date = "N/A"
@@ -195,9 +195,10 @@ async def get_lecture_analytics(lecture_id: str, professor_id: str = Query(...))
     engagement_timeline = []
     engagement_score = 75  # Default
     try:
-        from app.websockets.audio_handler import voice_pipelines, lecture_talk_time
-        if lecture_id in voice_pipelines:
-            pipeline = voice_pipelines[lecture_id]
+        from app.websockets.lecture_session import get_session
+        live_session = get_session(lecture_id)
+        if live_session is not None and live_session.pipeline is not None:
+            pipeline = live_session.pipeline
             if hasattr(pipeline, 'sentiment_history') and pipeline.sentiment_history:
                 sentiment_history = pipeline.sentiment_history
                 
@@ -250,16 +251,16 @@ async def get_lecture_analytics(lecture_id: str, professor_id: str = Query(...))
                                                     "engagement": round(engagement_value, 1)
                                                 })
                                         except Exception as e:
-                                            print(f"⚠ Error processing sentiment timestamp: {e}")
+                                            log.warning("analytics_sentiment_timestamp_failed", lecture_id=lecture_id, error=e, every=10.0)
                                             pass
                         except Exception as e:
-                            print(f"⚠ Error parsing start_time: {e}")
+                            log.warning("analytics_start_time_unparseable", lecture_id=lecture_id, error=e)
                             pass
                     
                     # Blend in delivery dynamics from fast metrics (pace, pitch variation, filler)
                     try:
-                        if lecture_id in voice_pipelines:
-                            fm_history = getattr(voice_pipelines[lecture_id], 'fast_metrics_history', [])
+                        if live_session is not None:
+                            fm_history = getattr(live_session.pipeline, 'fast_metrics_history', [])
                             if fm_history and start_time:
                                 start_dt = parse_datetime(start_time)
                                 # Build a quick lookup of delivery scores by second
@@ -328,11 +329,9 @@ async def get_lecture_analytics(lecture_id: str, professor_id: str = Query(...))
                                         prev = val
                                     engagement_timeline = smoothed
                     except Exception as e:
-                        print(f"⚠ Delivery blending error: {e}")
+                        log.warning("analytics_delivery_blend_failed", lecture_id=lecture_id, error=e)
     except Exception as e:
-        print(f"⚠ Could not get sentiment history from pipeline: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("analytics_sentiment_history_failed", lecture_id=lecture_id, error=e)
     
     # If no timeline data, generate default based on duration (every 15 seconds)
     if not engagement_timeline and duration_minutes > 0:
@@ -346,8 +345,9 @@ async def get_lecture_analytics(lecture_id: str, professor_id: str = Query(...))
     # Get talk time ratio
     professor_talk_time_seconds = 0
     try:
-        from app.websockets.audio_handler import lecture_talk_time
-        professor_talk_time_seconds = lecture_talk_time.get(lecture_id, 0.0)
+        from app.websockets.lecture_session import get_session
+        live_session = get_session(lecture_id)
+        professor_talk_time_seconds = live_session.talk_time if live_session is not None else 0.0
     except:
         pass
     
@@ -369,12 +369,13 @@ async def get_lecture_analytics(lecture_id: str, professor_id: str = Query(...))
                         student_talk_time_seconds += max(0, question_duration)
                         questions_from_db += 1
                 except Exception as e:
-                    print(f"⚠ Error calculating question duration: {e}")
+                    log.warning("analytics_question_duration_failed", lecture_id=lecture_id, error=e, every=10.0)
                     pass
     
     # Also detect questions in transcript (when professor asks questions that weren't tracked in DB)
     # Look for question patterns in transcript and estimate time for questions not in database
-    transcript = lecture.get("transcript", "")
+    from app.services.transcript_checkpoint import get_lecture_transcript
+    transcript = get_lecture_transcript(lecture_id, lecture)
     if transcript:
         # Count question marks in transcript
         total_question_marks = transcript.count("?")
@@ -401,7 +402,8 @@ async def get_lecture_analytics(lecture_id: str, professor_id: str = Query(...))
             professor_base_ratio = min((professor_talk_time_seconds / total_seconds) * 100, 100)
             student_base_ratio = min((student_talk_time_seconds / total_seconds) * 100, 100)
             
-            print(f"📊 Talk time calculation: prof_sec={professor_talk_time_seconds:.1f}, student_sec={student_talk_time_seconds:.1f}, total_sec={total_seconds}, prof_base={professor_base_ratio:.1f}%, student_base={student_base_ratio:.1f}%")
+            log.debug("analytics_talk_time", lecture_id=lecture_id, professor_seconds=professor_talk_time_seconds,
+                      student_seconds=student_talk_time_seconds, total_seconds=total_seconds)
             
             # If student time (questions) exceeds professor time, adjust
             # This can happen if many questions were asked
@@ -430,14 +432,14 @@ async def get_lecture_analytics(lecture_id: str, professor_id: str = Query(...))
                 professor_ratio = (professor_ratio / total_ratio) * 100
                 student_ratio = (student_ratio / total_ratio) * 100
             
-            print(f"✓ Final talk time ratio: Professor={professor_ratio:.1f}%, Students={student_ratio:.1f}%")
+            log.debug("analytics_talk_time_ratio", lecture_id=lecture_id, professor=professor_ratio, students=student_ratio)
         else:
-            print(f"⚠ total_seconds is 0, cannot calculate talk time ratio")
+            log.warning("analytics_talk_time_ratio_unavailable", lecture_id=lecture_id, reason="total_seconds is 0")
             # Only use fallback if we truly cannot calculate
             professor_ratio = 68
             student_ratio = 32
     else:
-        print(f"⚠ duration_minutes is 0, cannot calculate talk time ratio (using fallback 68/32)")
+        log.warning("analytics_talk_time_ratio_unavailable", lecture_id=lecture_id, reason="duration is 0")
         # Only use fallback if duration is truly unavailable
         professor_ratio = 68
         student_ratio = 32
@@ -496,7 +498,7 @@ async def get_lecture_analytics(lecture_id: str, professor_id: str = Query(...))
         else:
             supabase.table("lecture_reports").insert(payload).execute()
     except Exception as e:
-        print(f"⚠ Failed to upsert lecture report snapshot in analytics: {e}")
+        log.warning("analytics_report_snapshot_failed", lecture_id=lecture_id, error=e)
     
     return {
         "lecture_id": lecture_id,
@@ -535,8 +537,12 @@ async def list_reports(professor_id: str = Query(...)):
 
 
 @router.get("/reports/{lecture_id}")
-async def get_report(lecture_id: str, professor_id: str = Query(...)):
+async def get_report(lecture_id: str, professor_id: str = Query(...), request: Request = None):
     """Fetch a stored lecture analytics report; fallback to on-demand analytics if missing."""
+    forwarded = await forward_if_remote(request, lecture_id)
+    if forwarded is not None:
+        return forwarded
+    
     try:
         res = supabase.table("lecture_reports").select("*").eq("lecture_id", lecture_id).execute()
         if res.data:
@@ -549,7 +555,7 @@ async def get_report(lecture_id: str, professor_id: str = Query(...)):
                 report["date_formatted"] = "N/A"
             return report
     except Exception as e:
-        print(f"⚠ Failed to fetch stored report: {e}")
+        log.warning("report_fetch_failed", lecture_id=lecture_id, error=e)
     # Fallback: compute on-demand and persist snapshot so it appears next time
     analytics = await get_lecture_analytics(lecture_id, professor_id)  # type: ignore
     try:
@@ -585,8 +591,8 @@ async def get_report(lecture_id: str, professor_id: str = Query(...)):
             supabase.table("lecture_reports").update(payload).eq("lecture_id", lecture_id).execute()
         else:
             supabase.table("lecture_reports").insert(payload).execute()
-        print(f"📝 Saved fallback lecture report snapshot for {lecture_id}")
+        log.info("report_snapshot_saved", lecture_id=lecture_id, fallback=True)
     except Exception as e:
-        print(f"⚠ Failed to persist fallback report snapshot: {e}")
+        log.warning("report_snapshot_save_failed", lecture_id=lecture_id, fallback=True, error=e)
     return analytics
 
@@ -1,15 +1,25 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File
+from fastapi import APIRouter, HTTPException, UploadFile, File, Request
 from app.database import supabase
 from app.models.lecture import Lecture, LectureCreate, LectureStatus
 from app.utils.lecture_code import generate_lecture_code
 from app.config import settings
+from app.sharding import forward_if_remote
+from app.utils.log import get_logger, lecture_debug_enabled, set_lecture_debug
+from app.websockets.lecture_events import STARTED, lecture_events
+from pydantic import BaseModel
 from uuid import uuid4
 from datetime import datetime, timezone
 from typing import Optional
 import aiofiles
+import asyncio
 import os
 
 router = APIRouter()
+log = get_logger(__name__)
+
+
+class DebugLoggingUpdate(BaseModel):
+    enabled: bool
 
 
 @router.post("", response_model=Lecture)
@@ -29,8 +39,13 @@ async def create_lecture(lecture_data: LectureCreate):
 
 
 @router.post("/{lecture_id}/start")
-async def start_lecture(lecture_id: str):
+async def start_lecture(lecture_id: str, request: Request):
     """Start a lecture and generate a 4-digit code."""
+    # The started event must reach the worker that owns the lecture (its suggestion timer)
+    forwarded = await forward_if_remote(request, lecture_id)
+    if forwarded is not None:
+        return forwarded
+    
     lecture_code = generate_lecture_code()
     start_time = datetime.utcnow()
     
@@ -48,25 +63,37 @@ async def start_lecture(lecture_id: str):
     }).eq("lecture_id", lecture_id).execute()
     
     if result.data:
+        lecture_events.publish(lecture_id, STARTED)
         return {"lecture_code": lecture_code, "start_time": start_time.isoformat()}
     raise HTTPException(status_code=404, detail="Lecture not found")
 
 
 @router.post("/{lecture_id}/end")
-async def end_lecture(lecture_id: str):
+async def end_lecture(lecture_id: str, request: Request):
     """End a lecture and save transcript if available."""
+    # The live transcript and pipeline live on the worker that owns the lecture
+    forwarded = await forward_if_remote(request, lecture_id)
+    if forwarded is not None:
+        return forwarded
+    
     end_time = datetime.utcnow()
     
     # Try to get transcript from memory (if WebSocket is still active)
-    transcript_to_save = None
+    transcript_text = None  # For the report and the response
+    transcript_to_save = None  # Also written to lectures.transcript
     try:
-        from app.websockets.audio_handler import lecture_transcripts
-        if lecture_id in lecture_transcripts:
-            transcript_to_save = lecture_transcripts[lecture_id]
+        from app.websockets.lecture_session import get_session
+        live_session = get_session(lecture_id)
+        if live_session is not None:
+            transcript_text = live_session.transcript.text()
+            # Checkpointed segments are enough; only write the full text if checkpointing failed
+            checkpointer = live_session.checkpointer
+            if checkpointer is None or not await checkpointer.flush():
+                transcript_to_save = transcript_text
             if transcript_to_save and len(transcript_to_save.strip()) > 0:
-                print(f"💾 Saving transcript from memory for lecture {lecture_id} ({len(transcript_to_save)} chars)...")
+                log.info("transcript_saving_from_memory", lecture_id=lecture_id, chars=len(transcript_to_save))
     except Exception as e:
-        print(f"⚠ Could not access transcript from memory: {e}")
+        log.warning("transcript_memory_unavailable", lecture_id=lecture_id, error=e)
     
     # Calculate duration BEFORE updating the lecture (we need start_time from current record)
     duration_minutes = 0
@@ -77,7 +104,8 @@ async def end_lecture(lecture_id: str):
             start_time_str = current_lecture.data[0].get("start_time")
             existing_end_time = current_lecture.data[0].get("end_time")
             
-            print(f"🔍 Duration calculation debug: lecture_id={lecture_id}, start_time={start_time_str}, existing_end_time={existing_end_time}, new_end_time={end_time.isoformat()}")
+            log.debug("duration_inputs", lecture_id=lecture_id, start_time=start_time_str,
+                      existing_end_time=existing_end_time, new_end_time=end_time.isoformat())
             
             if start_time_str:
                 # Helper function for robust datetime parsing
@@ -108,28 +136,25 @@ async def end_lecture(lecture_id: str):
                 sdt = parse_dt(start_time_str)
                 edt = parse_dt(end_time.isoformat())
                 
-                print(f"🔍 Parsed datetimes: sdt={sdt}, edt={edt}")
                 
                 if sdt and edt:
                     duration_seconds = (edt - sdt).total_seconds()
                     duration_minutes = max(0, int(duration_seconds / 60))
-                    print(f"✓ Calculated duration: {duration_minutes} minutes ({duration_seconds:.1f} seconds) from {sdt} to {edt}")
+                    log.debug("duration_calculated", lecture_id=lecture_id, minutes=duration_minutes, seconds=duration_seconds)
                 else:
-                    print(f"⚠ Could not parse start_time={start_time_str} (parsed={sdt}) or end_time={end_time.isoformat()} (parsed={edt})")
+                    log.warning("duration_unparseable", lecture_id=lecture_id, start_time=start_time_str,
+                                end_time=end_time.isoformat())
                     duration_minutes = 0
             else:
-                print(f"⚠ Missing start_time in lecture record for {lecture_id}")
+                log.warning("duration_missing_start_time", lecture_id=lecture_id)
                 duration_minutes = 0
         else:
-            print(f"⚠ Could not find lecture {lecture_id} to calculate duration")
+            log.warning("duration_lecture_missing", lecture_id=lecture_id)
             duration_minutes = 0
     except Exception as e:
-        print(f"⚠ Error calculating duration: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("duration_failed", lecture_id=lecture_id, error=e)
         duration_minutes = 0
     
-    print(f"🔍 Final duration_minutes before save: {duration_minutes}")
     
     # Update lecture with end time, status, transcript, AND duration_minutes
     update_data = {
@@ -141,7 +166,8 @@ async def end_lecture(lecture_id: str):
     if transcript_to_save:
         update_data["transcript"] = transcript_to_save
     
-    print(f"🔍 Updating lecture {lecture_id} with: {update_data}")
+    log.debug("lecture_ending", lecture_id=lecture_id, minutes=duration_minutes,
+              transcript_chars=len(transcript_text or ""))
     
     # Force-return updated row so result.data is populated (and proceed with snapshot regardless)
     result = supabase.table("lectures").update(update_data).eq("lecture_id", lecture_id).select("*").execute()
@@ -149,9 +175,8 @@ async def end_lecture(lecture_id: str):
     if result.data:
         # Verify duration was saved correctly
         saved_duration = result.data[0].get("duration_minutes")
-        print(f"🔍 Duration saved to database: {saved_duration} (expected: {duration_minutes})")
         if saved_duration is None or saved_duration != duration_minutes:
-            print(f"⚠ WARNING: Duration mismatch! Saved={saved_duration}, Expected={duration_minutes}")
+            log.warning("duration_mismatch", lecture_id=lecture_id, saved=saved_duration, expected=duration_minutes)
         
         # Attempt to snapshot a lecture report for later access
         try:
@@ -162,7 +187,6 @@ async def end_lecture(lecture_id: str):
             end_time_str = lecture_row.get("end_time")
             # Use duration_minutes from the database (should match what we saved)
             duration_minutes = lecture_row.get("duration_minutes", duration_minutes)
-            print(f"🔍 Using duration_minutes from database row: {duration_minutes}")
             class_row = supabase.table("classes").select("*").eq("class_id", class_id).execute().data[0] if class_id else None
             topic = class_row.get("name") if class_row else "Lecture"
             professor_id = class_row.get("professor_id") if class_row else None
@@ -171,9 +195,10 @@ async def end_lecture(lecture_id: str):
             engagement_score = 75
             engagement_timeline = []
             try:
-                from app.websockets.audio_handler import voice_pipelines
-                if lecture_id in voice_pipelines and start_time:
-                    pipeline = voice_pipelines[lecture_id]
+                from app.websockets.lecture_session import get_session
+                live_session = get_session(lecture_id)
+                if live_session is not None and live_session.pipeline is not None and start_time:
+                    pipeline = live_session.pipeline
                     sent_hist = getattr(pipeline, "sentiment_history", [])
                     if sent_hist:
                         # Calculate headline score using corrected mapping and confidence gating (>=0.5)
@@ -199,16 +224,17 @@ async def end_lecture(lecture_id: str):
                             except:
                                 continue
             except Exception as e:
-                print(f"⚠ Could not build engagement for report: {e}")
+                log.warning("report_engagement_failed", lecture_id=lecture_id, error=e)
 
             # Talk time ratios - calculate properly using question periods
             professor_ratio = None
             student_ratio = None
             try:
-                from app.websockets.audio_handler import lecture_talk_time
+                from app.websockets.lecture_session import get_session
+                live_session = get_session(lecture_id)
                 # Total seconds for ratio
                 total_seconds = duration_minutes * 60 if duration_minutes and duration_minutes > 0 else 0
-                prof_seconds = lecture_talk_time.get(lecture_id, 0.0) if total_seconds else 0.0
+                prof_seconds = live_session.talk_time if (total_seconds and live_session is not None) else 0.0
                 
                 # Get student talk time from question periods (same logic as analytics.py)
                 student_talk_time_seconds = 0.0
@@ -242,17 +268,17 @@ async def end_lecture(lecture_id: str):
                                         student_talk_time_seconds += max(0, question_duration)
                                         questions_from_db += 1
                                 except Exception as e:
-                                    print(f"⚠ Error calculating question duration: {e}")
+                                    log.warning("report_question_duration_failed", lecture_id=lecture_id, error=e)
                                     pass
                     
                     # Also estimate from transcript question marks
-                    if transcript_to_save:
-                        total_question_marks = transcript_to_save.count("?")
+                    if transcript_text:
+                        total_question_marks = transcript_text.count("?")
                         untracked_questions = max(0, total_question_marks - questions_from_db)
                         estimated_question_time = untracked_questions * 5  # 5 seconds per untracked question
                         student_talk_time_seconds += estimated_question_time
                 except Exception as e:
-                    print(f"⚠ Error calculating student talk time: {e}")
+                    log.warning("report_student_talk_time_failed", lecture_id=lecture_id, error=e)
                     pass
                 
                 if total_seconds > 0:
@@ -278,13 +304,12 @@ async def end_lecture(lecture_id: str):
                         professor_ratio = (professor_ratio / total_ratio) * 100
                         student_ratio = (student_ratio / total_ratio) * 100
                     
-                    print(f"✓ Talk time ratio calculated: Professor={professor_ratio:.1f}%, Students={student_ratio:.1f}% (prof_sec={prof_seconds:.1f}, student_sec={student_talk_time_seconds:.1f}, total_sec={total_seconds})")
+                    log.debug("report_talk_time_ratio", lecture_id=lecture_id, professor=professor_ratio,
+                              students=student_ratio, total_seconds=total_seconds)
                 else:
-                    print(f"⚠ Cannot calculate talk time ratio: total_seconds={total_seconds}")
+                    log.warning("report_talk_time_ratio_unavailable", lecture_id=lecture_id, total_seconds=total_seconds)
             except Exception as e:
-                print(f"⚠ Error calculating talk time ratios: {e}")
-                import traceback
-                traceback.print_exc()
+                log.exception("report_talk_time_ratio_failed", lecture_id=lecture_id, error=e)
                 pass
 
             # Participation rate snapshot
@@ -313,18 +338,18 @@ async def end_lecture(lecture_id: str):
                     "participation_rate": float(round(participation_rate, 1)),
                     "timeline": engagement_timeline,
                     "summary": {
-                        "transcript_chars": len(transcript_to_save) if transcript_to_save else 0
+                        "transcript_chars": len(transcript_text) if transcript_text else 0
                     }
                 }
                 if exists.data:
                     supabase.table("lecture_reports").update(payload).eq("lecture_id", lecture_id).execute()
                 else:
                     supabase.table("lecture_reports").insert(payload).execute()
-                print(f"📝 Saved lecture report snapshot for {lecture_id}")
+                log.info("report_snapshot_saved", lecture_id=lecture_id)
             except Exception as e:
-                print(f"⚠ Failed saving lecture report snapshot: {e}")
+                log.warning("report_snapshot_save_failed", lecture_id=lecture_id, error=e)
         except Exception as e:
-            print(f"⚠ Report snapshot flow failed: {e}")
+            log.warning("report_snapshot_failed", lecture_id=lecture_id, error=e)
 
         # Mark lecture ended in the audio websocket handler to stop further processing
         try:
@@ -332,12 +357,16 @@ async def end_lecture(lecture_id: str):
             mark_lecture_ended(lecture_id)
         except Exception as e:
             # Non-fatal if websocket handler isn't loaded; just log
-            print(f"ℹ Could not mark lecture {lecture_id} as ended in audio handler: {e}")
+            log.info("audio_handler_end_failed", lecture_id=lecture_id, error=e)
+        
+        # No more questions for this lecture: drop its in-memory slide index
+        from app.services.slide_index import drop_slide_index
+        drop_slide_index(lecture_id)
 
         message = {"message": "Lecture ended", "end_time": end_time.isoformat()}
-        if transcript_to_save:
+        if transcript_text:
             message["transcript_saved"] = True
-            message["transcript_length"] = len(transcript_to_save)
+            message["transcript_length"] = len(transcript_text)
         return message
     raise HTTPException(status_code=404, detail="Lecture not found")
 
@@ -348,7 +377,12 @@ async def get_lecture(lecture_id: str):
     result = supabase.table("lectures").select("*").eq("lecture_id", lecture_id).execute()
     
     if result.data:
-        return Lecture(**result.data[0])
+        lecture = result.data[0]
+        if not lecture.get("transcript"):
+            # Transcripts are checkpointed as segments; rebuild the full text on first read
+            from app.services.transcript_checkpoint import get_lecture_transcript
+            lecture["transcript"] = get_lecture_transcript(lecture_id, lecture) or None
+        return Lecture(**lecture)
     raise HTTPException(status_code=404, detail="Lecture not found")
 
 
@@ -436,11 +470,16 @@ async def get_lecture_attendance(lecture_id: str):
 
 
 @router.post("/{lecture_id}/upload-presentation")
-async def upload_presentation(lecture_id: str, file: UploadFile = File(...)):
+async def upload_presentation(lecture_id: str, request: Request, file: UploadFile = File(...)):
     """Upload presentation file to Supabase Storage."""
     # Read file content
     content = await file.read()
     
+    # Index the slides on the worker that owns the lecture (it caches the index)
+    forwarded = await forward_if_remote(request, lecture_id, files={"file": (file.filename, content, file.content_type)})
+    if forwarded is not None:
+        return forwarded
+    
     # Upload to Supabase Storage
     file_path = f"presentations/{lecture_id}/{file.filename}"
     
@@ -460,7 +499,28 @@ async def upload_presentation(lecture_id: str, file: UploadFile = File(...)):
             "presentation_file_url": url_response
         }).eq("lecture_id", lecture_id).execute()
         
-        return {"message": "File uploaded successfully", "url": url_response}
+        # Extract slide text once and index it for question generation
+        response = {"message": "File uploaded successfully", "url": url_response, "slides_indexed": 0}
+        try:
+            from app.services.slide_index import index_presentation
+            response["slides_indexed"] = await asyncio.to_thread(index_presentation, lecture_id, content, file.filename)
+        except Exception as e:
+            # The upload itself succeeded; tell the client why questions won't use the slides
+            log.warning("slide_indexing_failed", lecture_id=lecture_id, error=e)
+            response["slides_error"] = str(e)
+        
+        return response
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Upload failed: {str(e)}")
 
+
+@router.put("/{lecture_id}/debug-logging")
+async def set_debug_logging(lecture_id: str, update: DebugLoggingUpdate, request: Request):
+    """Turn per-chunk DEBUG logging on or off for one live lecture."""
+    # The switch lives on the worker streaming the lecture's audio
+    forwarded = await forward_if_remote(request, lecture_id)
+    if forwarded is not None:
+        return forwarded
+    set_lecture_debug(lecture_id, update.enabled)
+    log.info("lecture_debug_logging", lecture_id=lecture_id, enabled=update.enabled)
+    return {"lecture_id": lecture_id, "debug_logging": lecture_debug_enabled(lecture_id)}
@@ -1,46 +1,71 @@
-from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect
 from app.database import supabase
+from app.sharding import forward_if_remote, proxy_websocket, should_proxy_websocket
 from app.models.question import Question, QuestionCreate, QuestionResponse, QuestionResult, QuestionStatus, QuestionMode
-from app.services.ai_service import generate_question_full, generate_answers_only
+from app.services.ai_service import stream_question_full, stream_answers_only
 from app.services.gamification import increment_correct_answers
+from app.websockets.broadcast import DROP, EVICT, student_broadcasts
 from uuid import uuid4
 from datetime import datetime
-from typing import Dict, Set
+from typing import Dict
 import asyncio
 import json
 
 router = APIRouter()
 
-# Store active question timers and WebSocket connections
+# Store active question timers (student sockets are in student_broadcasts)
 active_question_timers: Dict[str, asyncio.Task] = {}
-question_websockets: Dict[str, Set[WebSocket]] = {}  # lecture_id -> set of websockets
 
 
 @router.post("", response_model=Question)
-async def create_question(question_data: QuestionCreate, professor_id: str):
+async def create_question(question_data: QuestionCreate, professor_id: str, request: Request):
     """Create a question (AI-generated, manual, or hybrid)."""
     question_id = str(uuid4())
     lecture_id = question_data.lecture_id
     
-    # Get recent lecture transcript for context (fallback)
-    from app.websockets.audio_handler import lecture_transcripts
-    lecture_context = lecture_transcripts.get(lecture_id, "Recent lecture content...")
-    if len(lecture_context) > 2000:
-        lecture_context = lecture_context[-2000:]  # Last 2000 chars
-    
-    # Get slide content if provided (from frontend - PowerPoint material)
-    slide_content = getattr(question_data, 'slide_content', None) or ""
+    # The live transcript and professor socket live on the worker that owns the lecture
+    forwarded = await forward_if_remote(request, lecture_id)
+    if forwarded is not None:
+        return forwarded
+    
+    # Get recent lecture transcript for context (fallback), trimmed to the
+    # question prompt's token budget on sentence boundaries
+    from app.websockets.lecture_session import get_session
+    from ai_assistant.voice_pipeline.context_builder import get_budget, trim_to_tokens
+    live_session = get_session(lecture_id)
+    budget = get_budget("question")
+    # ~8 chars per token is a generous upper bound, so only the transcript tail is trimmed
+    lecture_context = live_session.transcript.tail_chars(budget * 8) if live_session is not None else ""
+    lecture_context = trim_to_tokens(lecture_context, budget, keep="tail")[0] or "Recent lecture content..."
     
     question_text = question_data.question_text
+    
     option_a = question_data.option_a
     option_b = question_data.option_b
     option_c = question_data.option_c
     option_d = question_data.option_d
     correct_answer = question_data.correct_answer
     
+    # Stream partial AI output to the professor's live lecture socket while it generates
+    from app.websockets.audio_handler import send_to_professor
+    
+    async def send_partial(fields: Dict):
+        await send_to_professor(lecture_id, {
+            "type": "question_generation_partial",
+            "question_id": question_id,
+            "mode": question_data.mode.value,
+            "question": fields
+        })
+    
     if question_data.mode == QuestionMode.AI_FULL:
-        # AI generates everything - prioritize slide content over transcript
-        ai_result = await generate_question_full(lecture_context, slide_content=slide_content)
+        # AI generates everything - prioritize slide content over transcript.
+        # Use slide content if provided (from frontend - PowerPoint material),
+        # otherwise retrieve the slides most relevant to the recent transcript
+        slide_content = getattr(question_data, 'slide_content', None) or ""
+        if not slide_content:
+            from app.services.slide_index import retrieve_slide_context
+            slide_content = await retrieve_slide_context(lecture_id, question_text or lecture_context)
+        ai_result = await stream_question_full(lecture_context, slide_content=slide_content, on_partial=send_partial)
         question_text = ai_result["question_text"]
         option_a = ai_result["option_a"]
         option_b = ai_result["option_b"]
@@ -54,7 +79,7 @@ async def create_question(question_data: QuestionCreate, professor_id: str):
         if not question_text:
             raise HTTPException(status_code=400, detail="Question text required for hybrid mode")
         
-        ai_result = await generate_answers_only(question_text, lecture_context)
+        ai_result = await stream_answers_only(question_text, lecture_context, on_partial=send_partial)
         option_a = ai_result["option_a"]
         option_b = ai_result["option_b"]
         option_c = ai_result["option_c"]
@@ -88,7 +113,7 @@ async def create_question(question_data: QuestionCreate, professor_id: str):
 
 
 @router.post("/{question_id}/trigger")
-async def trigger_question(question_id: str):
+async def trigger_question(question_id: str, request: Request):
     """Trigger a question to all students (Kahoot-style 20-second timer)."""
     # Get question
     question_result = supabase.table("questions").select("*").eq("question_id", question_id).execute()
@@ -99,7 +124,12 @@ async def trigger_question(question_id: str):
     question = question_result.data[0]
     lecture_id = question["lecture_id"]
     
-    # Reset AI question timer (when professor manually triggers)
+    # Student sockets and question timers live on the worker that owns the lecture
+    forwarded = await forward_if_remote(request, lecture_id)
+    if forwarded is not None:
+        return forwarded
+    
+    # Restart the AI suggestion window (when professor manually triggers)
     from app.websockets.audio_handler import reset_question_timer
     reset_question_timer(lecture_id)
     
@@ -110,34 +140,23 @@ async def trigger_question(question_id: str):
         "triggered_at": triggered_at.isoformat()
     }).eq("question_id", question_id).execute()
     
-    # Broadcast to all connected students
-    if lecture_id in question_websockets:
-        question_data = {
-            "type": "question_triggered",
-            "question_id": question_id,
-            "question_text": question["question_text"],
-            "option_a": question["option_a"],
-            "option_b": question["option_b"],
-            "option_c": question["option_c"],
-            "option_d": question["option_d"],
-            "timer": 20
-        }
-        
-        # Send to all connected students
-        disconnected = set()
-        for ws in question_websockets[lecture_id]:
-            try:
-                await ws.send_json(question_data)
-            except:
-                disconnected.add(ws)
-        
-        # Remove disconnected websockets
-        question_websockets[lecture_id] -= disconnected
-        
-        # Start 20-second timer
-        active_question_timers[question_id] = asyncio.create_task(
-            question_timer(question_id, lecture_id, 20)
-        )
+    # Broadcast to all connected students (queued per socket; a student who can't take it is reconnected)
+    question_data = {
+        "type": "question_triggered",
+        "question_id": question_id,
+        "question_text": question["question_text"],
+        "option_a": question["option_a"],
+        "option_b": question["option_b"],
+        "option_c": question["option_c"],
+        "option_d": question["option_d"],
+        "timer": 20
+    }
+    student_broadcasts.broadcast(lecture_id, question_data, policy=EVICT)
+    
+    # Start 20-second timer
+    active_question_timers[question_id] = asyncio.create_task(
+        question_timer(question_id, lecture_id, 20)
+    )
     
     return {"message": "Question triggered", "question_id": question_id}
 
@@ -148,22 +167,12 @@ async def question_timer(question_id: str, lecture_id: str, duration: int):
     for remaining in range(duration, 0, -1):
         await asyncio.sleep(1)
         
-        # Broadcast countdown to students
-        if lecture_id in question_websockets:
-            countdown_data = {
-                "type": "timer_update",
-                "question_id": question_id,
-                "time_remaining": remaining
-            }
-            
-            disconnected = set()
-            for ws in question_websockets[lecture_id]:
-                try:
-                    await ws.send_json(countdown_data)
-                except:
-                    disconnected.add(ws)
-            
-            question_websockets[lecture_id] -= disconnected
+        # Broadcast countdown to students (a lagging socket just skips ticks)
+        student_broadcasts.broadcast(lecture_id, {
+            "type": "timer_update",
+            "question_id": question_id,
+            "time_remaining": remaining
+        }, policy=DROP)
     
     # Reveal answer
     await reveal_question_answer(question_id, lecture_id)
@@ -198,28 +207,18 @@ async def reveal_question_answer(question_id: str, lecture_id: str):
     }).eq("question_id", question_id).execute()
     
     # Broadcast results
-    if lecture_id in question_websockets:
-        result_data = {
-            "type": "answer_revealed",
-            "question_id": question_id,
-            "correct_answer": correct_answer,
-            "total_responses": total_responses,
-            "correct_count": correct_count,
-            "response_rate": round(response_rate, 2)
-        }
-        
-        disconnected = set()
-        for ws in question_websockets[lecture_id]:
-            try:
-                await ws.send_json(result_data)
-            except:
-                disconnected.add(ws)
-        
-        question_websockets[lecture_id] -= disconnected
+    student_broadcasts.broadcast(lecture_id, {
+        "type": "answer_revealed",
+        "question_id": question_id,
+        "correct_answer": correct_answer,
+        "total_responses": total_responses,
+        "correct_count": correct_count,
+        "response_rate": round(response_rate, 2)
+    }, policy=EVICT)
 
 
 @router.post("/{question_id}/respond")
-async def submit_answer(question_id: str, response_data: QuestionResponse, student_id: str):
+async def submit_answer(question_id: str, response_data: QuestionResponse, student_id: str, request: Request):
     """Student submits answer to a question."""
     # Get question
     question_result = supabase.table("questions").select("*").eq("question_id", question_id).execute()
@@ -229,6 +228,11 @@ async def submit_answer(question_id: str, response_data: QuestionResponse, stude
     
     question = question_result.data[0]
     
+    # Question timers and student sockets (an early reveal) live on the worker that owns the lecture
+    forwarded = await forward_if_remote(request, question["lecture_id"])
+    if forwarded is not None:
+        return forwarded
+    
     # Check if question is still active
     if question["status"] != QuestionStatus.TRIGGERED.value:
         raise HTTPException(status_code=400, detail="Question is no longer active")
@@ -321,7 +325,7 @@ async def get_question_results(question_id: str):
 
 
 @router.post("/{question_id}/accept")
-async def accept_ai_suggestion(question_id: str, professor_id: str):
+async def accept_ai_suggestion(question_id: str, professor_id: str, request: Request):
     """Professor accepts an AI-suggested question and triggers it."""
     # Get question
     question_result = supabase.table("questions").select("*").eq("question_id", question_id).execute()
@@ -331,15 +335,19 @@ async def accept_ai_suggestion(question_id: str, professor_id: str):
     
     question = question_result.data[0]
     
+    forwarded = await forward_if_remote(request, question["lecture_id"])
+    if forwarded is not None:
+        return forwarded
+    
     if not question["ai_suggested"]:
         raise HTTPException(status_code=400, detail="Question is not an AI suggestion")
     
     # Trigger the question
-    return await trigger_question(question_id)
+    return await trigger_question(question_id, request)
 
 
 @router.post("/{question_id}/reject")
-async def reject_ai_suggestion(question_id: str, professor_id: str):
+async def reject_ai_suggestion(question_id: str, professor_id: str, request: Request):
     """Professor rejects an AI-suggested question (+7 minutes to timer)."""
     # Get question and lecture
     question_result = supabase.table("questions").select("*").eq("question_id", question_id).execute()
@@ -350,6 +358,11 @@ async def reject_ai_suggestion(question_id: str, professor_id: str):
     question = question_result.data[0]
     lecture_id = question["lecture_id"]
     
+    # The suggestion timer lives on the worker that owns the lecture
+    forwarded = await forward_if_remote(request, lecture_id)
+    if forwarded is not None:
+        return forwarded
+    
     # Delete the rejected question
     supabase.table("questions").delete().eq("question_id", question_id).execute()
     
@@ -363,18 +376,23 @@ async def reject_ai_suggestion(question_id: str, professor_id: str):
 @router.websocket("/lectures/{lecture_id}/questions")
 async def question_websocket_endpoint(websocket: WebSocket, lecture_id: str):
     """WebSocket endpoint for students to receive questions in real-time."""
+    # Questions are broadcast by the worker that owns the lecture
+    if should_proxy_websocket(websocket, lecture_id):
+        await proxy_websocket(websocket, lecture_id)
+        return
+    
     await websocket.accept()
     
-    # Add to connections
-    if lecture_id not in question_websockets:
-        question_websockets[lecture_id] = set()
-    question_websockets[lecture_id].add(websocket)
+    # Add to connections (broadcasts reach it through its own send queue)
+    student_broadcasts.add(lecture_id, websocket)
     
     try:
         while True:
             # Keep connection alive and handle incoming messages
             data = await websocket.receive_text()
             # Echo back or handle specific messages if needed
-    except WebSocketDisconnect:
-        question_websockets[lecture_id].discard(websocket)
+    except (WebSocketDisconnect, RuntimeError):
+        pass  # Disconnected (or closed by the hub as a slow consumer)
+    finally:
+        student_broadcasts.discard(lecture_id, websocket)
 
@@ -1,34 +1,111 @@
-from openai import OpenAI
-from app.config import settings
-from typing import Dict
+from app.config import settings  # noqa: F401 - loads .env (OPENAI_API_KEY) before the gateway is used
+from ai_assistant.voice_pipeline.context_builder import ContextSection, build_context, get_budget
+from ai_assistant.voice_pipeline.llm_gateway import get_gateway, PRIORITY_QUESTION, PRIORITY_TRANSCRIPTION
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from time import monotonic
 import json
-import tempfile
-import os
+import re
 
-client = OpenAI(api_key=settings.openai_api_key)
+# All OpenAI traffic goes through the shared gateway (rate limits, priorities, coalescing)
+gateway = get_gateway()
+
+QUESTION_FIELDS = ("question_text", "option_a", "option_b", "option_c", "option_d", "correct_answer")
+ANSWER_FIELDS = QUESTION_FIELDS[1:]
+
+# Minimum seconds between partial updates while streaming (a field completing always sends)
+STREAM_PARTIAL_INTERVAL = 0.15
+
+PartialCallback = Callable[[Dict[str, str]], Awaitable[None]]
+
+
+def _parse_json_response(content: str) -> Dict:
+    """Parse a JSON completion, tolerating a surrounding code fence."""
+    # Try to extract JSON if there's extra text
+    if content.startswith("```json"):
+        content = content.replace("```json", "").replace("```", "").strip()
+    elif content.startswith("```"):
+        content = content.replace("```", "").strip()
+    
+    return json.loads(content)
+
+
+def _partial_json_fields(buffer: str, fields: Tuple[str, ...]) -> Tuple[Dict[str, str], int]:
+    """
+    Extract string fields from a (possibly incomplete) JSON object.
+    
+    Returns:
+        Tuple of (field -> text so far, number of fields whose closing quote has arrived)
+    """
+    pattern = re.compile(r'"(%s)"\s*:\s*"((?:[^"\\]|\\.)*)(")?' % "|".join(fields))
+    values: Dict[str, str] = {}
+    complete = 0
+    for match in pattern.finditer(buffer):
+        raw = match.group(2)
+        try:
+            values[match.group(1)] = json.loads('"' + raw + '"')
+        except ValueError:
+            # Escape sequence cut mid-stream (e.g. half of a \u escape) - drop it
+            raw = raw.rsplit("\\", 1)[0]
+            try:
+                values[match.group(1)] = json.loads('"' + raw + '"')
+            except ValueError:
+                values[match.group(1)] = raw
+        if match.group(3):
+            complete += 1
+    return values, complete
+
+
+def _validate_fields(data: Dict, fields: Tuple[str, ...]) -> Dict:
+    """Check a generated question/answer set has every field and a valid correct_answer."""
+    missing = [f for f in fields if not str(data.get(f) or "").strip()]
+    if missing:
+        raise ValueError(f"AI response is missing fields: {', '.join(missing)}")
+    data["correct_answer"] = str(data["correct_answer"]).strip().lower()
+    if data["correct_answer"] not in ("a", "b", "c", "d"):
+        raise ValueError(f"AI response has invalid correct_answer: {data['correct_answer']!r}")
+    return data
+
+
+async def _stream_json(messages: List[Dict], fields: Tuple[str, ...],
+                       on_partial: Optional[PartialCallback]) -> Dict:
+    """
+    Stream a JSON completion, reporting partial field values as they arrive.
+    
+    on_partial receives the fields decoded so far. The complete response is
+    parsed and validated before it is returned.
+    """
+    buffer = ""
+    last_sent: Dict[str, str] = {}
+    last_complete = 0
+    last_sent_at = 0.0
+    async for delta in gateway.stream_chat(messages, model="gpt-4", priority=PRIORITY_QUESTION):
+        buffer += delta
+        if on_partial is None:
+            continue
+        values, complete = _partial_json_fields(buffer, fields)
+        if not values or values == last_sent:
+            continue
+        now = monotonic()
+        if complete > last_complete or now - last_sent_at >= STREAM_PARTIAL_INTERVAL:
+            await on_partial(values)
+            last_sent, last_complete, last_sent_at = values, complete, now
+    
+    return _validate_fields(_parse_json_response(buffer.strip()), fields)
 
 
 async def transcribe_audio(audio_data: bytes) -> str:
     """Transcribe audio using OpenAI Whisper API."""
-    # Save to temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_file:
-        tmp_file.write(audio_data)
-        tmp_file_path = tmp_file.name
-    
-    try:
-        with open(tmp_file_path, "rb") as audio_file:
-            transcript = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file
-            )
-        return transcript.text
-    finally:
-        if os.path.exists(tmp_file_path):
-            os.unlink(tmp_file_path)
+    return await gateway.transcribe(("audio.wav", audio_data), priority=PRIORITY_TRANSCRIPTION)
 
 
 async def analyze_lecture_engagement(transcript: str, recent_minutes: int = 3) -> Dict:
     """Analyze lecture transcript for engagement, pacing, etc."""
+    transcript = build_context(
+        [ContextSection("transcript", transcript, keep="tail")],
+        get_budget("engagement"),
+        label="analyze_lecture_engagement"
+    )["transcript"]
+    
     prompt = f"""Analyze this lecture transcript segment and provide feedback in valid JSON format:
     
     Transcript: {transcript}
@@ -44,37 +121,33 @@ async def analyze_lecture_engagement(transcript: str, recent_minutes: int = 3) -
     
     Do not include any text outside the JSON object."""
     
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[
+    content = await gateway.chat(
+        [
             {"role": "system", "content": "You are an AI teaching assistant. Always respond with valid JSON only, no additional text."},
             {"role": "user", "content": prompt}
-        ]
+        ],
+        model="gpt-4",
+        priority=PRIORITY_QUESTION
     )
-    
-    content = response.choices[0].message.content.strip()
-    # Try to extract JSON if there's extra text
-    if content.startswith("```json"):
-        content = content.replace("```json", "").replace("```", "").strip()
-    elif content.startswith("```"):
-        content = content.replace("```", "").strip()
-    
-    return json.loads(content)
+    return _parse_json_response(content)
 
 
-async def generate_question_full(lecture_context: str, slide_content: str = None) -> Dict:
-    """Generate a complete multiple choice question with 4 options and correct answer.
+def _question_full_messages(lecture_context: str, slide_content: str = None) -> List[Dict]:
+    """Build the chat messages for a complete multiple choice question.
     
     Uses slide content (PowerPoint material) as primary context if provided,
     otherwise falls back to lecture transcript.
     """
     # Prioritize slide content if available (more structured and relevant)
     if slide_content and len(slide_content.strip()) > 50:
-        primary_context = slide_content
+        primary_context = ContextSection("slides", slide_content, keep="head")
         context_type = "PowerPoint presentation slides"
     else:
-        primary_context = lecture_context
+        primary_context = ContextSection("transcript", lecture_context, keep="tail")
         context_type = "lecture transcript"
+    primary_context = build_context(
+        [primary_context], get_budget("question"), label="generate_question_full"
+    )[primary_context.name]
     
     prompt = f"""Based on this {context_type} from the current lecture, create a multiple choice question in valid JSON format.
     
@@ -104,26 +177,46 @@ async def generate_question_full(lecture_context: str, slide_content: str = None
     
     Do not include any text outside the JSON object."""
     
-    response = client.chat.completions.create(
+    return [
+        {"role": "system", "content": "You are an educational content creator. Always respond with valid JSON only, no additional text."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+async def generate_question_full(lecture_context: str, slide_content: str = None) -> Dict:
+    """Generate a complete multiple choice question with 4 options and correct answer.
+    
+    Uses slide content (PowerPoint material) as primary context if provided,
+    otherwise falls back to lecture transcript.
+    """
+    content = await gateway.chat(
+        _question_full_messages(lecture_context, slide_content),
         model="gpt-4",
-        messages=[
-            {"role": "system", "content": "You are an educational content creator. Always respond with valid JSON only, no additional text."},
-            {"role": "user", "content": prompt}
-        ]
+        priority=PRIORITY_QUESTION
     )
+    return _parse_json_response(content)
+
+
+async def stream_question_full(lecture_context: str, slide_content: str = None,
+                               on_partial: Optional[PartialCallback] = None) -> Dict:
+    """Streaming version of generate_question_full.
     
-    content = response.choices[0].message.content.strip()
-    # Try to extract JSON if there's extra text
-    if content.startswith("```json"):
-        content = content.replace("```json", "").replace("```", "").strip()
-    elif content.startswith("```"):
-        content = content.replace("```", "").strip()
-    
-    return json.loads(content)
+    on_partial is awaited with the question text and options decoded so far
+    while the completion streams in; the validated question is returned.
+    """
+    return await _stream_json(
+        _question_full_messages(lecture_context, slide_content), QUESTION_FIELDS, on_partial
+    )
 
 
-async def generate_answers_only(question_text: str, lecture_context: str) -> Dict:
-    """Generate 4 multiple choice options and correct answer for a given question."""
+def _answers_only_messages(question_text: str, lecture_context: str) -> List[Dict]:
+    """Build the chat messages for generating the options of a given question."""
+    lecture_context = build_context(
+        [ContextSection("transcript", lecture_context, keep="tail")],
+        get_budget("answers"),
+        label="generate_answers_only"
+    )["transcript"]
+    
     prompt = f"""Given this question and lecture context, generate 4 multiple choice options in valid JSON format:
     
     Question: {question_text}
@@ -141,20 +234,26 @@ async def generate_answers_only(question_text: str, lecture_context: str) -> Dic
     Ensure one option is clearly correct based on the context, and the others are plausible but incorrect.
     Do not include any text outside the JSON object."""
     
-    response = client.chat.completions.create(
+    return [
+        {"role": "system", "content": "You are an educational content creator. Always respond with valid JSON only, no additional text."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+async def generate_answers_only(question_text: str, lecture_context: str) -> Dict:
+    """Generate 4 multiple choice options and correct answer for a given question."""
+    content = await gateway.chat(
+        _answers_only_messages(question_text, lecture_context),
         model="gpt-4",
-        messages=[
-            {"role": "system", "content": "You are an educational content creator. Always respond with valid JSON only, no additional text."},
-            {"role": "user", "content": prompt}
-        ]
+        priority=PRIORITY_QUESTION
+    )
+    return _parse_json_response(content)
+
+
+async def stream_answers_only(question_text: str, lecture_context: str,
+                              on_partial: Optional[PartialCallback] = None) -> Dict:
+    """Streaming version of generate_answers_only (on_partial receives the options so far)."""
+    return await _stream_json(
+        _answers_only_messages(question_text, lecture_context), ANSWER_FIELDS, on_partial
     )
-    
-    content = response.choices[0].message.content.strip()
-    # Try to extract JSON if there's extra text
-    if content.startswith("```json"):
-        content = content.replace("```json", "").replace("```", "").strip()
-    elif content.startswith("```"):
-        content = content.replace("```", "").strip()
-    
-    return json.loads(content)
 
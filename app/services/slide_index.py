@@ -0,0 +1,239 @@
+"""
+Slide-content index for retrieval-backed question generation.
+
+Slide text is extracted once when a presentation is uploaded and kept in a
+small per-lecture BM25 index. Question generation then pulls only the few
+slides most relevant to the recent transcript instead of the whole deck.
+"""
+
+from typing import Dict, List, Optional, Tuple
+from collections import Counter
+from io import BytesIO
+from app.database import supabase
+from app.utils.log import get_logger
+import asyncio
+import math
+import os
+import re
+
+log = get_logger(__name__)
+
+# BM25 parameters (standard defaults)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+DEFAULT_TOP_K = 3
+MAX_CONTEXT_CHARS = 3000
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "in", "is", "it",
+    "its", "of", "on", "or", "that", "the", "this", "to", "was", "were", "will", "with", "we",
+    "you", "so", "um", "uh", "like", "okay", "right"
+}
+
+# In-memory indexes, rebuilt lazily from lecture_slides after a restart
+_slide_indexes: Dict[str, Optional["SlideIndex"]] = {}  # lecture_id -> SlideIndex (None = no slides)
+
+
+class SlideExtractionError(ValueError):
+    """Slide text could not be extracted (parser missing or file unreadable)."""
+
+
+def _tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in _STOPWORDS]
+
+
+class SlideIndex:
+    """BM25 index over the slides of a single presentation."""
+
+    def __init__(self, slides: List[str]):
+        """
+        Args:
+            slides: Slide texts in presentation order (slide 1 first)
+        """
+        self.slides = slides
+        self._term_freqs: List[Counter] = [Counter(_tokenize(s)) for s in slides]
+        self._lengths = [sum(tf.values()) for tf in self._term_freqs]
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+
+        doc_freq: Counter = Counter()
+        for tf in self._term_freqs:
+            doc_freq.update(tf.keys())
+        n = len(slides)
+        self._idf = {
+            term: math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            for term, df in doc_freq.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.slides)
+
+    def search(self, query: str, k: int = DEFAULT_TOP_K) -> List[Tuple[int, str, float]]:
+        """
+        Rank slides against a query.
+
+        Args:
+            query: Free text (usually the recent transcript window)
+            k: Number of slides to return
+
+        Returns:
+            List of (slide_number, slide_text, score), best first. Slide numbers are 1-based.
+        """
+        query_terms = Counter(_tokenize(query))
+        if not query_terms or not self.slides:
+            return []
+
+        scores = []
+        avg_length = self._avg_length or 1.0
+        for i, tf in enumerate(self._term_freqs):
+            score = 0.0
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[i] / avg_length)
+            for term, qf in query_terms.items():
+                f = tf.get(term)
+                if not f:
+                    continue
+                score += qf * self._idf.get(term, 0.0) * (f * (BM25_K1 + 1)) / (f + norm)
+            if score > 0:
+                scores.append((i + 1, self.slides[i], score))
+
+        scores.sort(key=lambda item: item[2], reverse=True)
+        return scores[:k]
+
+
+def extract_slide_texts(content: bytes, filename: str) -> List[str]:
+    """
+    Extract per-slide (or per-page) text from an uploaded presentation.
+
+    Supports .pptx (python-pptx), .pdf (pypdf) and plain text. Other formats
+    yield an empty list.
+
+    Raises:
+        SlideExtractionError: If the parser is not installed or the file can't be read
+    """
+    ext = os.path.splitext(filename or "")[1].lower()
+
+    try:
+        if ext == ".pptx":
+            from pptx import Presentation
+
+            slides = []
+            for slide in Presentation(BytesIO(content)).slides:
+                parts = []
+                for shape in slide.shapes:
+                    if getattr(shape, "has_text_frame", False) and shape.text_frame.text.strip():
+                        parts.append(shape.text_frame.text.strip())
+                if slide.has_notes_slide and slide.notes_slide.notes_text_frame is not None:
+                    notes = slide.notes_slide.notes_text_frame.text.strip()
+                    if notes:
+                        parts.append(notes)
+                slides.append("\n".join(parts))
+            return slides
+
+        if ext == ".pdf":
+            from pypdf import PdfReader
+
+            return [(page.extract_text() or "").strip() for page in PdfReader(BytesIO(content)).pages]
+
+        if ext in (".txt", ".md"):
+            text = content.decode("utf-8", errors="ignore")
+            # Treat blank-line separated blocks (or form feeds) as slides
+            return [block.strip() for block in re.split(r"\f|\n\s*\n", text) if block.strip()]
+    except ImportError as e:
+        log.warning("slide_extraction_unavailable", extension=ext, error=e)
+        raise SlideExtractionError(f"No parser available for {ext} files: {e}") from e
+    except Exception as e:
+        log.warning("slide_extraction_failed", filename=filename, error=e)
+        raise SlideExtractionError(f"Could not read slides from {filename}: {e}") from e
+
+    return []
+
+
+def index_presentation(lecture_id: str, content: bytes, filename: str) -> int:
+    """
+    Extract slide text, build the lecture's index and persist the slides.
+
+    Returns:
+        Number of slides indexed (0 if the file has no slide text)
+
+    Raises:
+        SlideExtractionError: If the slide text could not be extracted
+    """
+    slides = extract_slide_texts(content, filename)
+    if not any(s.strip() for s in slides):
+        return 0
+
+    _slide_indexes[lecture_id] = SlideIndex(slides)
+
+    # Persist slide text so the index can be rebuilt without re-parsing the file
+    try:
+        supabase.table("lecture_slides").delete().eq("lecture_id", lecture_id).execute()
+        supabase.table("lecture_slides").insert([
+            {"lecture_id": lecture_id, "slide_number": i + 1, "content": text}
+            for i, text in enumerate(slides)
+        ]).execute()
+    except Exception as e:
+        log.warning("slide_text_persist_failed", lecture_id=lecture_id, error=e)
+
+    return len(slides)
+
+
+def get_slide_index(lecture_id: str) -> Optional[SlideIndex]:
+    """Return the lecture's slide index, loading it from lecture_slides if needed (blocking)."""
+    if lecture_id in _slide_indexes:
+        return _slide_indexes[lecture_id]
+
+    try:
+        result = supabase.table("lecture_slides").select("slide_number, content").eq(
+            "lecture_id", lecture_id
+        ).order("slide_number").execute()
+    except Exception as e:
+        log.warning("slide_text_load_failed", lecture_id=lecture_id, error=e, every=10.0)
+        return None
+
+    if not result.data:
+        _slide_indexes[lecture_id] = None
+        return None
+
+    index = SlideIndex([row.get("content") or "" for row in result.data])
+    _slide_indexes[lecture_id] = index
+    return index
+
+
+async def load_slide_index(lecture_id: str) -> Optional[SlideIndex]:
+    """get_slide_index for async code: a cache miss queries the database off the event loop."""
+    if lecture_id in _slide_indexes:
+        return _slide_indexes[lecture_id]
+    return await asyncio.to_thread(get_slide_index, lecture_id)
+
+
+async def retrieve_slide_context(lecture_id: str, query: str,
+                                 k: int = DEFAULT_TOP_K,
+                                 max_chars: int = MAX_CONTEXT_CHARS) -> str:
+    """
+    Get the text of the k slides most relevant to the query.
+
+    Slides are returned in presentation order, labelled with their number,
+    and capped at max_chars. Returns "" if the lecture has no indexed slides.
+    """
+    index = await load_slide_index(lecture_id)
+    if index is None or not query:
+        return ""
+
+    hits = sorted(index.search(query, k), key=lambda hit: hit[0])
+    parts = []
+    remaining = max_chars
+    for slide_number, text, _ in hits:
+        block = f"Slide {slide_number}:\n{text.strip()}"
+        if len(block) > remaining:
+            block = block[:remaining]
+        parts.append(block)
+        remaining -= len(block)
+        if remaining <= 0:
+            break
+    return "\n\n".join(parts)
+
+
+def drop_slide_index(lecture_id: str) -> None:
+    """Forget the in-memory index for a lecture (persisted slides are kept)."""
+    _slide_indexes.pop(lecture_id, None)
@@ -0,0 +1,188 @@
+"""
+Write-behind transcript checkpointing.
+
+While a lecture is live its transcript only exists in worker memory. The
+checkpointer appends new segments to the lecture_transcript_segments table
+in batches - every CHECKPOINT_INTERVAL_SECONDS, or sooner once
+CHECKPOINT_MAX_SEGMENTS segments are waiting - from a background task, so
+a crashed worker loses at most one interval of transcript and the audio
+path never waits on the database.
+
+The full lectures.transcript column is then only a cache: get_lecture_transcript()
+rebuilds it from the segments when it is missing.
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional
+import asyncio
+import os
+
+from app.database import supabase
+from app.utils.log import get_logger
+from ai_assistant.voice_pipeline.transcript_store import TranscriptStore
+
+CHECKPOINT_INTERVAL_SECONDS = float(os.getenv("TRANSCRIPT_CHECKPOINT_INTERVAL", "30"))
+CHECKPOINT_MAX_SEGMENTS = int(os.getenv("TRANSCRIPT_CHECKPOINT_SEGMENTS", "6"))
+CHECKPOINT_READ_ATTEMPTS = 3      # tries to find where existing segments end
+CHECKPOINT_READ_BACKOFF = 0.5     # seconds, doubled after each failed try
+
+SEGMENTS_TABLE = "lecture_transcript_segments"
+
+log = get_logger(__name__)
+
+
+class TranscriptCheckpointer:
+    """Periodically appends a lecture's new transcript segments to the database."""
+
+    def __init__(self, lecture_id: str, store: TranscriptStore):
+        self.lecture_id = lecture_id
+        self.store = store
+        self.flushed_seq = 0  # Last segment known to be in the database
+        self.failures = 0     # Consecutive failed flushes
+        self.disabled = False  # Existing segments unknown: never write (see start)
+        self._wake = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        """Segments not yet written."""
+        return self.store.last_seq - self.flushed_seq
+
+    async def start(self) -> None:
+        """
+        Start the background writer.
+
+        If the lecture already has checkpointed segments (the professor
+        reconnected after the previous session closed), new segments are
+        numbered after them instead of overwriting them. If that can't be
+        read, the checkpointer stays stopped (flush() and stop() return False)
+        so the session falls back to saving the full transcript rather than
+        upserting over the stored segments.
+        """
+        if self._task is not None or self.disabled:
+            return
+        if not self.store.segments:
+            delay = CHECKPOINT_READ_BACKOFF
+            for attempt in range(1, CHECKPOINT_READ_ATTEMPTS + 1):
+                try:
+                    last_seq = await asyncio.to_thread(_last_stored_seq, self.lecture_id)
+                    break
+                except Exception as e:
+                    log.warning("transcript_checkpoint_read_failed", lecture_id=self.lecture_id,
+                                attempt=attempt, error=e)
+                    if attempt == CHECKPOINT_READ_ATTEMPTS:
+                        self.disabled = True
+                        return
+                    await asyncio.sleep(delay)
+                    delay *= 2
+            self.store.continue_from(last_seq)
+            self.flushed_seq = last_seq
+        self._task = asyncio.create_task(self._run())
+
+    def notify(self) -> None:
+        """Call after appending a segment; wakes the writer early once enough are waiting."""
+        if self.pending >= CHECKPOINT_MAX_SEGMENTS:
+            self._wake.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=CHECKPOINT_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self) -> bool:
+        """
+        Write all pending segments. Returns True if the database is up to date.
+
+        Rows are upserted on (lecture_id, seq), so a retry after a partial
+        failure never duplicates segments.
+        """
+        if self.disabled:
+            return False
+        async with self._lock:
+            segments = self.store.since(self.flushed_seq)
+            if not segments:
+                return self.failures == 0
+            rows = [
+                {
+                    "lecture_id": self.lecture_id,
+                    "seq": segment.seq,
+                    "text": segment.text,
+                    "started_at": datetime.utcfromtimestamp(segment.start).isoformat(),
+                    "ended_at": datetime.utcfromtimestamp(segment.end).isoformat(),
+                }
+                for segment in segments
+            ]
+            try:
+                # Sync Supabase client: run it off the event loop
+                await asyncio.to_thread(_upsert_segments, rows)
+            except Exception as e:
+                self.failures += 1
+                log.warning("transcript_checkpoint_failed", lecture_id=self.lecture_id, pending=len(rows),
+                            failures=self.failures, error=e, every=10.0)
+                return False
+            self.flushed_seq = segments[-1].seq
+            self.failures = 0
+            return True
+
+    async def stop(self) -> bool:
+        """Stop the background writer and flush what is left. Returns True if everything was written."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        return await self.flush()
+
+    def cancel(self) -> None:
+        """Stop the background writer without flushing (synchronous cleanup)."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+def _upsert_segments(rows: List[Dict]) -> None:
+    supabase.table(SEGMENTS_TABLE).upsert(rows, on_conflict="lecture_id,seq").execute()
+
+
+def _last_stored_seq(lecture_id: str) -> int:
+    result = supabase.table(SEGMENTS_TABLE).select("seq").eq(
+        "lecture_id", lecture_id
+    ).order("seq", desc=True).limit(1).execute()
+    return result.data[0]["seq"] if result.data else 0
+
+
+def load_transcript(lecture_id: str) -> str:
+    """Rebuild a lecture's transcript from its checkpointed segments ("" if there are none)."""
+    result = supabase.table(SEGMENTS_TABLE).select("seq, text").eq(
+        "lecture_id", lecture_id
+    ).order("seq").execute()
+    return " ".join(row["text"] for row in (result.data or []) if row.get("text"))
+
+
+def get_lecture_transcript(lecture_id: str, lecture: Optional[Dict] = None) -> str:
+    """
+    The lecture's full transcript: lectures.transcript if set, otherwise
+    rebuilt from the checkpointed segments (and cached back on an ended lecture).
+
+    Args:
+        lecture_id: Lecture to read
+        lecture: The lecture row, if already loaded
+    """
+    if lecture is not None and lecture.get("transcript"):
+        return lecture["transcript"]
+    try:
+        transcript = load_transcript(lecture_id)
+    except Exception as e:
+        log.warning("transcript_segments_load_failed", lecture_id=lecture_id, error=e)
+        return (lecture or {}).get("transcript") or ""
+    # Only cache once the lecture is over; a live lecture's segments are still growing
+    if transcript and lecture is not None and lecture.get("status") == "ended":
+        try:
+            supabase.table("lectures").update({"transcript": transcript}).eq("lecture_id", lecture_id).execute()
+        except Exception as e:
+            log.warning("transcript_cache_failed", lecture_id=lecture_id, error=e)
+    return transcript
@@ -0,0 +1,252 @@
+"""
+Lecture-affinity sharding across worker processes.
+
+Live lecture state (voice pipelines, transcripts, question sockets and timers)
+is kept in process memory, so every request that touches a lecture must be
+handled by the one worker that owns it. Each lecture is assigned to a worker
+by a stable hash of its id:
+
+- HTTP routes that touch live state call forward_if_remote() and replay the
+  request to the owning worker when it is not the local one
+- WebSockets (professor audio, student questions) are proxied to the owner
+  with proxy_websocket()
+
+Run all workers with `python -m app.sharding`: they share the public port
+(the kernel spreads connections across them) and each one also listens on a
+private port (SHARD_BASE_PORT + index) that the other workers forward to.
+With SHARD_COUNT unset or 1 everything is handled locally.
+
+Environment:
+    SHARD_COUNT      number of workers (launcher default: CPU count)
+    SHARD_INDEX      this worker's index (set by the launcher)
+    SHARD_HOST       host of the private worker ports (default 127.0.0.1)
+    SHARD_BASE_PORT  first private port (default 9100)
+    HOST, PORT       public address for the launcher (default 0.0.0.0:8000)
+"""
+
+from typing import Dict, Optional, Tuple
+import asyncio
+import hashlib
+import os
+
+from fastapi import Request, WebSocket
+from fastapi.responses import Response
+
+from app.utils.log import get_logger
+
+log = get_logger(__name__)
+
+SHARD_COUNT = max(int(os.getenv("SHARD_COUNT", "1")), 1)
+SHARD_INDEX = int(os.getenv("SHARD_INDEX", "0"))
+SHARD_HOST = os.getenv("SHARD_HOST", "127.0.0.1")
+SHARD_BASE_PORT = int(os.getenv("SHARD_BASE_PORT", "9100"))
+
+# Set on forwarded requests; a forwarded request is always handled locally (no forwarding loops)
+FORWARDED_HEADER = "x-shard-forwarded"
+
+FORWARD_TIMEOUT_SECONDS = 60.0
+
+# Hop-by-hop headers that must not be replayed
+_SKIP_HEADERS = {"host", "content-length", "connection", "keep-alive", "transfer-encoding", "upgrade"}
+
+_http_client = None
+
+
+def owner_of(lecture_id: str) -> int:
+    """Index of the worker that owns a lecture (stable across processes and restarts)."""
+    if SHARD_COUNT == 1:
+        return 0
+    digest = hashlib.sha1(lecture_id.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % SHARD_COUNT
+
+
+def is_local(lecture_id: str) -> bool:
+    """Whether this worker owns the lecture."""
+    return owner_of(lecture_id) == SHARD_INDEX
+
+
+def shard_address(index: int) -> Tuple[str, int]:
+    """Private (host, port) of a worker."""
+    return SHARD_HOST, SHARD_BASE_PORT + index
+
+
+def _get_http_client():
+    global _http_client
+    if _http_client is None:
+        import httpx
+        _http_client = httpx.AsyncClient(timeout=FORWARD_TIMEOUT_SECONDS)
+    return _http_client
+
+
+async def forward_if_remote(request: Optional[Request], lecture_id: str,
+                            files: Optional[Dict] = None) -> Optional[Response]:
+    """
+    Replay the request to the worker owning the lecture, if that is not this one.
+
+    Args:
+        request: Incoming request (None for internal calls)
+        lecture_id: Lecture the request operates on
+        files: For multipart uploads, the already-parsed files as
+            {field: (filename, content, content_type)}; the body stream has
+            been consumed by then, so the form is rebuilt from these
+
+    Returns:
+        The owner's response, or None if the request should be handled here
+        (local lecture, already forwarded, or an internal call without a request)
+    """
+    if request is None or SHARD_COUNT == 1 or is_local(lecture_id):
+        return None
+    if request.headers.get(FORWARDED_HEADER):
+        return None
+
+    host, port = shard_address(owner_of(lecture_id))
+    url = f"http://{host}:{port}{request.url.path}"
+    skip = _SKIP_HEADERS | ({"content-type"} if files else set())
+    headers = {k: v for k, v in request.headers.items() if k.lower() not in skip}
+    headers[FORWARDED_HEADER] = str(SHARD_INDEX)
+
+    if files:
+        body = {"files": files}
+    else:
+        body = {"content": await request.body()}
+    upstream = await _get_http_client().request(
+        request.method,
+        url,
+        params=request.query_params.multi_items(),
+        headers=headers,
+        **body,
+    )
+    response_headers = {
+        k: v for k, v in upstream.headers.items()
+        if k.lower() not in _SKIP_HEADERS and k.lower() != "content-encoding"
+    }
+    return Response(content=upstream.content, status_code=upstream.status_code, headers=response_headers)
+
+
+def should_proxy_websocket(websocket: WebSocket, lecture_id: str) -> bool:
+    """Whether a WebSocket for this lecture belongs to another worker."""
+    if SHARD_COUNT == 1 or is_local(lecture_id):
+        return False
+    return not websocket.headers.get(FORWARDED_HEADER)
+
+
+async def _connect_upstream(url: str):
+    """Open a client WebSocket to another worker, marked as forwarded."""
+    import websockets
+
+    headers = {FORWARDED_HEADER: str(SHARD_INDEX)}
+    try:
+        # websockets >= 13
+        from websockets.asyncio.client import connect
+        return await connect(url, additional_headers=headers, max_size=None)
+    except ImportError:
+        return await websockets.connect(url, extra_headers=headers, max_size=None)
+
+
+async def proxy_websocket(websocket: WebSocket, lecture_id: str) -> None:
+    """Relay a client WebSocket to the worker owning the lecture until either side closes."""
+    host, port = shard_address(owner_of(lecture_id))
+    url = f"ws://{host}:{port}{websocket.url.path}"
+    if websocket.url.query:
+        url += "?" + websocket.url.query
+
+    try:
+        upstream = await _connect_upstream(url)
+    except Exception as e:
+        log.warning("shard_unreachable", lecture_id=lecture_id, shard=owner_of(lecture_id), error=e, every=10.0)
+        await websocket.close(code=1013)  # Try again later
+        return
+
+    await websocket.accept()
+
+    async def client_to_upstream():
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes") is not None:
+                await upstream.send(message["bytes"])
+            elif message.get("text") is not None:
+                await upstream.send(message["text"])
+
+    async def upstream_to_client():
+        async for message in upstream:
+            if isinstance(message, bytes):
+                await websocket.send_bytes(message)
+            else:
+                await websocket.send_text(message)
+
+    tasks = [asyncio.create_task(client_to_upstream()), asyncio.create_task(upstream_to_client())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        try:
+            await upstream.close()
+        except Exception:
+            pass
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+
+
+def _run_worker(index: int, count: int, public_socket) -> None:
+    """Entry point of one worker process (spawned by main)."""
+    import socket
+    import uvicorn
+
+    global SHARD_INDEX, SHARD_COUNT
+    # This module was already imported (to unpickle the target) before the
+    # shard settings were known, so update them in place as well as in the env
+    SHARD_INDEX, SHARD_COUNT = index, count
+    os.environ["SHARD_INDEX"] = str(index)
+    os.environ["SHARD_COUNT"] = str(count)
+
+    private_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    private_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    private_socket.bind(shard_address(index))
+
+    config = uvicorn.Config("app.main:app", log_level=os.getenv("LOG_LEVEL", "info"))
+    uvicorn.Server(config).run(sockets=[public_socket, private_socket])
+
+
+def main() -> None:
+    """Start SHARD_COUNT workers sharing the public port."""
+    import multiprocessing
+    import socket
+
+    count = max(int(os.getenv("SHARD_COUNT") or os.cpu_count() or 1), 1)
+    host = os.getenv("HOST", "0.0.0.0")
+    port = int(os.getenv("PORT", "8000"))
+
+    public_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    public_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    public_socket.bind((host, port))
+    public_socket.set_inheritable(True)
+
+    print(f"🚀 Starting {count} lecture shards on {host}:{port} (private ports {SHARD_BASE_PORT}-{SHARD_BASE_PORT + count - 1})")
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=_run_worker, args=(i, count, public_socket), name=f"shard-{i}")
+        for i in range(count)
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        for worker in workers:
+            worker.join(timeout=5)
+
+
+if __name__ == "__main__":
+    main()
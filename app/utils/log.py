@@ -0,0 +1,196 @@
+"""
+Structured, leveled logging.
+
+Log lines are events with key=value fields instead of free-form prints:
+
+    log = get_logger(__name__)
+    log.info("transcription_complete", lecture_id=lecture_id, chars=len(text))
+    log.debug("pcm_chunk", lecture_id=lecture_id, every=5.0, bytes=len(data))
+
+Records go through a QueueHandler, and a background listener thread writes
+them to stdout, so a slow terminal or log collector never blocks the event
+loop. Hot-path events can be thinned out per call:
+
+- sample=0.1 keeps about one in ten
+- every=5.0 keeps at most one per 5 seconds (per logger and event); the next
+  line that gets through reports how many were suppressed
+
+DEBUG events are off unless LOG_LEVEL=DEBUG, except for lectures whose
+debug switch is on (set_lecture_debug, exposed as a lecture route): their
+events are logged in full, without sampling or rate limits.
+
+Environment: LOG_LEVEL (default INFO), LOG_FORMAT ("text" or "json").
+"""
+
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional, Set
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+LOG_LEVEL = logging.getLevelName(os.getenv("LOG_LEVEL", "INFO").upper())
+if not isinstance(LOG_LEVEL, int):
+    LOG_LEVEL = logging.INFO
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+
+ROOT_LOGGER = "xplab"
+
+_configure_lock = threading.Lock()
+_listener: Optional[QueueListener] = None
+
+# Lectures with the per-lecture debug switch on
+_debug_lectures: Set[str] = set()
+
+
+class _EventFormatter(logging.Formatter):
+    """Formats an event record as `time level logger event key=value ...` or as one JSON object."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields: Dict[str, Any] = getattr(record, "fields", {})
+        timestamp = self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}"
+        if LOG_FORMAT == "json":
+            entry = {"ts": timestamp, "level": record.levelname, "logger": record.name,
+                     "event": record.getMessage(), **fields}
+            if record.exc_text:
+                entry["exc"] = record.exc_text
+            return json.dumps(entry, default=str)
+        parts = [timestamp, record.levelname.ljust(7), record.name, record.getMessage()]
+        parts.extend(f"{key}={_format_value(value)}" for key, value in fields.items())
+        line = " ".join(parts)
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+class _EventQueueHandler(QueueHandler):
+    """Queues records as they are; only the traceback is rendered up front (it can't wait for the writer thread)."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _format_value(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:.3g}"
+    text = str(value)
+    return json.dumps(text) if (" " in text or not text) else text
+
+
+def configure() -> None:
+    """Install the queue handler and start the writer thread (idempotent)."""
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            return
+        records: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(_EventFormatter())
+        _listener = QueueListener(records, stream, respect_handler_level=False)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+        root = logging.getLogger(ROOT_LOGGER)
+        # The level check happens in EventLogger, so per-lecture debug can bypass it
+        root.setLevel(logging.DEBUG)
+        root.addHandler(_EventQueueHandler(records))
+        root.propagate = False
+
+
+def set_lecture_debug(lecture_id: str, enabled: bool) -> None:
+    """Turn full DEBUG logging on or off for one lecture."""
+    if enabled:
+        _debug_lectures.add(lecture_id)
+    else:
+        _debug_lectures.discard(lecture_id)
+
+
+def lecture_debug_enabled(lecture_id: Optional[str]) -> bool:
+    return lecture_id is not None and lecture_id in _debug_lectures
+
+
+class EventLogger:
+    """Logger for structured events, with sampling and rate limiting per event."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._logger = logging.getLogger(f"{ROOT_LOGGER}.{name}")
+        self._last_emitted: Dict[str, float] = {}  # event -> monotonic time of last emitted line
+        self._suppressed: Dict[str, int] = {}      # event -> lines dropped by `every` since then
+
+    def enabled_for(self, level: int, lecture_id: Optional[str] = None) -> bool:
+        """Whether an event at this level would be logged (use to skip building costly fields)."""
+        return level >= LOG_LEVEL or lecture_debug_enabled(lecture_id)
+
+    def log(self, level: int, event: str, lecture_id: Optional[str] = None,
+            sample: Optional[float] = None, every: Optional[float] = None,
+            exc_info: Any = False, **fields: Any) -> None:
+        """
+        Log an event.
+
+        Args:
+            level: logging level
+            event: Short event name (snake_case)
+            lecture_id: Lecture the event belongs to (enables per-lecture debug)
+            sample: Fraction of these events to keep (0-1)
+            every: Minimum seconds between two lines for this event
+            exc_info: True for the current exception's traceback, or an exc_info tuple
+            **fields: Event fields, written as key=value (None values are left out)
+        """
+        debugged = lecture_debug_enabled(lecture_id)
+        if level < LOG_LEVEL and not debugged:
+            return
+        if not debugged:
+            if sample is not None and random.random() >= sample:
+                return
+            if every is not None:
+                now = time.monotonic()
+                if now - self._last_emitted.get(event, float("-inf")) < every:
+                    self._suppressed[event] = self._suppressed.get(event, 0) + 1
+                    return
+                self._last_emitted[event] = now
+                suppressed = self._suppressed.pop(event, 0)
+                if suppressed:
+                    fields["suppressed"] = suppressed
+        fields = {key: value for key, value in fields.items() if value is not None}
+        if lecture_id is not None:
+            fields = {"lecture_id": lecture_id, **fields}
+        self._logger.log(level, event, exc_info=exc_info, extra={"fields": fields})
+
+    def debug(self, event: str, **kwargs: Any) -> None:
+        self.log(logging.DEBUG, event, **kwargs)
+
+    def info(self, event: str, **kwargs: Any) -> None:
+        self.log(logging.INFO, event, **kwargs)
+
+    def warning(self, event: str, **kwargs: Any) -> None:
+        self.log(logging.WARNING, event, **kwargs)
+
+    def error(self, event: str, **kwargs: Any) -> None:
+        self.log(logging.ERROR, event, **kwargs)
+
+    def exception(self, event: str, **kwargs: Any) -> None:
+        """Log at ERROR with the current exception's traceback."""
+        self.log(logging.ERROR, event, exc_info=True, **kwargs)
+
+
+_loggers: Dict[str, EventLogger] = {}
+
+
+def get_logger(name: str) -> EventLogger:
+    """The EventLogger for a module (usually get_logger(__name__))."""
+    logger = _loggers.get(name)
+    if logger is None:
+        configure()
+        logger = _loggers[name] = EventLogger(name)
+    return logger
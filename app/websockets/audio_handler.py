@@ -8,73 +8,129 @@ using the exact same logic as ai_assistant/test_mic_realtime.py
 from fastapi import WebSocket, WebSocketDisconnect
 from websockets.exceptions import ConnectionClosed, ConnectionClosedOK, ConnectionClosedError
 from app.database import supabase
+# Per-lecture live state (pipeline, batching buffers, timers, ...) lives on a LectureSession
+from app.websockets.lecture_session import LectureSession, close_session, get_session, open_session
+from app.services.transcript_checkpoint import TranscriptCheckpointer
+from app.websockets.webm_decoder import StreamingWebmDecoder, find_ffmpeg
+from app.websockets.audio_stages import BLOCK, DROP_NEWEST, MERGE, Stage, StageGraph
+from app.websockets.metrics_emitter import CoalescingEmitter
+from app.websockets.lecture_events import (
+    ENDED, PAUSED, QUESTION_TRIGGERED, RESUMED, STARTED, SUGGESTION_REJECTED, lecture_events,
+)
+from app.utils.log import get_logger
+from app.websockets.audio_protocol import FrameError, SequenceTracker, audio_ack, hello_ack, negotiate, parse_frame
 from uuid import uuid4
 from datetime import datetime
-from typing import Dict, Optional, Tuple
+from functools import partial
+from typing import Dict, List, Optional, Tuple
 import asyncio
 import base64
+import binascii
 import json
+import logging
 import tempfile
+import time
 import os
 import numpy as np
-from concurrent.futures import ThreadPoolExecutor
 
 # AI Assistant Voice Pipeline imports - USE THE EXACT LOGIC FROM ai_assistant
 import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from ai_assistant.voice_pipeline.pipeline_manager import VoicePipelineManager
+from ai_assistant.voice_pipeline.ring_buffer import AudioRingBuffer
+from ai_assistant.voice_pipeline.executor_pool import get_pool
+from ai_assistant.voice_pipeline.audio_archive import AudioArchiveWriter
+from ai_assistant.voice_pipeline.transcript_store import TranscriptStore
 from ai_assistant.voice_pipeline.fast_dsp import calculate_filler_rate, calculate_wpm
-from ai_assistant.voice_pipeline.whisper_transcriber import transcribe_audio_chunk
+from ai_assistant.voice_pipeline.whisper_transcriber import transcribe_audio_chunk_async
+from ai_assistant.voice_pipeline.llm_gateway import PRIORITY_FINAL_TRANSCRIPTION, PRIORITY_TRANSCRIPTION
+from ai_assistant.voice_pipeline.context_builder import count_tokens, get_budget, trim_to_tokens
 
 # Audio processing
 import librosa
 
-# Store active lecture transcripts and AI suggestion timers
-lecture_transcripts: Dict[str, str] = {}  # lecture_id -> accumulated transcript
-ai_suggestion_timers: Dict[str, asyncio.Task] = {}  # lecture_id -> timer task
-last_question_time: Dict[str, datetime] = {}  # lecture_id -> last question time
-rejection_delays: Dict[str, float] = {}  # lecture_id -> additional delay in seconds
-lecture_talk_time: Dict[str, float] = {}  # lecture_id -> total talk time in seconds (from audio chunks)
-
-# Store voice pipelines per lecture (using EXACT same structure as test_mic_realtime.py)
-voice_pipelines: Dict[str, VoicePipelineManager] = {}  # lecture_id -> VoicePipelineManager
-voice_pipeline_executors: Dict[str, ThreadPoolExecutor] = {}  # lecture_id -> ThreadPoolExecutor
-
-# Persist last-known clarity/pace between transcript batches for stable UI
-last_clarity: Dict[str, float] = {}  # lecture_id -> clarity (0-100)
-last_pace: Dict[str, float] = {}     # lecture_id -> pace (0-100)
-last_pitch: Dict[str, float] = {}    # lecture_id -> pitch (0-100)
-EMA_ALPHA = 0.4  # smoothing factor
-# Transcription batching (EXACT same as test_mic_realtime.py)
-transcription_buffers: Dict[str, list] = {}  # lecture_id -> list of audio chunks
-batch_chunk_indices: Dict[str, list] = {}  # lecture_id -> list of chunk indices
-accumulated_duration: Dict[str, float] = {}  # lecture_id -> accumulated seconds
-chunk_transcripts: Dict[str, dict] = {}  # lecture_id -> {chunk_idx: transcript}
-chunk_metric_indices: Dict[str, dict] = {}  # lecture_id -> {chunk_idx: metric_idx}
-
-# Queue for sentiment messages (to send in main loop)
-sentiment_queues: Dict[str, asyncio.Queue] = {}  # lecture_id -> Queue for sentiment messages
+log = get_logger(__name__)
 
-# Track first chunk for each lecture (to check magic bytes only once)
-first_chunk_received: Dict[str, bool] = {}  # lecture_id -> whether first chunk was received
+EMA_ALPHA = 0.4  # smoothing factor
 
-# Store PCM metadata for each lecture (from JSON messages, used when binary PCM arrives)
-pcm_metadata_queue: Dict[str, dict] = {}  # lecture_id -> PCM metadata dict
 
-# Lecture lifecycle flags
-lecture_ended: Dict[str, bool] = {}  # lecture_id -> ended flag
+async def send_to_professor(lecture_id: str, message: dict) -> bool:
+    """Send a message on the professor's audio WebSocket, if connected. Returns True if sent."""
+    session = get_session(lecture_id)
+    if session is None or session.websocket is None:
+        return False
+    if session.outbound_queue is not None:
+        # Go through the connection's sender task so messages stay in order
+        return _enqueue_outbound(session, message)
+    try:
+        await session.websocket.send_json(message)
+        return True
+    except Exception:
+        return False
 
 def mark_lecture_ended(lec_id: str) -> None:
     """Mark lecture as ended so the audio loop can exit promptly."""
-    try:
-        lecture_ended[lec_id] = True
-    except Exception:
-        pass
+    lecture_events.publish(lec_id, ENDED)
+    session = get_session(lec_id)
+    if session is not None:
+        session.mark_ended()
 
 # Settings (matching test_mic_realtime.py)
 SAMPLE_RATE = 22050  # Hz
 CHUNK_DURATION = 2.0  # seconds (from frontend - 2 second chunks)
 TRANSCRIPTION_BATCH_DURATION = 10.0  # seconds - batch transcription every 10s
+# Ring buffer room for two batches (a batch closes on the first chunk past the threshold)
+TRANSCRIPTION_RING_CAPACITY = int(SAMPLE_RATE * TRANSCRIPTION_BATCH_DURATION * 2)
+SUGGESTION_PREGENERATE_LEAD = float(os.getenv("SUGGESTION_PREGENERATE_LEAD", "60"))  # seconds of talk time before the threshold to start drafting a question
+SUGGESTION_DRAFT_MAX_DRIFT = 0.5  # regenerate the draft if new transcript exceeds this fraction of its context
+SUGGESTION_MIN_WAIT = 5.0  # seconds the suggestion timer waits at least between checks
+SUGGESTION_RETRY_SECONDS = 10.0  # wait after a failed question generation
+SUGGESTION_REJECTION_DELAY = 7 * 60.0  # extra seconds before the next suggestion after a rejection
+MIN_SUGGESTION_CONTEXT_TOKENS = 25  # transcript tokens needed before a question is suggested
+PITCH_EMA_ALPHA = 0.65  # Very light smoothing (65% new, 35% old - preserves responsiveness)
+
+PCM16_SCALE = np.float32(1.0 / 32768.0)
+PCM_SCRATCH_SAMPLES = 16000 * 4  # initial per-session conversion buffer (4s at 16kHz, grows if needed)
+
+# Audio socket tasks
+DECODE_QUEUE_SIZE = 32  # received-chunk backlog before the receiver stops reading (backpressure)
+DSP_QUEUE_SIZE = 8  # decoded chunks waiting for DSP
+ARCHIVE_QUEUE_SIZE = 64  # decoded chunks waiting to be archived; extra ones are dropped
+OUTBOUND_QUEUE_SIZE = 256  # messages waiting for the professor's socket; extra ones are dropped
+OUTBOUND_FLUSH_TIMEOUT = 2.0  # seconds to flush queued messages on disconnect
+IDLE_TIMEOUT_SECONDS = 20  # stop if no frame arrives for this long
+RESUME_GRACE_SECONDS = float(os.getenv("AUDIO_RESUME_GRACE_SECONDS", "30"))  # keep a dropped session this long
+ACK_INTERVAL_CHUNKS = 4  # acknowledge received chunks every N frames
+NORMAL_CLOSURE = 1000  # close code the client sends when recording stops on purpose
+AUDIO_ARCHIVE_DIR = os.getenv("AUDIO_ARCHIVE_DIR")  # keep each lecture's raw audio here (off when unset)
+
+
+def pcm16_to_float32(pcm_bytes, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Convert little-endian Int16 PCM to float32 in [-1, 1) in a single pass.
+    
+    Args:
+        pcm_bytes: PCM data (bytes, bytearray or memoryview - read without copying)
+        out: Optional preallocated float32 array to convert into (must be large enough)
+    
+    Returns:
+        The converted samples (a view of `out` when given)
+    """
+    usable = len(pcm_bytes) - len(pcm_bytes) % 2  # Ignore a trailing half sample
+    int16_view = np.frombuffer(pcm_bytes, dtype='<i2', count=usable // 2)
+    if out is None:
+        out = np.empty(len(int16_view), dtype=np.float32)
+    dest = out[:len(int16_view)]
+    np.multiply(int16_view, PCM16_SCALE, out=dest, dtype=np.float32)
+    return dest
+
+
+def _ingest_pcm(session: LectureSession, pcm_bytes) -> np.ndarray:
+    """Convert a PCM chunk into the session's scratch buffer (reused; valid until the next chunk)."""
+    samples = len(pcm_bytes) // 2
+    if session.pcm_scratch is None or len(session.pcm_scratch) < samples:
+        session.pcm_scratch = np.empty(max(samples, PCM_SCRATCH_SAMPLES), dtype=np.float32)
+    return pcm16_to_float32(pcm_bytes, out=session.pcm_scratch)
 
 
 def convert_pcm_bytes_to_audio(pcm_bytes: bytes, sample_rate: int = 16000) -> Tuple[np.ndarray, int]:
@@ -91,25 +147,15 @@ def convert_pcm_bytes_to_audio(pcm_bytes: bytes, sample_rate: int = 16000) -> Tu
     """
     try:
         if not pcm_bytes or len(pcm_bytes) == 0:
-            print("❌ ERROR: Empty PCM bytes received")
+            log.warning("pcm_empty")
             return np.array([]), sample_rate
         
-        # Convert bytes to Int16 array, then to Float32 numpy array
-        # Int16 range: -32768 to 32767
-        # Float32 range: -1.0 to 1.0
-        int16_array = np.frombuffer(pcm_bytes, dtype=np.int16)
-        audio_array = int16_array.astype(np.float32) / 32768.0
-        
-        # Clip to [-1, 1] range (safety check)
-        audio_array = np.clip(audio_array, -1.0, 1.0)
-        
-        print(f"✓ Converted PCM: {len(pcm_bytes)} bytes → {len(audio_array)} samples ({len(audio_array)/sample_rate:.2f}s)")
+        # Int16 range -32768..32767 maps into [-1, 1) without clipping
+        audio_array = pcm16_to_float32(pcm_bytes)
         return audio_array, sample_rate
     
     except Exception as e:
-        print(f"❌ ERROR: Failed to convert PCM bytes: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("pcm_convert_failed", error=e)
         return np.array([]), sample_rate
 
 
@@ -132,33 +178,31 @@ def convert_webm_base64_to_audio(audio_base64: str, check_magic_bytes: bool = Tr
     try:
         # Validate base64 input
         if not audio_base64 or len(audio_base64) == 0:
-            print("❌ ERROR: Empty base64 audio data received")
+            log.warning("webm_empty")
             return np.array([]), SAMPLE_RATE
         
         # Validate base64 format (basic check - should only contain base64 characters)
         import re
         base64_pattern = re.compile(r'^[A-Za-z0-9+/]*={0,2}$')
         if not base64_pattern.match(audio_base64):
-            print(f"❌ ERROR: Invalid base64 format (first 50 chars: {audio_base64[:50]})")
+            log.error("webm_invalid_base64", head=audio_base64[:50])
             return np.array([]), SAMPLE_RATE
         
         # Decode base64 to bytes
         try:
             audio_bytes = base64.b64decode(audio_base64, validate=True)
         except Exception as decode_error:
-            print(f"❌ ERROR: Failed to decode base64: {decode_error}")
-            print(f"   Base64 length: {len(audio_base64)} chars")
-            print(f"   First 100 chars: {audio_base64[:100]}")
+            log.error("webm_base64_decode_failed", error=decode_error, chars=len(audio_base64))
             return np.array([]), SAMPLE_RATE
         
         # Validate decoded bytes are not empty
         if len(audio_bytes) == 0:
-            print("❌ ERROR: Decoded audio bytes are empty")
+            log.warning("webm_empty")
             return np.array([]), SAMPLE_RATE
         
         # Validate minimum file size (WebM header is typically > 100 bytes)
         if len(audio_bytes) < 100:
-            print(f"⚠ WARNING: Suspiciously small audio file: {len(audio_bytes)} bytes (expected > 100 bytes)")
+            log.warning("webm_small_chunk", bytes=len(audio_bytes), every=10.0)
         
         # Check for WebM magic bytes (first 4 bytes should be: 1A 45 DF A3)
         # NOTE: Only check magic bytes if requested (for first chunk).
@@ -168,23 +212,18 @@ def convert_webm_base64_to_audio(audio_base64: str, check_magic_bytes: bool = Tr
         expected_magic = b'\x1a\x45\xdf\xa3'
         
         # Log magic bytes for debugging
-        if webm_magic == expected_magic:
-            print(f"✓ WebM magic bytes detected: {webm_magic.hex()}")
+        if webm_magic != expected_magic and check_magic_bytes:
+            # For first chunk, warn but still try to process (some encodings might be different)
+            log.warning("webm_unexpected_magic", expected=expected_magic.hex(), got=webm_magic.hex())
         else:
-            if check_magic_bytes:
-                # For first chunk, warn but still try to process (some encodings might be different)
-                print(f"⚠ WARNING: First chunk doesn't start with expected WebM magic bytes")
-                print(f"   Expected: {expected_magic.hex()}, Got: {webm_magic.hex()}")
-                print(f"   Attempting to process anyway (might be valid WebM with different encoding)")
-            else:
-                # For continuation segments, no magic bytes is normal
-                print(f"ℹ Continuation segment (no magic bytes - this is normal): {webm_magic.hex()}")
+            # Continuation segments have no magic bytes, which is normal
+            log.debug("webm_chunk", magic=webm_magic.hex(), every=5.0)
         
         # Note: We no longer reject chunks based on magic bytes alone.
         # Let ffmpeg/pydub decide if the chunk is valid - it's better at handling
         # various WebM encodings and continuation segments.
         
-        print(f"✓ Received audio: {len(audio_bytes)} bytes (base64: {len(audio_base64)} chars)")
+        log.debug("webm_received", bytes=len(audio_bytes), every=5.0)
         
         # Save to temporary file (WebM format)
         with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as tmp_file:
@@ -195,53 +234,27 @@ def convert_webm_base64_to_audio(audio_base64: str, check_magic_bytes: bool = Tr
         
         # Verify file was written correctly
         if not os.path.exists(tmp_file_path):
-            print(f"❌ ERROR: Temporary file was not created: {tmp_file_path}")
+            log.error("webm_temp_file_missing", path=tmp_file_path)
             return np.array([]), SAMPLE_RATE
         
         file_size = os.path.getsize(tmp_file_path)
         if file_size != len(audio_bytes):
-            print(f"⚠ WARNING: File size mismatch. Expected: {len(audio_bytes)}, Got: {file_size}")
-        else:
-            print(f"✓ Temporary file created: {tmp_file_path} ({file_size} bytes)")
+            log.warning("webm_temp_file_size_mismatch", expected=len(audio_bytes), got=file_size)
         
         try:
             # Use pydub to convert WebM to numpy array (pydub handles WebM with ffmpeg)
             from pydub import AudioSegment
             from pydub.utils import which
-            import shutil
             
             # Try to find ffmpeg in PATH or common Windows locations
-            ffmpeg_path = which("ffmpeg") or shutil.which("ffmpeg")
+            ffmpeg_path = which("ffmpeg") or find_ffmpeg()
             
-            # If not in PATH, check common Windows installation locations
-            if ffmpeg_path is None:
-                common_paths = [
-                    r"C:\ffmpeg\bin\ffmpeg.exe",
-                    r"C:\Program Files\ffmpeg\bin\ffmpeg.exe",
-                    r"C:\Program Files (x86)\ffmpeg\bin\ffmpeg.exe",
-                    os.path.expanduser(r"~\AppData\Local\Microsoft\WinGet\Packages\Gyan.FFmpeg*\ffmpeg*\bin\ffmpeg.exe"),
-                    os.path.expanduser(r"~\AppData\Local\ffmpeg\bin\ffmpeg.exe"),
-                ]
-                
-                for path in common_paths:
-                    # Handle wildcard expansion
-                    if "*" in path:
-                        import glob
-                        matches = glob.glob(path)
-                        if matches:
-                            ffmpeg_path = matches[0]
-                            break
-                    elif os.path.exists(path):
-                        ffmpeg_path = path
-                        break
-                
-                # If found, set it for pydub
-                if ffmpeg_path:
-                    # Set ffmpeg path for pydub
-                    AudioSegment.converter = ffmpeg_path
-                    AudioSegment.ffmpeg = ffmpeg_path
-                    AudioSegment.ffprobe = ffmpeg_path.replace("ffmpeg.exe", "ffprobe.exe") if "ffmpeg.exe" in ffmpeg_path else ffmpeg_path
-                    print(f"✓ Found ffmpeg at: {ffmpeg_path}")
+            # If not in PATH, point pydub at the one we found
+            if ffmpeg_path and not which("ffmpeg"):
+                AudioSegment.converter = ffmpeg_path
+                AudioSegment.ffmpeg = ffmpeg_path
+                AudioSegment.ffprobe = ffmpeg_path.replace("ffmpeg.exe", "ffprobe.exe") if "ffmpeg.exe" in ffmpeg_path else ffmpeg_path
+                log.debug("ffmpeg_found", path=ffmpeg_path, every=60.0)
             
             try:
                 # Load WebM with pydub (uses ffmpeg under the hood)
@@ -261,7 +274,7 @@ def convert_webm_base64_to_audio(audio_base64: str, check_magic_bytes: bool = Tr
                     return audio_array, sr
                 except Exception as librosa_error:
                     # If librosa fails, convert AudioSegment directly to numpy array
-                    print(f"⚠ librosa failed to load WAV, converting AudioSegment directly: {librosa_error}")
+                    log.warning("webm_librosa_load_failed", error=librosa_error, every=10.0)
                     
                     # Get raw audio data from AudioSegment
                     raw_audio = np.array(audio_segment.get_array_of_samples(), dtype=np.float32)
@@ -295,31 +308,18 @@ def convert_webm_base64_to_audio(audio_base64: str, check_magic_bytes: bool = Tr
                             
             except FileNotFoundError as ffmpeg_error:
                 # ffmpeg not found
-                print(f"❌ ERROR: ffmpeg not found. Cannot process WebM audio.")
-                print(f"   Error: {ffmpeg_error}")
-                print(f"\n   To fix this:")
-                print(f"   1. Install ffmpeg:")
-                print(f"      Windows: winget install ffmpeg")
-                print(f"      Or download from: https://www.gyan.dev/ffmpeg/builds/")
-                print(f"      Or: https://ffmpeg.org/download.html")
-                print(f"   2. Add ffmpeg to your PATH:")
-                print(f"      - Find where ffmpeg.exe was installed")
-                print(f"      - Add that folder to your system PATH")
-                print(f"   3. Restart your terminal and backend server")
-                print(f"   4. Verify: ffmpeg -version")
+                # Fix: install ffmpeg (Windows: winget install ffmpeg, or https://ffmpeg.org/download.html),
+                # add it to PATH and restart the backend
+                log.error("ffmpeg_not_found", error=ffmpeg_error, every=60.0)
                 raise
             except Exception as pydub_error:
                 # Other pydub errors
                 error_msg = str(pydub_error).lower()
                 if "ffmpeg" in error_msg:
-                    print(f"❌ ERROR: ffmpeg issue. Cannot process WebM audio.")
-                    print(f"   Error: {pydub_error}")
-                    print(f"\n   Please install ffmpeg (see instructions above)")
+                    log.error("ffmpeg_failed", error=pydub_error, every=60.0)
                     raise
                 else:
-                    print(f"❌ Error loading WebM with pydub: {pydub_error}")
-                    import traceback
-                    traceback.print_exc()
+                    log.exception("webm_pydub_load_failed", error=pydub_error, every=10.0)
                     raise
         finally:
             # Clean up temp file
@@ -329,9 +329,7 @@ def convert_webm_base64_to_audio(audio_base64: str, check_magic_bytes: bool = Tr
                 except:
                     pass
     except Exception as e:
-        print(f"Error converting audio: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("webm_convert_failed", error=e, every=10.0)
         # Return empty audio array on error
         return np.array([]), SAMPLE_RATE
 
@@ -447,55 +445,661 @@ def map_ai_metrics_to_frontend(metrics: Dict) -> Dict:
     }
 
 
+def _enqueue_outbound(session: LectureSession, message: dict) -> bool:
+    """Queue a message for the professor's socket. Returns False if dropped (no connection or client not keeping up)."""
+    emit = session.outbound_queue
+    if emit is None:
+        return False
+    return emit.put_nowait(message)  # Metrics are superseded by the next update anyway
+
+
+def _send_voice_metrics(session: LectureSession, metrics: Dict) -> None:
+    """Emitter callback: smooth the latest metrics and queue one voice_metrics frame."""
+    _enqueue_outbound(session, {
+        "type": "voice_metrics",
+        "metrics": _smooth_frontend_metrics(session, metrics)
+    })
+
+
+def _transcript_resync(session: LectureSession) -> dict:
+    """Full transcript up to the latest segment, for clients that lost track of the deltas."""
+    return {
+        "type": "transcript_resync",
+        "seq": session.transcript.last_seq,
+        "transcript": session.transcript.text(),
+    }
+
+
+async def _send_message(websocket: WebSocket, message: dict) -> None:
+    """Emit stage: write one message to the professor's socket."""
+    try:
+        await websocket.send_json(message)
+    except (ConnectionClosed, ConnectionClosedOK, ConnectionClosedError, WebSocketDisconnect):
+        # Client disconnected; stop processing
+        raise WebSocketDisconnect()
+    except RuntimeError as e:
+        # Starlette raises RuntimeError after close; stop sending immediately
+        log.info("socket_send_closed", error=e)
+        raise WebSocketDisconnect()
+
+
+async def _receive_audio(websocket: WebSocket, session: LectureSession, decode: Stage) -> None:
+    """
+    Ingest: read frames and queue audio chunks for the decode stage.
+    
+    Queued items are ("pcm", bytes, metadata) or ("webm", base64_str, None).
+    Clients that negotiate the framed protocol (see audio_protocol) send one
+    binary frame per chunk; others send JSON metadata followed by the PCM bytes.
+    Framed chunks are acknowledged every ACK_INTERVAL_CHUNKS so the client can
+    resend what the server never got after a reconnect.
+    
+    Returns True if the client stopped the stream on purpose (final frame or
+    normal closure), False on a dropped connection or after
+    IDLE_TIMEOUT_SECONDS without any message.
+    """
+    lecture_id = session.lecture_id
+    frame_version = None  # Negotiated framed protocol version (None = legacy two-message format)
+    sequence = SequenceTracker()
+    final_received = False
+    while True:
+        # Receive message (can be JSON with metadata or binary PCM data)
+        # Legacy clients send JSON first, then binary, so we need to handle both types
+        try:
+            raw_message = await asyncio.wait_for(websocket.receive(), timeout=IDLE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            log.info("audio_idle_timeout", lecture_id=lecture_id, seconds=IDLE_TIMEOUT_SECONDS)
+            return final_received
+        except RuntimeError as e:
+            # Starlette raises RuntimeError after a disconnect frame for any further receive()
+            log.info("socket_receive_closed", lecture_id=lecture_id, error=e)
+            return final_received
+        
+        if raw_message.get("type") == "websocket.disconnect":
+            return final_received or raw_message.get("code") == NORMAL_CLOSURE
+        
+        # Check message type and handle accordingly
+        if raw_message.get("text") is not None:
+            # Text message (JSON metadata)
+            try:
+                data = json.loads(raw_message["text"])
+            except json.JSONDecodeError:
+                continue  # Not valid JSON
+            
+            if data.get('type') == 'hello':
+                # Protocol negotiation; anything we don't support stays on the legacy format
+                frame_version = negotiate(data)
+                # Resuming a dropped stream: the client resends the frames after acked_seq
+                resumed = frame_version is not None and data.get('resume_token') == session.resume_token
+                if not resumed:
+                    session.acked_seq = 0  # New stream, numbered from 1 again
+                sequence = SequenceTracker(session.acked_seq + 1 if resumed else None)
+                _enqueue_outbound(session, hello_ack(frame_version, session.resume_token,
+                                                     session.acked_seq if resumed else None))
+                log.info("audio_protocol", lecture_id=lecture_id,
+                         protocol=f"framed_v{frame_version}" if frame_version else "legacy",
+                         resumed=resumed, acked_seq=session.acked_seq if resumed else None)
+            
+            elif data.get('type') == 'transcript_resync':
+                # Client missed a transcript_update (or just reconnected): send the whole transcript
+                _enqueue_outbound(session, _transcript_resync(session))
+            
+            # Check if this is PCM metadata (expects binary data next)
+            elif data.get('type') == 'audio_chunk_pcm':
+                # Store metadata for next binary message
+                session.pcm_metadata = {
+                    'sample_rate': data.get('sample_rate', 16000),
+                    'samples': data.get('samples', 0),
+                    'duration': data.get('duration', 0.0),
+                    'chunk_index': data.get('chunk_index', 0),
+                    'format': data.get('format', 'pcm_int16'),
+                    'is_final': data.get('is_final', False)
+                }
+            elif data.get('type') == 'audio_chunk':
+                # Legacy WebM support (for backwards compatibility)
+                audio_base64 = data.get('data', '')
+                if not audio_base64:
+                    log.warning("audio_chunk_empty", lecture_id=lecture_id, every=10.0)
+                    continue
+                await decode.put(("webm", audio_base64, None))
+            # Unknown message types are ignored
+        
+        elif raw_message.get("bytes") is not None and frame_version is not None:
+            # Framed binary message: header + PCM in one frame; the payload stays a view (no copy)
+            try:
+                frame = parse_frame(raw_message["bytes"])
+            except FrameError as e:
+                log.warning("audio_frame_malformed", lecture_id=lecture_id, error=e, every=5.0)
+                continue
+            if frame.seq <= session.acked_seq:
+                continue  # Resent after a reconnect, but it had arrived before the drop
+            lost = sequence.observe(frame.seq)
+            if lost:
+                log.warning("audio_chunks_lost", lecture_id=lecture_id, lost=lost, before_seq=frame.seq,
+                            total=sequence.lost, every=5.0)
+            await decode.put(("pcm", frame.payload, frame.metadata()))
+            # Acknowledge only once queued: decode/dsp are drained on disconnect, so acked audio is never lost
+            session.acked_seq = frame.seq
+            if frame.seq % ACK_INTERVAL_CHUNKS == 0 or frame.is_final:
+                _enqueue_outbound(session, audio_ack(frame.seq))
+            final_received = final_received or frame.is_final
+        
+        elif raw_message.get("bytes") is not None:
+            # Legacy binary message (PCM data) - pair it with the metadata that preceded it
+            metadata = session.pcm_metadata
+            session.pcm_metadata = None  # Remove after use
+            await decode.put(("pcm", raw_message["bytes"], metadata))
+
+
+def _smooth_frontend_metrics(session: LectureSession, metrics: Dict) -> Dict:
+    """Map pipeline metrics to the UI format, smoothing clarity/pace/pitch across chunks."""
+    frontend_metrics = map_ai_metrics_to_frontend(metrics)
+    
+    # Stabilize clarity when transcript is empty; apply EMA smoothing
+    filler_info = metrics.get('filler', {}) if isinstance(metrics, dict) else {}
+    total_words = filler_info.get('total_words', 0)
+    if total_words == 0 and session.last_clarity is not None:
+        frontend_metrics['clarity'] = session.last_clarity
+    else:
+        prev_c = session.last_clarity if session.last_clarity is not None else frontend_metrics['clarity']
+        smoothed_c = EMA_ALPHA * frontend_metrics['clarity'] + (1 - EMA_ALPHA) * prev_c
+        session.last_clarity = round(max(0.0, min(100.0, smoothed_c)), 1)
+        frontend_metrics['clarity'] = session.last_clarity
+    
+    # Stabilize pace when WPM = 0 between batches; apply EMA smoothing, clamp to a small floor
+    wpm_info = metrics.get('wpm', {}) if isinstance(metrics, dict) else {}
+    wpm_val = wpm_info.get('wpm', 0)
+    if (not wpm_val) and session.last_pace is not None:
+        frontend_metrics['pace'] = session.last_pace
+    else:
+        prev_p = session.last_pace if session.last_pace is not None else frontend_metrics['pace']
+        smoothed_p = EMA_ALPHA * frontend_metrics['pace'] + (1 - EMA_ALPHA) * prev_p
+        smoothed_p = max(10.0, smoothed_p)  # avoid dropping to 0
+        session.last_pace = round(min(100.0, smoothed_p), 1)
+        frontend_metrics['pace'] = session.last_pace
+    
+    # Stabilize pitch variation; apply EMA smoothing (very light smoothing - preserves responsiveness)
+    prev_pitch = session.last_pitch if session.last_pitch is not None else frontend_metrics['pitch']
+    smoothed_pitch = PITCH_EMA_ALPHA * frontend_metrics['pitch'] + (1 - PITCH_EMA_ALPHA) * prev_pitch
+    smoothed_pitch = max(0.0, min(100.0, smoothed_pitch))  # Clamp to 0-100
+    session.last_pitch = round(smoothed_pitch, 1)
+    frontend_metrics['pitch'] = session.last_pitch
+    
+    return frontend_metrics
+
+
+def _eastern_now() -> datetime:
+    """Current time in US/Eastern (UTC if zoneinfo is unavailable)."""
+    try:
+        from zoneinfo import ZoneInfo
+        return datetime.now(ZoneInfo("America/New_York"))
+    except Exception:
+        from datetime import timezone
+        return datetime.now(timezone.utc)
+
+
+class TranscriptionBatch:
+    """Audio handed from the DSP stage to the transcription stage."""
+    
+    __slots__ = ('audio', 'chunk_indices', 'duration', 'priority')
+    
+    def __init__(self, audio: np.ndarray, chunk_indices: List[int], duration: float,
+                 priority: int = PRIORITY_TRANSCRIPTION):
+        self.audio = audio
+        self.chunk_indices = chunk_indices
+        self.duration = duration
+        self.priority = priority
+
+
+def _merge_batches(queued: TranscriptionBatch, new: TranscriptionBatch) -> TranscriptionBatch:
+    """Transcription falling behind: send the waiting batch and the new one as a single request."""
+    return TranscriptionBatch(
+        np.concatenate((queued.audio, new.audio)),
+        queued.chunk_indices + new.chunk_indices,
+        queued.duration + new.duration,
+        max(queued.priority, new.priority)
+    )
+
+
+def _take_batch(session: LectureSession, priority: int = PRIORITY_TRANSCRIPTION) -> TranscriptionBatch:
+    """Move the session's buffered batch out of the ring buffer and start a new one."""
+    # One copy: the ring keeps receiving audio while the batch is transcribed
+    batch = TranscriptionBatch(
+        session.audio_ring.peek().copy(),
+        session.batch_chunk_indices,
+        session.accumulated_duration,
+        priority
+    )
+    session.reset_batch()
+    return batch
+
+
+async def _transcribe_batch(session: LectureSession, batch: TranscriptionBatch,
+                            openai_key: Optional[str]) -> Tuple[str, list]:
+    """
+    Transcribe a batch and back-fill its chunks' metrics.
+    
+    Returns (transcript, updated_metrics); the transcript is "" if Whisper
+    returned nothing.
+    """
+    pipeline = session.pipeline
+    
+    # Async call through the shared LLM gateway (rate limited, no executor thread)
+    batch_transcript = await transcribe_audio_chunk_async(
+        batch.audio,
+        SAMPLE_RATE,
+        openai_key,
+        priority=batch.priority
+    )
+    
+    # Ensure batch_transcript is a string (transcribe_audio_chunk_async should return string)
+    if batch_transcript is None:
+        batch_transcript = ""
+    elif not isinstance(batch_transcript, str):
+        batch_transcript = str(batch_transcript)
+    batch_transcript = batch_transcript.strip()
+    
+    # Skip if empty
+    if not batch_transcript:
+        return "", []
+    
+    # Calculate filler_rate from batch transcript (same for all chunks in batch)
+    filler_metrics = calculate_filler_rate(batch_transcript)
+    
+    # Calculate WPM from batch transcript using batch duration
+    wpm_metrics = calculate_wpm(batch_transcript, batch.duration)
+    
+    # Add transcript to pipeline's time-indexed window for sentiment analysis
+    # (once per batch - the batch represents multiple chunks combined)
+    batch_total_duration = len(batch.chunk_indices) * CHUNK_DURATION
+    pipeline.add_transcript(batch_transcript, _eastern_now(), batch_total_duration)
+    log.debug("sentiment_transcript_added", lecture_id=session.lecture_id, chars=len(batch_transcript))
+    
+    # Update metrics for all chunks in this batch (EXACT same as test_mic_realtime.py lines 222-233)
+    updated_metrics = []
+    for chunk_idx in batch.chunk_indices:
+        session.chunk_transcripts[chunk_idx] = batch_transcript
+        metric_idx = session.chunk_metric_indices.get(chunk_idx)
+        if metric_idx is not None and metric_idx < len(pipeline.fast_metrics_history):
+            metric = pipeline.fast_metrics_history[metric_idx]
+            # Update filler and WPM metrics
+            metric['filler'] = filler_metrics.copy()
+            metric['wpm'] = wpm_metrics.copy()
+            updated_metrics.append(metric)
+    
+    chunk_indices_list = batch.chunk_indices
+    if chunk_indices_list:
+        log.debug("batch_metrics_updated", lecture_id=session.lecture_id,
+                  filler_rate=filler_metrics['filler_rate'], wpm=wpm_metrics['wpm'],
+                  chunks=f"{chunk_indices_list[0]}-{chunk_indices_list[-1]}")
+    
+    return batch_transcript, updated_metrics
+
+
+async def _start_webm_decoder(lecture_id: str) -> Optional[StreamingWebmDecoder]:
+    """Start the lecture's streaming WebM decoder, or None to decode per chunk (no ffmpeg)."""
+    decoder = StreamingWebmDecoder(SAMPLE_RATE)
+    if await decoder.start():
+        log.info("webm_stream_decoder_started", lecture_id=lecture_id)
+        return decoder
+    log.warning("webm_stream_decoder_unavailable", lecture_id=lecture_id)
+    return None
+
+
+async def _decode_stage(session: LectureSession, item: tuple) -> None:
+    """
+    Decode stage: turn a received chunk into samples for the DSP stage.
+    
+    WebM is decoded here (the expensive part). PCM only gets its rate and
+    duration resolved; the Int16 -> float conversion happens in the DSP
+    stage, straight into the session's reusable buffer.
+    """
+    lecture_id = session.lecture_id
+    kind, payload, metadata = item
+    dsp = session.stages['dsp']
+    
+    if kind == "webm":
+        # Convert base64 WebM to numpy array
+        is_first_chunk = not session.first_chunk_received
+        if is_first_chunk:
+            session.first_chunk_received = True
+            # Only the first segment has the WebM header, so a stream decoder can only start here
+            session.webm_decoder = await _start_webm_decoder(lecture_id)
+        
+        audio_array = np.array([])
+        sr = SAMPLE_RATE
+        decoder = session.webm_decoder
+        if decoder is not None:
+            try:
+                audio_array = await decoder.decode(base64.b64decode(payload))
+            except (ValueError, binascii.Error) as e:
+                log.warning("webm_base64_decode_failed", lecture_id=lecture_id, error=e, every=5.0)
+                return
+            except (ConnectionError, OSError) as e:
+                # ffmpeg died (corrupt stream); decode the rest chunk by chunk
+                log.warning("webm_stream_decoder_stopped", lecture_id=lecture_id, error=e)
+                decoder.close()
+                session.webm_decoder = None
+        
+        if session.webm_decoder is None:
+            try:
+                audio_array, sr = await get_pool("decode").run(convert_webm_base64_to_audio, payload, is_first_chunk)
+            except Exception as e:
+                log.warning("webm_convert_failed", lecture_id=lecture_id, error=e, every=5.0)
+                audio_array = np.array([])
+        
+        if len(audio_array) == 0:
+            if is_first_chunk and session.webm_decoder is None:
+                session.first_chunk_received = False
+            return
+        
+        # Streamed output doesn't line up exactly with segments, so use the decoded length
+        chunk_duration = len(audio_array) / sr if session.webm_decoder is not None else CHUNK_DURATION
+        _archive_chunk(session, audio_array, sr)
+        await dsp.put(("float", audio_array, sr, chunk_duration))
+    
+    elif metadata is not None:
+        duration = metadata.get('duration', 0.0)
+        # Use duration from metadata instead of fixed CHUNK_DURATION
+        chunk_duration = duration if duration > 0 else CHUNK_DURATION
+        _archive_chunk(session, payload, metadata.get('sample_rate', 16000))
+        await dsp.put(("pcm16", payload, metadata.get('sample_rate', 16000), chunk_duration))
+    
+    else:
+        # No metadata, assume default format (shouldn't happen normally)
+        log.warning("pcm_chunk_without_metadata", lecture_id=lecture_id, every=10.0)
+        _archive_chunk(session, payload, SAMPLE_RATE)
+        await dsp.put(("pcm16", payload, SAMPLE_RATE, CHUNK_DURATION))
+
+
+def _archive_chunk(session: LectureSession, audio, sr: int) -> None:
+    """Queue a decoded chunk for the raw audio archive (if archiving is on)."""
+    if session.audio_archive is not None:
+        session.stages['archive'].put_nowait((audio, sr, time.time()))
+
+
+async def _archive_stage(session: LectureSession, item: tuple) -> None:
+    """Archive stage: append a chunk to the lecture's archive (memory copy and periodic fsync, in the archive pool)."""
+    audio, sr, received_at = item
+    await get_pool("archive").run(session.audio_archive.append, audio, sr, received_at)
+
+
+async def _dsp_stage(session: LectureSession, use_whisper: bool, item: tuple) -> None:
+    """DSP stage: real-time voice metrics for one chunk, and batching for transcription."""
+    pipeline = session.pipeline
+    kind, data, sr, chunk_duration = item
+    
+    if kind == "pcm16":
+        # Convert PCM into the session's reusable float32 buffer (one pass, no allocation)
+        audio_array = _ingest_pcm(session, data)
+    else:
+        audio_array = data
+    if len(audio_array) == 0:
+        return
+    
+    session.chunk_count += 1
+    current_chunk_idx = session.chunk_count
+    
+    # Add to transcription buffer for batching (EXACT same as test_mic_realtime.py)
+    session.audio_ring.write(audio_array)
+    session.batch_chunk_indices.append(current_chunk_idx)
+    session.accumulated_duration += chunk_duration
+    
+    # Use transcript if available, otherwise empty (will be filled on next batch)
+    # EXACT same logic as test_mic_realtime.py line 182
+    transcript = session.chunk_transcripts.get(current_chunk_idx, "")
+    
+    # Process chunk through pipeline (EXACT same as test_mic_realtime.py lines 186-192)
+    # (the analysis itself runs in the shared DSP pool, off the event loop)
+    metrics = await pipeline.process_audio_chunk_async(
+        audio_data=audio_array,
+        transcript=transcript,
+        duration_seconds=chunk_duration,
+        sr=sr,  # Use actual sample rate from conversion
+        timestamp=datetime.utcnow()
+    )
+    
+    # Track metric index for this chunk (EXACT same as test_mic_realtime.py lines 194-196)
+    session.chunk_metric_indices[current_chunk_idx] = len(pipeline.fast_metrics_history) - 1
+    
+    # Offer metrics to the frontend right away (transcript might be empty initially);
+    # the emitter sends at most one frame per interval, always the latest
+    session.metrics_emitter.submit(metrics)
+    
+    # Hand the batch to the transcription stage once it is long enough
+    # (EXACT same threshold as test_mic_realtime.py lines 198-245)
+    if session.accumulated_duration >= TRANSCRIPTION_BATCH_DURATION:
+        if use_whisper:
+            log.debug("transcription_batch_queued", lecture_id=session.lecture_id,
+                      seconds=session.accumulated_duration)
+            session.stages['transcribe'].put_nowait(_take_batch(session))
+        else:
+            session.reset_batch()
+    
+    # Accumulate talk time (only count chunks with sufficient energy to indicate speaking)
+    energy_normalized = metrics.get('energy', {}).get('energy_normalized', 0.0)
+    if energy_normalized > 0.1:  # Only count if there's actual audio (not silence)
+        session.talk_time += CHUNK_DURATION
+
+
+async def _transcribe_stage(session: LectureSession, openai_key: Optional[str], batch: TranscriptionBatch) -> None:
+    """Transcription stage: Whisper for one batch, then transcript and refined metrics to the UI."""
+    batch_transcript, updated_metrics = await _transcribe_batch(session, batch, openai_key)
+    
+    if not batch_transcript:
+        log.info("transcription_empty", lecture_id=session.lecture_id, seconds=batch.duration)
+        return
+    log.debug("transcription_complete", lecture_id=session.lecture_id, chars=len(batch_transcript),
+              seconds=batch.duration)
+    
+    # Re-send metrics with filler_rate and WPM now included. The batch shares one
+    # transcript, so its latest chunk carries the update: one frame, not one per chunk
+    if updated_metrics:
+        session.metrics_emitter.submit(updated_metrics[-1])
+    
+    # Update transcript for legacy engagement analysis
+    segment = session.transcript.append(batch_transcript, duration=batch.duration)
+    if session.checkpointer is not None:
+        session.checkpointer.notify()
+    
+    # Send only the new segment; the client appends it (and asks for a resync if it missed one)
+    _enqueue_outbound(session, {
+        "type": "transcript_update",
+        "seq": segment.seq,
+        "new_segment": batch_transcript,
+        "timestamp": _eastern_now().isoformat()
+    })
+
+
+def _build_stage_graph(session: LectureSession, websocket: WebSocket,
+                       use_whisper: bool, openai_key: Optional[str]) -> StageGraph:
+    """Stages for one connection: decode -> dsp -> transcribe, plus emit to the socket (and archive, if on)."""
+    stages = [
+        # Backpressure: a full decode queue stops the receiver reading the socket
+        Stage("decode", partial(_decode_stage, session), DECODE_QUEUE_SIZE, BLOCK),
+        Stage("dsp", partial(_dsp_stage, session, use_whisper), DSP_QUEUE_SIZE, BLOCK),
+        # While Whisper is busy, later batches merge into one pending request
+        Stage("transcribe", partial(_transcribe_stage, session, openai_key), 1, MERGE, merge=_merge_batches),
+        # A client that can't keep up loses the newest messages (metrics are superseded anyway)
+        Stage("emit", partial(_send_message, websocket), OUTBOUND_QUEUE_SIZE, DROP_NEWEST,
+              fatal=(WebSocketDisconnect,)),
+    ]
+    if session.audio_archive is not None:
+        # A slow disk loses archived chunks (the index shows the gap) rather than holding up analysis
+        stages.append(Stage("archive", partial(_archive_stage, session), ARCHIVE_QUEUE_SIZE, DROP_NEWEST))
+    return StageGraph(session.lecture_id, stages)
+
+
+def _detach_session(session: LectureSession, use_whisper: bool, openai_key: Optional[str]) -> None:
+    """Keep a session whose connection dropped, and finish it if nobody reattaches in time."""
+    session.websocket = None
+    session.stages = None
+    session.outbound_queue = None
+    # The suggestion timer keeps running, paused until the professor is back
+    lecture_events.publish(session.lecture_id, PAUSED)
+    session.grace_task = asyncio.create_task(_expire_detached_session(session, use_whisper, openai_key))
+    log.info("audio_session_detached", lecture_id=session.lecture_id, acked_seq=session.acked_seq,
+             grace_seconds=RESUME_GRACE_SECONDS)
+
+
+async def _expire_detached_session(session: LectureSession, use_whisper: bool, openai_key: Optional[str]) -> None:
+    """Grace period of a detached session: finish it once the period ends or the lecture is ended."""
+    try:
+        await asyncio.wait_for(session.ended_event.wait(), timeout=RESUME_GRACE_SECONDS)
+    except asyncio.TimeoutError:
+        pass
+    # From here on the session is being written out; a reconnect waits for this task, then starts over
+    session.expiring = True
+    log.info("audio_session_expired", lecture_id=session.lecture_id, ended=session.ended)
+    
+    # Transcribe the audio left in the batch (no connection to send updates to)
+    if use_whisper and session.audio_ring is not None and len(session.audio_ring):
+        batch = _take_batch(session, PRIORITY_FINAL_TRANSCRIPTION)
+        try:
+            batch_transcript, _ = await _transcribe_batch(session, batch, openai_key)
+            session.transcript.append(batch_transcript, duration=batch.duration)
+        except Exception as e:
+            log.warning("transcription_final_batch_failed", lecture_id=session.lecture_id, error=e)
+    
+    session.grace_task = None  # Don't let close() cancel this task
+    await _finish_session(session)
+
+
+async def _finish_session(session: LectureSession) -> None:
+    """Write the rest of the lecture's transcript and tear its session down."""
+    lecture_id = session.lecture_id
+    # Write the last transcript segments; with those checkpointed the full
+    # transcript is rebuilt from the segments on read, so nothing else to save
+    checkpointed = False
+    if session.checkpointer is not None:
+        checkpointed = await session.checkpointer.stop()
+        if checkpointed:
+            log.info("transcript_checkpointed", lecture_id=lecture_id, segments=session.transcript.last_seq)
+
+    # Sync and trim the raw audio archive off the event loop
+    if session.audio_archive is not None:
+        archive, session.audio_archive = session.audio_archive, None
+        try:
+            await get_pool("archive").run(archive.close)
+            log.info("audio_archived", lecture_id=lecture_id, chunks=archive.chunks, samples=archive.samples)
+        except Exception as e:
+            log.warning("audio_archive_close_failed", lecture_id=lecture_id, error=e)
+    
+    # Clean up: cancel the suggestion timer, release buffers and drop the session
+    close_session(session)
+    from app.services.slide_index import drop_slide_index
+    drop_slide_index(lecture_id)  # Reloaded from lecture_slides if the lecture goes on
+
+    # Fallback: save the whole transcript if checkpointing failed (the session is no longer in memory)
+    if not checkpointed:
+        transcript_text = session.transcript.text()
+        if transcript_text and len(transcript_text.strip()) > 0:
+            try:
+                log.info("transcript_saving", lecture_id=lecture_id, chars=len(transcript_text))
+
+                # Check if lecture exists first (for debugging)
+                check_result = supabase.table("lectures").select("lecture_id, status").eq("lecture_id", lecture_id).execute()
+                if not check_result.data:
+                    # Save anyway (may create the record if permissions allow)
+                    log.warning("transcript_lecture_missing", lecture_id=lecture_id)
+
+                # Try to update transcript anyway (even if lecture not found, might work)
+                result = supabase.table("lectures").update({
+                    "transcript": transcript_text
+                }).eq("lecture_id", lecture_id).execute()
+
+                if result.data and len(result.data) > 0:
+                    log.info("transcript_saved", lecture_id=lecture_id, chars=len(transcript_text))
+                else:
+                    # Check if it's because the lecture doesn't exist (create it via POST /lectures first)
+                    if not check_result.data:
+                        log.error("transcript_save_failed", lecture_id=lecture_id, reason="lecture does not exist")
+                    else:
+                        log.warning("transcript_save_failed", lecture_id=lecture_id, reason="no data returned",
+                                    response=result)
+
+            except Exception as e:
+                # Check if it's a permission or column issue
+                error_str = str(e).lower()
+                hint = None
+                if "column" in error_str or "does not exist" in error_str:
+                    hint = "ALTER TABLE lectures ADD COLUMN IF NOT EXISTS transcript TEXT;"
+                elif "permission" in error_str or "policy" in error_str:
+                    hint = "check RLS policies on the lectures table"
+                log.exception("transcript_save_failed", lecture_id=lecture_id, chars=len(transcript_text),
+                              error=e, hint=hint)
+        else:
+            log.info("transcript_empty", lecture_id=lecture_id)
+
+
 async def audio_websocket_handler(websocket: WebSocket, lecture_id: str, professor_id: str):
     """
     Handle WebSocket connection for audio streaming from professor.
     
     This uses the EXACT same logic as ai_assistant/test_mic_realtime.py,
     but adapted for WebSocket and browser audio instead of microphone.
+    
+    The connection runs as a stage graph (see audio_stages): the receiver
+    ingests frames into the decode stage, then dsp (real-time metrics),
+    transcribe (Whisper batches) and emit (writes to the socket) each run in
+    their own task behind a bounded queue. Nothing polls, and a slow Whisper
+    call never delays the real-time meters.
     """
     await websocket.accept()
     
+    # All live state for this lecture lives on its session; a dropped one is
+    # picked up again if the professor reconnects within the grace period
+    session = open_session(lecture_id, professor_id)
+    resuming = session.detached
+    if not session.attach(websocket):
+        # Grace period just ran out and the session is being written out; start over once it is gone
+        await asyncio.gather(session.grace_task, return_exceptions=True)
+        session = open_session(lecture_id, professor_id)
+        resuming = False
+        session.attach(websocket)
+    if resuming:
+        log.info("audio_session_reattached", lecture_id=lecture_id, acked_seq=session.acked_seq)
+        lecture_events.publish(lecture_id, RESUMED)
+    
+    # OpenAI key: Whisper transcription only runs when one is configured
+    from app.config import settings
+    openai_key = settings.openai_api_key if hasattr(settings, 'openai_api_key') else os.getenv('OPENAI_API_KEY')
+    use_whisper = openai_key is not None
+    
     # Initialize voice pipeline for this lecture (EXACT same as test_mic_realtime.py)
-    if lecture_id not in voice_pipelines:
+    if session.pipeline is None:
         pipeline = VoicePipelineManager(sentiment_interval=12.0)  # 12s for sentiment
-        voice_pipelines[lecture_id] = pipeline
-        voice_pipeline_executors[lecture_id] = ThreadPoolExecutor(max_workers=1)
+        session.pipeline = pipeline
+        session.audio_ring = AudioRingBuffer(TRANSCRIPTION_RING_CAPACITY)
+        session.metrics_emitter = CoalescingEmitter(partial(_send_voice_metrics, session))
+        # Write new transcript segments to the database in the background
+        session.checkpointer = TranscriptCheckpointer(lecture_id, session.transcript)
+        await session.checkpointer.start()
+        if AUDIO_ARCHIVE_DIR:
+            try:
+                session.audio_archive = await get_pool("archive").run(AudioArchiveWriter, AUDIO_ARCHIVE_DIR, lecture_id)
+            except OSError as e:
+                log.warning("audio_archive_unavailable", lecture_id=lecture_id, error=e)
         # Reset first chunk flag for new connection
-        first_chunk_received[lecture_id] = False
-        
-        # Check for OpenAI API key
-        from app.config import settings
-        openai_key = settings.openai_api_key if hasattr(settings, 'openai_api_key') else os.getenv('OPENAI_API_KEY')
-        use_whisper = openai_key is not None
+        session.first_chunk_received = False
         
         if not use_whisper:
-            print(f"⚠ WARNING: OPENAI_API_KEY not found for lecture {lecture_id}")
-            print("   Whisper transcription disabled - filler rate and WPM will be 0.")
+            # Without Whisper, filler rate and WPM stay 0
+            log.warning("whisper_disabled", lecture_id=lecture_id, reason="OPENAI_API_KEY not set")
         else:
-            print(f"✓ Whisper transcription enabled for lecture {lecture_id}")
-            print(f"   Transcription batching: every {TRANSCRIPTION_BATCH_DURATION}s for better quality.")
-        
-        # Create queue for sentiment messages
-        sentiment_queues[lecture_id] = asyncio.Queue()
+            log.info("whisper_enabled", lecture_id=lecture_id, batch_seconds=TRANSCRIPTION_BATCH_DURATION)
         
         # Set up callbacks (EXACT same as test_mic_realtime.py)
         def on_fast_metrics(metrics: Dict):
             """Callback when fast metrics are ready - metrics sent directly after processing."""
-            # Metrics are sent directly in the main loop after processing
+            # Metrics are sent directly by the processor after each chunk
             # This callback is kept for compatibility but we send metrics directly
             pass
         
         def on_sentiment(sentiment: Dict):
             """Callback when sentiment analysis is ready - queue for sending."""
             try:
-                # Queue sentiment message to send in main loop
-                # Defensive check: ensure sentiment_queues exists for this lecture
-                if lecture_id not in sentiment_queues:
-                    sentiment_queues[lecture_id] = asyncio.Queue()
-                
-                # Build payload
-                payload = {
+                # No DB persistence here to avoid impacting live analytics
+                _enqueue_outbound(session, {
                         "type": "ai_feedback",
                         "feedback": {
                             "sentiment": sentiment.get('sentiment_label', 'neutral'),
@@ -504,672 +1108,252 @@ async def audio_websocket_handler(websocket: WebSocket, lecture_id: str, profess
                             "engagement_indicators": sentiment.get('engagement_indicators', []),
                             "confidence": sentiment.get('confidence', 0.0)
                         }
-                }
-                try:
-                    sentiment_queues[lecture_id].put_nowait(payload)
-                except asyncio.QueueFull:
-                    pass  # Skip if queue is full
-                
-                # No DB persistence here to avoid impacting live analytics
+                })
             except Exception as e:
-                print(f"Error queuing sentiment: {e}")
+                log.warning("sentiment_enqueue_failed", lecture_id=lecture_id, error=e)
         
         pipeline.on_fast_metrics = on_fast_metrics
         pipeline.on_sentiment = on_sentiment
     
-    pipeline = voice_pipelines[lecture_id]
-    executor = voice_pipeline_executors[lecture_id]
-    
-    # Initialize transcription batching buffers (EXACT same as test_mic_realtime.py)
-    if lecture_id not in transcription_buffers:
-        transcription_buffers[lecture_id] = []
-        batch_chunk_indices[lecture_id] = []
-        accumulated_duration[lecture_id] = 0.0
-        chunk_transcripts[lecture_id] = {}
-        chunk_metric_indices[lecture_id] = {}
-    
-    # Initialize transcript for this lecture
-    if lecture_id not in lecture_transcripts:
-        lecture_transcripts[lecture_id] = ""
-        last_question_time[lecture_id] = datetime.utcnow()
-    
     # Start AI suggestion timer
-    if lecture_id not in ai_suggestion_timers:
-        ai_suggestion_timers[lecture_id] = asyncio.create_task(
-            ai_question_suggestion_timer(lecture_id, professor_id, websocket)
+    if session.suggestion_timer is None:
+        session.suggestion_timer = asyncio.create_task(
+            ai_question_suggestion_timer(session)
         )
     
-    # Track chunk count (EXACT same as test_mic_realtime.py)
-    chunk_count = 0
+    # A new connection is a new MediaRecorder stream with its own WebM header
+    if session.webm_decoder is not None:
+        session.webm_decoder.close()
+        session.webm_decoder = None
+    session.first_chunk_received = False
     
-    # Get OpenAI key
-    from app.config import settings
-    openai_key = settings.openai_api_key if hasattr(settings, 'openai_api_key') else os.getenv('OPENAI_API_KEY')
-    use_whisper = openai_key is not None
+    # Each connection gets its own stage graph; a reconnect takes over the session's emit stage
+    graph = _build_stage_graph(session, websocket, use_whisper, openai_key)
+    session.stages = graph
+    session.outbound_queue = graph['emit']
+    graph.start()
+    receiver = asyncio.create_task(_receive_audio(websocket, session, graph['decode']))
+    # If lecture is explicitly ended (via HTTP endpoint), stop processing
+    ended = asyncio.create_task(session.ended_event.wait())
     
     try:
-        # Track last time we received any audio/message to support idle timeout
-        from time import monotonic
-        last_message_time = monotonic()
-        IDLE_TIMEOUT_SECONDS = 20  # stop if no messages for 20s
-        
-        while True:
-            # If lecture was explicitly ended (via HTTP endpoint), stop processing
-            if lecture_ended.get(lecture_id, False):
-                print(f"ℹ Lecture {lecture_id} marked ended; stopping audio processing loop.")
-                break
-            
-            # Idle timeout: if we haven't received anything recently, stop
-            if monotonic() - last_message_time > IDLE_TIMEOUT_SECONDS:
-                print(f"ℹ Idle timeout for lecture {lecture_id}; no audio received for {IDLE_TIMEOUT_SECONDS}s. Stopping.")
-                break
-            
-            # Check for sentiment messages to send (non-blocking)
-            try:
-                # Defensive check: ensure sentiment_queues exists for this lecture
-                if lecture_id in sentiment_queues:
-                    while True:
-                        sentiment_msg = sentiment_queues[lecture_id].get_nowait()
-                        try:
-                            await websocket.send_json(sentiment_msg)
-                        except (ConnectionClosed, ConnectionClosedOK, ConnectionClosedError, WebSocketDisconnect):
-                            # Client disconnected; stop processing
-                            raise WebSocketDisconnect()
-                        except RuntimeError as e:
-                            # Starlette raises RuntimeError after close; stop sending immediately
-                            print(f"⚠ WebSocket runtime error while sending sentiment (likely closed): {e}")
-                            raise WebSocketDisconnect()
-            except asyncio.QueueEmpty:
-                pass
-            except KeyError:
-                # Initialize if missing (shouldn't happen, but handle gracefully)
-                if lecture_id not in sentiment_queues:
-                    sentiment_queues[lecture_id] = asyncio.Queue()
-                pass
-            
-            # Receive message (can be JSON with metadata or binary PCM data)
-            # Since we send JSON first, then binary, we need to handle both types
-            try:
-                # Try to receive message (could be text or binary)
-                raw_message = await asyncio.wait_for(websocket.receive(), timeout=0.1)
-                # Received something – update activity timestamp
-                last_message_time = monotonic()
-                
-                # Check message type and handle accordingly
-                if "text" in raw_message:
-                    # Text message (JSON metadata)
-                    message = raw_message["text"]
-                    
-                    try:
-                        data = json.loads(message)
-                        
-                        # Check if this is PCM metadata (expects binary data next)
-                        if data.get('type') == 'audio_chunk_pcm':
-                            # Store metadata for next binary message
-                            pcm_metadata_queue[lecture_id] = {
-                                'sample_rate': data.get('sample_rate', 16000),
-                                'samples': data.get('samples', 0),
-                                'duration': data.get('duration', 0.0),
-                                'chunk_index': data.get('chunk_index', 0),
-                                'format': data.get('format', 'pcm_int16'),
-                                'is_final': data.get('is_final', False)
-                            }
-                            # Wait for binary PCM data (continue loop)
-                            continue
-                        elif data.get('type') == 'audio_chunk':
-                            # Legacy WebM support (for backwards compatibility)
-                            audio_base64 = data.get('data', '')
-                            expected_size = data.get('size', 0)
-                            chunk_index = data.get('chunk_index', 0)
-                            
-                            if not audio_base64:
-                                print("⚠ WARNING: Received audio_chunk with empty data field")
-                                continue
-                            
-                            # Convert base64 WebM to numpy array
-                            is_first_chunk = not first_chunk_received.get(lecture_id, False)
-                            if is_first_chunk:
-                                first_chunk_received[lecture_id] = True
-                            
-                            try:
-                                loop = asyncio.get_event_loop()
-                                audio_array, sr = await loop.run_in_executor(
-                                    executor,
-                                    convert_webm_base64_to_audio,
-                                    audio_base64,
-                                    is_first_chunk
-                                )
-                                
-                                if len(audio_array) == 0:
-                                    if is_first_chunk:
-                                        first_chunk_received[lecture_id] = False
-                                    continue
-                                
-                                # Set chunk_duration for WebM (fixed)
-                                chunk_duration = CHUNK_DURATION
-                            except Exception as e:
-                                print(f"Error converting WebM audio: {e}")
-                                if is_first_chunk:
-                                    first_chunk_received[lecture_id] = False
-                                continue
-                        else:
-                            continue  # Unknown message type
-                    except json.JSONDecodeError:
-                        continue  # Not valid JSON
-                        
-                elif "bytes" in raw_message:
-                    # Binary message (PCM data)
-                    pcm_bytes = raw_message["bytes"]
-                    
-                    # Check if we have metadata stored (from previous JSON message)
-                    if lecture_id in pcm_metadata_queue:
-                        metadata = pcm_metadata_queue.pop(lecture_id)  # Remove after use
-                        chunk_index = metadata.get('chunk_index', 0)
-                        sample_rate = metadata.get('sample_rate', 16000)
-                        expected_samples = metadata.get('samples', 0)
-                        duration = metadata.get('duration', 0.0)
-                        
-                        print(f"📥 Received PCM chunk #{chunk_index}: {len(pcm_bytes)} bytes ({expected_samples} samples, {duration:.2f}s)")
-                        
-                        # Convert PCM bytes directly to numpy array (fast, no file I/O)
-                        audio_array, sr = convert_pcm_bytes_to_audio(pcm_bytes, sample_rate)
-                        
-                        if len(audio_array) == 0:
-                            continue
-                        
-                        # Use duration from metadata instead of fixed CHUNK_DURATION
-                        chunk_duration = duration if duration > 0 else CHUNK_DURATION
-                    else:
-                        # No metadata, assume default format (shouldn't happen normally)
-                        print(f"⚠ Received PCM chunk without metadata, using defaults")
-                        audio_array, sr = convert_pcm_bytes_to_audio(pcm_bytes, SAMPLE_RATE)
-                        chunk_index = chunk_count + 1
-                        chunk_duration = CHUNK_DURATION
-                        
-                        if len(audio_array) == 0:
-                            continue
-                else:
-                    # Unknown message type
-                    continue
-                        
-            except asyncio.TimeoutError:
-                # No message received, check sentiment queue again
-                continue
-            except WebSocketDisconnect:
-                break
-            except RuntimeError as e:
-                # Starlette raises RuntimeError after a disconnect frame for any further receive()
-                print(f"⚠ WebSocket runtime error (likely disconnected): {e}")
-                break
-            except Exception as e:
-                # Unexpected error while receiving - stop the loop to avoid spamming
-                print(f"⚠ Error receiving message: {e}")
-                break
-            
-            chunk_count += 1
-            current_chunk_idx = chunk_count
-            
-            # Ensure transcription buffers are initialized (defensive check)
-            if lecture_id not in transcription_buffers:
-                transcription_buffers[lecture_id] = []
-                batch_chunk_indices[lecture_id] = []
-                accumulated_duration[lecture_id] = 0.0
-                chunk_transcripts[lecture_id] = {}
-                chunk_metric_indices[lecture_id] = {}
-            
-            # Add to transcription buffer for batching (EXACT same as test_mic_realtime.py)
-            transcription_buffers[lecture_id].append(audio_array.copy())
-            batch_chunk_indices[lecture_id].append(current_chunk_idx)
-            # Use actual chunk duration (from PCM metadata or default)
-            actual_chunk_duration = chunk_duration if 'chunk_duration' in locals() else CHUNK_DURATION
-            accumulated_duration[lecture_id] += actual_chunk_duration
-            
-            # Use transcript if available, otherwise empty (will be filled on next batch)
-            # EXACT same logic as test_mic_realtime.py line 182
-            transcript = chunk_transcripts[lecture_id].get(current_chunk_idx, "")
-            
-            # Process chunk through pipeline (EXACT same as test_mic_realtime.py lines 186-192)
-            # Use actual chunk duration (already computed above)
-            metrics = pipeline.process_audio_chunk(
-                audio_data=audio_array,
-                transcript=transcript,
-                duration_seconds=actual_chunk_duration,
-                sr=sr,  # Use actual sample rate from conversion
-                timestamp=datetime.utcnow()
-            )
-            
-            # Track metric index for this chunk (EXACT same as test_mic_realtime.py lines 194-196)
-            metric_index = len(pipeline.fast_metrics_history) - 1
-            chunk_metric_indices[lecture_id][current_chunk_idx] = metric_index
-            
-            # Send metrics to frontend immediately (since transcript might be empty initially)
-            # This matches test_mic_realtime.py behavior - metrics are sent as soon as available
-            try:
-                frontend_metrics = map_ai_metrics_to_frontend(metrics)
-                # Stabilize clarity when transcript is empty; apply EMA smoothing
-                filler_info = metrics.get('filler', {}) if isinstance(metrics, dict) else {}
-                total_words = filler_info.get('total_words', 0)
-                if total_words == 0 and lecture_id in last_clarity:
-                    frontend_metrics['clarity'] = last_clarity[lecture_id]
-                else:
-                    prev_c = last_clarity.get(lecture_id, frontend_metrics['clarity'])
-                    smoothed_c = EMA_ALPHA * frontend_metrics['clarity'] + (1 - EMA_ALPHA) * prev_c
-                    last_clarity[lecture_id] = round(max(0.0, min(100.0, smoothed_c)), 1)
-                    frontend_metrics['clarity'] = last_clarity[lecture_id]
-                
-                # Stabilize pace when WPM = 0 between batches; apply EMA smoothing, clamp to a small floor
-                wpm_info = metrics.get('wpm', {}) if isinstance(metrics, dict) else {}
-                wpm_val = wpm_info.get('wpm', 0)
-                if (not wpm_val) and lecture_id in last_pace:
-                    frontend_metrics['pace'] = last_pace[lecture_id]
-                else:
-                    prev_p = last_pace.get(lecture_id, frontend_metrics['pace'])
-                    smoothed_p = EMA_ALPHA * frontend_metrics['pace'] + (1 - EMA_ALPHA) * prev_p
-                    smoothed_p = max(10.0, smoothed_p)  # avoid dropping to 0
-                    last_pace[lecture_id] = round(min(100.0, smoothed_p), 1)
-                    frontend_metrics['pace'] = last_pace[lecture_id]
-                
-                # Stabilize pitch variation; apply EMA smoothing (very light smoothing - preserves responsiveness)
-                PITCH_EMA_ALPHA = 0.65  # Very light smoothing (65% new, 35% old - preserves responsiveness)
-                prev_pitch = last_pitch.get(lecture_id, frontend_metrics['pitch'])
-                smoothed_pitch = PITCH_EMA_ALPHA * frontend_metrics['pitch'] + (1 - PITCH_EMA_ALPHA) * prev_pitch
-                smoothed_pitch = max(0.0, min(100.0, smoothed_pitch))  # Clamp to 0-100
-                last_pitch[lecture_id] = round(smoothed_pitch, 1)
-                frontend_metrics['pitch'] = last_pitch[lecture_id]
-                try:
-                    await websocket.send_json({
-                        "type": "voice_metrics",
-                        "metrics": frontend_metrics
-                    })
-                except (ConnectionClosed, ConnectionClosedOK, ConnectionClosedError, WebSocketDisconnect):
-                    raise WebSocketDisconnect()
-                except RuntimeError as e:
-                    print(f"⚠ WebSocket runtime error while sending metrics (likely closed): {e}")
-                    raise WebSocketDisconnect()
-            except Exception as e:
-                print(f"Error sending metrics: {e}")
-            
-            # Check if we've accumulated enough for transcription batch
-            # EXACT same logic as test_mic_realtime.py lines 198-245
-            # Defensive check: ensure accumulated_duration exists
-            current_duration = accumulated_duration.get(lecture_id, 0.0)
-            if use_whisper and current_duration >= TRANSCRIPTION_BATCH_DURATION:
-                try:
-                    # Concatenate all audio chunks in buffer
-                    batched_audio = np.concatenate(transcription_buffers[lecture_id])
-                    
-                    # Transcribe the batch (EXACT same as test_mic_realtime.py)
-                    # Get duration safely
-                    batch_duration = accumulated_duration.get(lecture_id, 0.0)
-                    print(f"🔄 Transcribing {batch_duration:.1f}s batch for lecture {lecture_id}...")
-                    
-                    # Get event loop for executor
-                    loop = asyncio.get_event_loop()
-                    batch_transcript = await loop.run_in_executor(
-                        executor,
-                        transcribe_audio_chunk,
-                        batched_audio,
-                        SAMPLE_RATE,
-                        openai_key
-                    )
-                    
-                    # Ensure batch_transcript is a string (transcribe_audio_chunk should return string)
-                    if batch_transcript is None:
-                        batch_transcript = ""
-                    elif not isinstance(batch_transcript, str):
-                        batch_transcript = str(batch_transcript).strip()
-                    
-                    batch_transcript = batch_transcript.strip()
-                    
-                    # Skip if empty
-                    if not batch_transcript or len(batch_transcript) == 0:
-                        print(f"⚠ WARNING: Empty transcript from Whisper, skipping...")
-                        continue
-                    
-                    print(f"✓ Transcription complete: \"{batch_transcript[:60]}{'...' if len(batch_transcript) > 60 else ''}\"")
-                    
-                    # Calculate filler_rate from batch transcript (same for all chunks in batch)
-                    filler_metrics = calculate_filler_rate(batch_transcript)
-                    
-                    # Calculate WPM from batch transcript using batch duration (safe access)
-                    wpm_metrics = calculate_wpm(batch_transcript, batch_duration)
-                    
-                    # Store chunk indices before clearing (for logging)
-                    chunk_indices_list = batch_chunk_indices[lecture_id].copy() if batch_chunk_indices[lecture_id] else []
-                    
-                    # Update metrics for all chunks in this batch (EXACT same as test_mic_realtime.py lines 222-233)
-                    # Also update pipeline's transcript buffer for sentiment analysis
-                    for chunk_idx in batch_chunk_indices[lecture_id]:
-                        chunk_transcripts[lecture_id][chunk_idx] = batch_transcript
-                        
-                        # Add transcript to pipeline's buffer for sentiment analysis
-                        # This ensures sentiment analysis has transcript text to analyze
-                        if batch_transcript and batch_transcript.strip():
-                            # Add transcript to pipeline buffer if not already there
-                            # Use the batch transcript (which represents multiple chunks combined)
-                            # We'll add it once per batch, not per chunk, to avoid duplicates
-                            if chunk_idx == batch_chunk_indices[lecture_id][0]:  # Only add for first chunk in batch
-                                # Manually add to pipeline's transcript buffer for sentiment analysis
-                                # Get current time for timestamp (US/Eastern)
-                                try:
-                                    from zoneinfo import ZoneInfo
-                                    current_time = datetime.now(ZoneInfo("America/New_York"))
-                                except Exception:
-                                    from datetime import timezone
-                                    current_time = datetime.now(timezone.utc)
-                                # Calculate total duration for this batch
-                                batch_chunk_count = len(batch_chunk_indices[lecture_id])
-                                batch_total_duration = batch_chunk_count * CHUNK_DURATION
-                                
-                                # Add to pipeline's transcript buffer and segments
-                                if hasattr(pipeline, 'transcript_buffer') and hasattr(pipeline, 'transcript_segments'):
-                                    pipeline.transcript_buffer.append(batch_transcript)
-                                    pipeline.transcript_segments.append({
-                                        'transcript': batch_transcript,
-                                        'timestamp': current_time,
-                                        'duration': batch_total_duration
-                                    })
-                                    print(f"📝 Added transcript to pipeline buffer for sentiment analysis: \"{batch_transcript[:50]}...\"")
-                        
-                        # Update the stored metric with new filler_rate and WPM
-                        if chunk_idx in chunk_metric_indices[lecture_id]:
-                            metric_idx = chunk_metric_indices[lecture_id][chunk_idx]
-                            if metric_idx < len(pipeline.fast_metrics_history):
-                                metric = pipeline.fast_metrics_history[metric_idx]
-                                # Update filler and WPM metrics
-                                metric['filler'] = filler_metrics.copy()
-                                metric['wpm'] = wpm_metrics.copy()
-                                
-                                # Re-send updated metrics to frontend (with filler_rate and WPM now included)
-                                frontend_metrics = map_ai_metrics_to_frontend(metric)
-                                # Apply same stabilization and smoothing on batch updates
-                                filler_info2 = metric.get('filler', {})
-                                total_words2 = filler_info2.get('total_words', 0)
-                                if total_words2 == 0 and lecture_id in last_clarity:
-                                    frontend_metrics['clarity'] = last_clarity[lecture_id]
-                                else:
-                                    prev_c2 = last_clarity.get(lecture_id, frontend_metrics['clarity'])
-                                    smoothed_c2 = EMA_ALPHA * frontend_metrics['clarity'] + (1 - EMA_ALPHA) * prev_c2
-                                    last_clarity[lecture_id] = round(max(0.0, min(100.0, smoothed_c2)), 1)
-                                    frontend_metrics['clarity'] = last_clarity[lecture_id]
-
-                                wpm_info2 = metric.get('wpm', {})
-                                wpm_val2 = wpm_info2.get('wpm', 0)
-                                if (not wpm_val2) and lecture_id in last_pace:
-                                    frontend_metrics['pace'] = last_pace[lecture_id]
-                                else:
-                                    prev_p2 = last_pace.get(lecture_id, frontend_metrics['pace'])
-                                    smoothed_p2 = EMA_ALPHA * frontend_metrics['pace'] + (1 - EMA_ALPHA) * prev_p2
-                                    smoothed_p2 = max(10.0, smoothed_p2)
-                                    last_pace[lecture_id] = round(min(100.0, smoothed_p2), 1)
-                                    frontend_metrics['pace'] = last_pace[lecture_id]
-                                
-                                # Stabilize pitch variation on batch updates (very light smoothing - preserves responsiveness)
-                                PITCH_EMA_ALPHA2 = 0.65  # Very light smoothing (65% new, 35% old - preserves responsiveness)
-                                prev_pitch2 = last_pitch.get(lecture_id, frontend_metrics['pitch'])
-                                smoothed_pitch2 = PITCH_EMA_ALPHA2 * frontend_metrics['pitch'] + (1 - PITCH_EMA_ALPHA2) * prev_pitch2
-                                smoothed_pitch2 = max(0.0, min(100.0, smoothed_pitch2))  # Clamp to 0-100
-                                last_pitch[lecture_id] = round(smoothed_pitch2, 1)
-                                frontend_metrics['pitch'] = last_pitch[lecture_id]
-                                try:
-                                    await websocket.send_json({
-                                        "type": "voice_metrics",
-                                        "metrics": frontend_metrics
-                                    })
-                                except Exception as e:
-                                    print(f"Error sending updated metrics: {e}")
-                    
-                    # Safe logging - check if indices list is not empty
-                    if chunk_indices_list and len(chunk_indices_list) > 0:
-                        print(f"   ↳ Updated filler_rate ({filler_metrics['filler_rate']:.1%}) and WPM ({wpm_metrics['wpm']}) for chunks {chunk_indices_list[0]}-{chunk_indices_list[-1]}")
-                    else:
-                        print(f"   ↳ Updated filler_rate ({filler_metrics['filler_rate']:.1%}) and WPM ({wpm_metrics['wpm']}) for transcript batch")
-                    
-                    # Update transcript for legacy engagement analysis
-                    lecture_transcripts[lecture_id] += " " + batch_transcript
-                    
-                    # Send transcript update to frontend (EXACT same as test_mic_realtime.py behavior)
-                    try:
-                        try:
-                            from zoneinfo import ZoneInfo
-                            eastern_now = datetime.now(ZoneInfo("America/New_York"))
-                        except Exception:
-                            from datetime import timezone
-                            eastern_now = datetime.now(timezone.utc)
-                        try:
-                            await websocket.send_json({
-                                "type": "transcript_update",
-                                "transcript": lecture_transcripts[lecture_id],
-                                "new_segment": batch_transcript,
-                                "timestamp": eastern_now.isoformat()
-                            })
-                        except (ConnectionClosed, ConnectionClosedOK, ConnectionClosedError, WebSocketDisconnect):
-                            raise WebSocketDisconnect()
-                    except Exception as e:
-                        print(f"Error sending transcript update: {e}")
-                    
-                except Exception as e:
-                    print(f"⚠ Transcription error: {e}")
-                    import traceback
-                    traceback.print_exc()
-                
-                # Reset buffer for next batch (EXACT same as test_mic_realtime.py lines 242-245)
-                # Safe access: check if key exists before resetting
-                if lecture_id in transcription_buffers:
-                    transcription_buffers[lecture_id] = []
-                if lecture_id in batch_chunk_indices:
-                    batch_chunk_indices[lecture_id] = []
-                if lecture_id in accumulated_duration:
-                    accumulated_duration[lecture_id] = 0.0
-            
-            # Accumulate talk time (only count chunks with sufficient energy to indicate speaking)
-            energy_normalized = metrics.get('energy', {}).get('energy_normalized', 0.0)
-            if energy_normalized > 0.1:  # Only count if there's actual audio (not silence)
-                if lecture_id not in lecture_talk_time:
-                    lecture_talk_time[lecture_id] = 0.0
-                lecture_talk_time[lecture_id] += CHUNK_DURATION
-            
-    except WebSocketDisconnect:
-        pass  # Normal disconnect
-    except Exception as e:
-        print(f"Error in audio handler: {e}")
-        import traceback
-        traceback.print_exc()
+        await asyncio.wait({receiver, ended, graph.task('emit')}, return_when=asyncio.FIRST_COMPLETED)
+        if ended.done():
+            log.info("lecture_ended_stopping_audio", lecture_id=lecture_id)
     finally:
+        # Stop reading, then let the stages finish the chunks already received
+        receiver.cancel()
+        ended.cancel()
+        await graph.drain('decode')
+        await graph.drain('dsp')
+        if session.audio_archive is not None:
+            await graph.drain('archive')
+        
         # Cleanup (similar to test_mic_realtime.py finally block)
+        # If the professor reconnected, the newer connection owns the session - leave it alone
+        owns_session = session.websocket is websocket
+        # A dropped connection (not ended, not stopped by the client) may come back: keep the session
+        client_stopped = receiver.done() and not receiver.cancelled() and receiver.exception() is None and receiver.result()
+        detach = owns_session and not session.ended and not client_stopped and RESUME_GRACE_SECONDS > 0
+        
         # Transcribe any remaining audio in buffer before exiting
-        if lecture_id in transcription_buffers and transcription_buffers[lecture_id] and use_whisper:
-            try:
-                # Safe access: get duration with default value
-                final_duration = accumulated_duration.get(lecture_id, 0.0)
-                print(f"🔄 Transcribing final {final_duration:.1f}s batch for lecture {lecture_id}...")
-                batched_audio = np.concatenate(transcription_buffers[lecture_id])
-                loop = asyncio.get_event_loop()
-                batch_transcript = await loop.run_in_executor(
-                    executor,
-                    transcribe_audio_chunk,
-                    batched_audio,
-                    SAMPLE_RATE,
-                    openai_key
-                )
-                
-                # Calculate filler_rate and WPM from final batch transcript (safe access)
-                filler_metrics = calculate_filler_rate(batch_transcript)
-                wpm_metrics = calculate_wpm(batch_transcript, final_duration)
-                
-                # Update metrics for remaining chunks
-                # Also add transcript to pipeline buffer for sentiment analysis
-                for chunk_idx in batch_chunk_indices[lecture_id]:
-                    chunk_transcripts[lecture_id][chunk_idx] = batch_transcript
-                    
-                    # Add transcript to pipeline's buffer for sentiment analysis
-                    if batch_transcript and batch_transcript.strip():
-                        if chunk_idx == batch_chunk_indices[lecture_id][0]:  # Only add for first chunk in batch
-                            try:
-                                from zoneinfo import ZoneInfo
-                                current_time = datetime.now(ZoneInfo("America/New_York"))
-                            except Exception:
-                                from datetime import timezone
-                                current_time = datetime.now(timezone.utc)
-                            batch_chunk_count = len(batch_chunk_indices[lecture_id])
-                            batch_total_duration = batch_chunk_count * CHUNK_DURATION
-                            
-                            if hasattr(pipeline, 'transcript_buffer') and hasattr(pipeline, 'transcript_segments'):
-                                pipeline.transcript_buffer.append(batch_transcript)
-                                pipeline.transcript_segments.append({
-                                    'transcript': batch_transcript,
-                                    'timestamp': current_time,
-                                    'duration': batch_total_duration
-                                })
-                                print(f"📝 Added final transcript to pipeline buffer for sentiment analysis")
-                    
-                    if chunk_idx in chunk_metric_indices[lecture_id]:
-                        metric_idx = chunk_metric_indices[lecture_id][chunk_idx]
-                        if metric_idx < len(pipeline.fast_metrics_history):
-                            metric = pipeline.fast_metrics_history[metric_idx]
-                            metric['filler'] = filler_metrics.copy()
-                            metric['wpm'] = wpm_metrics.copy()
-                
-                lecture_transcripts[lecture_id] += " " + batch_transcript
-                print(f"✓ Final transcription complete")
-            except Exception as e:
-                print(f"⚠ Final transcription error: {e}")
+        # (final batch gets the highest gateway priority so it is never shed)
+        if owns_session and not detach and session.audio_ring is not None and len(session.audio_ring) and use_whisper:
+            log.info("transcription_final_batch", lecture_id=lecture_id, seconds=session.accumulated_duration)
+            graph['transcribe'].put_nowait(_take_batch(session, PRIORITY_FINAL_TRANSCRIPTION))
+        await graph.drain('transcribe')
+        if owns_session and session.metrics_emitter is not None:
+            session.metrics_emitter.flush()  # Don't hold back the last metrics frame
         
-        # Clean up
-        if lecture_id in ai_suggestion_timers:
-            ai_suggestion_timers[lecture_id].cancel()
-            del ai_suggestion_timers[lecture_id]
+        # Flush what is still queued for the professor (e.g. after the lecture was ended), then stop
+        await graph.drain('emit', timeout=OUTBOUND_FLUSH_TIMEOUT)
+        await graph.stop()
         
-        if lecture_id in voice_pipelines:
-            del voice_pipelines[lecture_id]
-        if lecture_id in voice_pipeline_executors:
-            executor = voice_pipeline_executors[lecture_id]
-            try:
-                executor.shutdown(wait=False)
-            except:
-                pass
-            del voice_pipeline_executors[lecture_id]
-        if lecture_id in transcription_buffers:
-            del transcription_buffers[lecture_id]
-        if lecture_id in batch_chunk_indices:
-            del batch_chunk_indices[lecture_id]
-        if lecture_id in accumulated_duration:
-            del accumulated_duration[lecture_id]
-        if lecture_id in chunk_transcripts:
-            del chunk_transcripts[lecture_id]
-        if lecture_id in chunk_metric_indices:
-            del chunk_metric_indices[lecture_id]
-        if lecture_id in sentiment_queues:
-            del sentiment_queues[lecture_id]
-        if lecture_id in lecture_talk_time:
-            del lecture_talk_time[lecture_id]
+        for task in (receiver, *graph.tasks()):
+            if task.done() and not task.cancelled():
+                error = task.exception()
+                if error is not None and not isinstance(error, (WebSocketDisconnect, ConnectionClosed)):
+                    log.log(logging.ERROR, "audio_handler_error", lecture_id=lecture_id, error=error,
+                            exc_info=(type(error), error, error.__traceback__))
         
-        # Save transcript to database before deleting from memory
-        if lecture_id in lecture_transcripts:
-            transcript_text = lecture_transcripts[lecture_id]
-            if transcript_text and len(transcript_text.strip()) > 0:
-                try:
-                    print(f"💾 Saving transcript to database for lecture {lecture_id} ({len(transcript_text)} chars)...")
-                    
-                    # Check if lecture exists first (for debugging)
-                    check_result = supabase.table("lectures").select("lecture_id, status").eq("lecture_id", lecture_id).execute()
-                    if not check_result.data:
-                        print(f"⚠ WARNING: Lecture {lecture_id} not found in database")
-                        print(f"   Attempting to save transcript anyway (may create the record if permissions allow)")
-                    else:
-                        print(f"✓ Lecture found: {check_result.data[0]}")
-                    
-                    # Try to update transcript anyway (even if lecture not found, might work)
-                    result = supabase.table("lectures").update({
-                        "transcript": transcript_text
-                    }).eq("lecture_id", lecture_id).execute()
-                    
-                    if result.data and len(result.data) > 0:
-                        print(f"✓ Transcript saved successfully ({len(transcript_text)} chars)")
-                    else:
-                        # Check if it's because the lecture doesn't exist
-                        if not check_result.data:
-                            print(f"❌ ERROR: Cannot save transcript - lecture {lecture_id} does not exist in database")
-                            print(f"   Solution: Create the lecture first via POST /lectures endpoint")
-                        else:
-                            print(f"⚠ WARNING: Failed to save transcript - no data returned from update")
-                            print(f"   Response: {result}")
-                            
-                except Exception as e:
-                    print(f"❌ ERROR: Failed to save transcript to database: {e}")
-                    print(f"   Lecture ID: {lecture_id}")
-                    print(f"   Transcript length: {len(transcript_text)} chars")
-                    
-                    # Check if it's a permission or column issue
-                    error_str = str(e).lower()
-                    if "column" in error_str or "does not exist" in error_str:
-                        print(f"   💡 Hint: Make sure the 'transcript' column exists in the lectures table")
-                        print(f"      Run: ALTER TABLE lectures ADD COLUMN IF NOT EXISTS transcript TEXT;")
-                    elif "permission" in error_str or "policy" in error_str:
-                        print(f"   💡 Hint: Check RLS policies on the lectures table")
-                    
-                    import traceback
-                    traceback.print_exc()
-            else:
-                print(f"ℹ No transcript to save for lecture {lecture_id} (empty or not started)")
-            
-            # Delete from memory after saving (even if save failed)
-            del lecture_transcripts[lecture_id]
+        if session.websocket is not websocket:
+            pass  # A newer connection took the session over
+        elif detach:
+            # Keep the pipeline, smoothing state and batch for a reconnect
+            _detach_session(session, use_whisper, openai_key)
+        else:
+            await _finish_session(session)
 
 
-async def ai_question_suggestion_timer(lecture_id: str, professor_id: str, websocket: WebSocket):
-    """Timer that suggests questions based on talk time (configurable, default 5 minutes)."""
-    # Get class_id to fetch settings
-    lecture_result = supabase.table("lectures").select("class_id").eq("lecture_id", lecture_id).execute()
-    if not lecture_result.data:
-        return
-    class_id = lecture_result.data[0]["class_id"]
+def _question_context(transcript: TranscriptStore) -> str:
+    """Most recent transcript sentences that fit the question prompt's token budget."""
+    budget = get_budget("question")
+    # Only the tail needs trimming; ~8 chars per token is a generous upper bound
+    return trim_to_tokens(transcript.tail_chars(budget * 8), budget, keep="tail")[0]
+
+
+def _has_enough_context(transcript: TranscriptStore) -> bool:
+    """Whether the transcript tail holds enough tokens to base a question on."""
+    tail = transcript.tail_chars(MIN_SUGGESTION_CONTEXT_TOKENS * 8)
+    return count_tokens(tail) >= MIN_SUGGESTION_CONTEXT_TOKENS
+
+
+async def _draft_question(lecture_id: str, context: str) -> Dict:
+    """Generate a question (with the most relevant slides) for a speculative draft."""
+    from app.services.ai_service import QUESTION_FIELDS, _validate_fields, generate_question_full
+    from app.services.slide_index import retrieve_slide_context
+    
+    slide_content = await retrieve_slide_context(lecture_id, context)
+    # Same checks as a streamed question: every field present and a valid correct_answer
+    return _validate_fields(await generate_question_full(context, slide_content=slide_content), QUESTION_FIELDS)
+
+
+def _start_question_draft(session: LectureSession, transcript: TranscriptStore) -> None:
+    """Start generating a question from the current transcript tail in the background."""
+    session.cancel_question_draft()
+    context = _question_context(transcript)
+    session.question_draft = {
+        "task": asyncio.create_task(_draft_question(session.lecture_id, context)),
+        "context": context,
+        "transcript_len": transcript.char_count
+    }
+
+
+def _draft_is_fresh(draft: Optional[dict], transcript: TranscriptStore) -> bool:
+    """A draft is reusable while the transcript has not moved on too far since it was started."""
+    if not draft:
+        return False
+    new_chars = transcript.char_count - draft["transcript_len"]
+    return 0 <= new_chars <= SUGGESTION_DRAFT_MAX_DRIFT * max(len(draft["context"]), 1)
+
+
+async def _take_question(session: LectureSession, transcript: TranscriptStore, on_partial=None) -> Dict:
+    """Return the pre-generated question if still relevant, otherwise generate one now.
+    
+    A question generated now is streamed: on_partial is awaited with the
+    fields decoded so far.
+    """
+    from app.services.ai_service import stream_question_full
     
-    # Get question suggestion interval from settings (default 5 minutes)
-    from app.services.teacher_settings import get_teacher_settings
-    settings = await get_teacher_settings(class_id)
-    suggestion_interval_minutes = settings.question_suggestion_interval
-    suggestion_interval_seconds = suggestion_interval_minutes * 60
+    draft = session.question_draft
+    session.question_draft = None
+    if _draft_is_fresh(draft, transcript):
+        try:
+            return await draft["task"]
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("question_draft_failed", lecture_id=session.lecture_id, error=e)
+    elif draft and not draft["task"].done():
+        draft["task"].cancel()
+    from app.services.slide_index import retrieve_slide_context
+    context = _question_context(transcript)
+    return await stream_question_full(
+        context, slide_content=await retrieve_slide_context(session.lecture_id, context), on_partial=on_partial
+    )
+
+
+async def ai_question_suggestion_timer(session: LectureSession):
+    """Timer that suggests questions based on talk time (configurable, default 5 minutes).
     
-    last_suggestion_talk_time = 0.0  # Track talk time at last suggestion
+    A draft question is generated SUGGESTION_PREGENERATE_LEAD seconds of talk time
+    before the threshold, so the suggestion can be pushed as soon as it is due.
     
-    while True:
-        # Check if lecture is still active
-        lecture_result = supabase.table("lectures").select("status").eq("lecture_id", lecture_id).execute()
+    The timer sleeps until the next point it could act on (talk time grows at
+    most as fast as the clock) and wakes early for lecture events: it stops
+    when the lecture ends, pauses while the professor is disconnected, restarts
+    its window when a question is triggered and backs off after a rejection.
+    Suggestions go to the professor's current connection, so the timer
+    survives reconnects.
+    """
+    lecture_id = session.lecture_id
+    loop = asyncio.get_running_loop()
+    
+    with lecture_events.subscribe(lecture_id) as events:
+        # Get class_id to fetch settings (and the status, once - later changes arrive as events)
+        lecture_result = await asyncio.to_thread(
+            lambda: supabase.table("lectures").select("class_id, status").eq("lecture_id", lecture_id).execute()
+        )
         if not lecture_result.data or lecture_result.data[0]["status"] != "active":
-            break
+            return
+        class_id = lecture_result.data[0]["class_id"]
         
-        # Get current talk time
-        current_talk_time = lecture_talk_time.get(lecture_id, 0.0)
+        # Get question suggestion interval from settings (default 5 minutes)
+        from app.services.teacher_settings import get_teacher_settings
+        settings = await get_teacher_settings(class_id)
+        suggestion_interval_minutes = settings.question_suggestion_interval
+        suggestion_interval_seconds = suggestion_interval_minutes * 60
+        # Start drafting this much talk time before the threshold (never before the window opens)
+        draft_at = suggestion_interval_seconds - min(SUGGESTION_PREGENERATE_LEAD, suggestion_interval_seconds)
         
-        # Check if we've talked enough since last suggestion
-        talk_time_since_suggestion = current_talk_time - last_suggestion_talk_time
+        last_suggestion_talk_time = session.talk_time  # Track talk time at last suggestion
+        hold_until = 0.0  # loop time before which no suggestion is sent (after a rejection)
+        paused = False
         
-        if talk_time_since_suggestion >= suggestion_interval_seconds:
-            # Apply rejection delay if any
-            additional_delay = rejection_delays.get(lecture_id, 0)
-            if additional_delay > 0:
-                # Wait for the additional delay
-                await asyncio.sleep(additional_delay)
-                # Reset rejection delay after using it
-                del rejection_delays[lecture_id]
-                # Re-check talk time after delay
-                current_talk_time = lecture_talk_time.get(lecture_id, 0.0)
+        try:
+            while True:
+                # Work out how long nothing can happen, then wait that long or for an event
+                talk_time_since_suggestion = session.talk_time - last_suggestion_talk_time
+                if talk_time_since_suggestion < draft_at:
+                    timeout = draft_at - talk_time_since_suggestion
+                else:
+                    timeout = suggestion_interval_seconds - talk_time_since_suggestion
+                timeout = max(timeout, hold_until - loop.time(), SUGGESTION_MIN_WAIT)
+                
+                event = await events.next(None if paused else timeout)
+                if event is not None:
+                    if event.kind == ENDED:
+                        break
+                    if event.kind == PAUSED:
+                        paused = True
+                    elif event.kind in (RESUMED, STARTED):
+                        paused = False
+                    elif event.kind == QUESTION_TRIGGERED:
+                        # The professor asked a question: start a new window from here
+                        last_suggestion_talk_time = session.talk_time
+                        hold_until = 0.0
+                        session.rejection_delay = 0.0
+                        session.cancel_question_draft()
+                    elif event.kind == SUGGESTION_REJECTED:
+                        # Back off before the next suggestion (delays add up)
+                        hold_until = max(hold_until, loop.time()) + session.rejection_delay
+                        session.rejection_delay = 0.0
+                    continue
+                
+                # Get current talk time
+                current_talk_time = session.talk_time
+                
+                # Check if we've talked enough since last suggestion
                 talk_time_since_suggestion = current_talk_time - last_suggestion_talk_time
-            
-            # Check again if we've talked enough (after delay)
-            if talk_time_since_suggestion >= suggestion_interval_seconds:
+                
+                # Speculatively draft the next question ahead of the threshold
+                if talk_time_since_suggestion >= draft_at:
+                    recent_transcript = session.transcript
+                    if _has_enough_context(recent_transcript) and not _draft_is_fresh(session.question_draft, recent_transcript):
+                        _start_question_draft(session, recent_transcript)
+                
+                if talk_time_since_suggestion < suggestion_interval_seconds or loop.time() < hold_until:
+                    continue
+                
                 # Get recent transcript
-                recent_transcript = lecture_transcripts.get(lecture_id, "")
-                if len(recent_transcript) >= 100:  # Enough content
-                    # Generate question suggestion
-                    from app.services.ai_service import generate_question_full
-                    question_data = await generate_question_full(recent_transcript[-2000:])  # Last 2000 chars
-                    
-                    # Create question in database (pending status)
-                    from uuid import uuid4
-                    question_id = str(uuid4())
-                    supabase.table("questions").insert({
+                recent_transcript = session.transcript
+                if not _has_enough_context(recent_transcript):
+                    continue
+                question_id = str(uuid4())
+                
+                async def send_partial(fields: Dict):
+                    await send_to_professor(lecture_id, {
+                        "type": "question_suggestion_partial",
+                        "question_id": question_id,
+                        "question": fields
+                    })
+                
+                # Use the speculative draft when it still matches the transcript,
+                # otherwise stream a new question to the professor as it is generated;
+                # then create it in the database (pending status)
+                try:
+                    question_data = await _take_question(session, recent_transcript, on_partial=send_partial)
+                    await asyncio.to_thread(lambda: supabase.table("questions").insert({
                         "question_id": question_id,
                         "lecture_id": lecture_id,
                         "question_text": question_data["question_text"],
@@ -1181,43 +1365,33 @@ async def ai_question_suggestion_timer(lecture_id: str, professor_id: str, webso
                         "ai_suggested": True,
                         "created_by": "ai",
                         "status": "pending"
-                    }).execute()
-                    
-                    # Send suggestion to professor
-                    try:
-                        await websocket.send_json({
-                            "type": "question_suggestion",
-                            "question_id": question_id,
-                            "question": question_data
-                        })
-                        # Update last suggestion talk time
-                        last_suggestion_talk_time = current_talk_time
-                    except:
-                        break  # Connection closed
-        
-        # Check every 10 seconds for talk time updates
-        await asyncio.sleep(10)
+                    }).execute())
+                except Exception as e:
+                    log.warning("question_suggestion_failed", lecture_id=lecture_id, error=e)
+                    hold_until = loop.time() + SUGGESTION_RETRY_SECONDS
+                    continue
+                
+                # Send suggestion to professor (it stays pending in the database if they are reconnecting)
+                await send_to_professor(lecture_id, {
+                    "type": "question_suggestion",
+                    "question_id": question_id,
+                    "question": question_data
+                })
+                # Update last suggestion talk time
+                last_suggestion_talk_time = current_talk_time
+                session.last_question_time = datetime.utcnow()
+        finally:
+            session.cancel_question_draft()
 
 
 def reset_question_timer(lecture_id: str):
-    """Reset the AI question timer (when professor triggers a question)."""
-    if lecture_id in ai_suggestion_timers:
-        ai_suggestion_timers[lecture_id].cancel()
-        del ai_suggestion_timers[lecture_id]
-    
-    # Timer will be restarted when audio stream reconnects
-    # In production, you'd need to pass websocket reference to restart
-    # For now, just reset talk time to effectively restart the timer
-    if lecture_id in lecture_talk_time:
-        lecture_talk_time[lecture_id] = 0.0
-    
-    # Reset rejection delay
-    if lecture_id in rejection_delays:
-        del rejection_delays[lecture_id]
+    """Restart the AI question timer's window (when professor triggers a question)."""
+    lecture_events.publish(lecture_id, QUESTION_TRIGGERED)
 
 
 def add_rejection_delay(lecture_id: str):
     """Add 7 minutes to the timer when professor rejects a question."""
-    if lecture_id not in rejection_delays:
-        rejection_delays[lecture_id] = 0
-    rejection_delays[lecture_id] += 7 * 60  # Add 7 minutes
+    session = get_session(lecture_id)
+    if session is not None:
+        session.rejection_delay += SUGGESTION_REJECTION_DELAY
+        lecture_events.publish(lecture_id, SUGGESTION_REJECTED, delay=SUGGESTION_REJECTION_DELAY)
@@ -0,0 +1,177 @@
+"""
+Binary framing for the professor's audio stream.
+
+Legacy clients send every PCM chunk as two WebSocket messages: a JSON
+`audio_chunk_pcm` metadata frame followed by the raw Int16 bytes. Framed
+clients send a single binary message per chunk instead, a fixed
+little-endian header followed by the PCM payload:
+
+    offset  size  field
+    0       1     version       (PROTOCOL_VERSION)
+    1       1     flags         (FLAG_FINAL, ...)
+    2       2     header_size   (bytes before the payload, >= HEADER_SIZE)
+    4       4     seq           (chunk sequence number, increments by 1)
+    8       4     sample_rate   (Hz)
+    12      4     sample_count  (Int16 samples in the payload)
+
+Negotiation: a framed client sends {"type": "hello", "protocol": "pcm-frame",
+"versions": [1]} right after connecting; the server answers with hello_ack
+naming the version it will parse. Clients that never send hello keep the
+legacy two-message format.
+
+Resumption: hello_ack carries a session_token. While streaming, the server
+acknowledges chunks with {"type": "audio_ack", "seq": N}; the client keeps
+the frames after the last ack. If the connection drops, the client
+reconnects and sends the token back in its hello ("resume_token"). If the
+server still holds the session (within its grace period), hello_ack says
+resumed=true with ack_seq, the last chunk it has, and the client resends the
+frames after it with their original sequence numbers.
+"""
+
+from typing import Dict, Iterable, Optional, Union
+import struct
+
+PROTOCOL_NAME = "pcm-frame"
+PROTOCOL_VERSION = 1
+SUPPORTED_VERSIONS = (1,)
+
+HEADER = struct.Struct("<BBHIII")
+HEADER_SIZE = HEADER.size  # 16 bytes
+BYTES_PER_SAMPLE = 2  # Int16
+
+FLAG_FINAL = 0x01  # Last chunk of the recording
+
+
+class FrameError(ValueError):
+    """Malformed audio frame."""
+
+
+class AudioFrame:
+    """One parsed audio frame; payload is a view into the received message (no copy)."""
+
+    __slots__ = ('version', 'flags', 'seq', 'sample_rate', 'sample_count', 'payload')
+
+    def __init__(self, version: int, flags: int, seq: int, sample_rate: int,
+                 sample_count: int, payload: memoryview):
+        self.version = version
+        self.flags = flags
+        self.seq = seq
+        self.sample_rate = sample_rate
+        self.sample_count = sample_count
+        self.payload = payload
+
+    @property
+    def is_final(self) -> bool:
+        return bool(self.flags & FLAG_FINAL)
+
+    @property
+    def duration(self) -> float:
+        return self.sample_count / self.sample_rate if self.sample_rate else 0.0
+
+    def metadata(self) -> Dict:
+        """Chunk metadata in the same shape as the legacy audio_chunk_pcm message."""
+        return {
+            'sample_rate': self.sample_rate,
+            'samples': self.sample_count,
+            'duration': self.duration,
+            'chunk_index': self.seq,
+            'format': 'pcm_int16',
+            'is_final': self.is_final,
+        }
+
+
+def parse_frame(data: Union[bytes, bytearray, memoryview]) -> AudioFrame:
+    """
+    Parse a binary audio frame.
+
+    Raises:
+        FrameError: If the frame is truncated, has an unsupported version or
+            its payload does not match the declared sample count
+    """
+    view = memoryview(data)
+    if len(view) < HEADER_SIZE:
+        raise FrameError(f"frame too short ({len(view)} bytes)")
+
+    version, flags, header_size, seq, sample_rate, sample_count = HEADER.unpack_from(view)
+    if version not in SUPPORTED_VERSIONS:
+        raise FrameError(f"unsupported frame version {version}")
+    if header_size < HEADER_SIZE or header_size > len(view):
+        raise FrameError(f"bad header size {header_size}")
+    if sample_rate == 0:
+        raise FrameError("sample rate is 0")
+
+    payload = view[header_size:]
+    if len(payload) != sample_count * BYTES_PER_SAMPLE:
+        raise FrameError(f"payload is {len(payload)} bytes, header declares {sample_count} samples")
+
+    return AudioFrame(version, flags, seq, sample_rate, sample_count, payload)
+
+
+def encode_frame(seq: int, sample_rate: int, pcm: Union[bytes, bytearray, memoryview],
+                 flags: int = 0) -> bytes:
+    """Build a frame around Int16 PCM bytes (used by tools and tests; the browser builds its own)."""
+    header = HEADER.pack(PROTOCOL_VERSION, flags, HEADER_SIZE, seq, sample_rate, len(pcm) // BYTES_PER_SAMPLE)
+    return header + bytes(pcm)
+
+
+def negotiate(hello: Dict) -> Optional[int]:
+    """
+    Pick the protocol version for a client hello.
+
+    Returns:
+        The highest version both sides support, or None to stay on the legacy format
+    """
+    if hello.get('protocol') != PROTOCOL_NAME:
+        return None
+    offered: Iterable = hello.get('versions') or [hello.get('version')]
+    common = [v for v in offered if v in SUPPORTED_VERSIONS]
+    return max(common) if common else None
+
+
+def hello_ack(version: Optional[int], session_token: Optional[str] = None,
+              resumed_seq: Optional[int] = None) -> Dict:
+    """
+    Server reply to a hello.
+
+    Args:
+        version: Negotiated version (None means legacy format)
+        session_token: Token the client sends back to resume after a reconnect
+        resumed_seq: Last chunk the server has, if the hello resumed a stream
+    """
+    return {
+        'type': 'hello_ack',
+        'protocol': PROTOCOL_NAME if version is not None else 'legacy',
+        'version': version,
+        'session_token': session_token,
+        'resumed': resumed_seq is not None,
+        'ack_seq': resumed_seq,
+    }
+
+
+def audio_ack(seq: int) -> Dict:
+    """Acknowledges every chunk up to and including seq."""
+    return {'type': 'audio_ack', 'seq': seq}
+
+
+class SequenceTracker:
+    """Detects lost or reordered chunks from their sequence numbers."""
+
+    __slots__ = ('expected', 'lost', 'out_of_order')
+
+    def __init__(self, expected: Optional[int] = None):
+        self.expected = expected  # Next sequence number (None until the first chunk)
+        self.lost = 0
+        self.out_of_order = 0
+
+    def observe(self, seq: int) -> int:
+        """Record a sequence number; returns how many chunks were skipped before it."""
+        gap = 0
+        if self.expected is not None:
+            if seq > self.expected:
+                gap = seq - self.expected
+                self.lost += gap
+            elif seq < self.expected:
+                self.out_of_order += 1
+                return 0
+        self.expected = seq + 1
+        return gap
@@ -0,0 +1,249 @@
+"""
+Staged processing for the professor's audio stream.
+
+Each connection runs a small stage graph (ingest -> decode -> dsp ->
+transcribe -> emit). Stages are connected by bounded queues and each one
+runs in its own task, so a slow stage (a Whisper call) only backs up its
+own queue instead of stalling the real-time meters.
+
+What happens when a stage's queue is full depends on its policy:
+
+- BLOCK: the producer waits (backpressure up to the socket reader)
+- DROP_OLDEST: the oldest queued item is discarded
+- DROP_NEWEST: the new item is discarded
+- MERGE: the new item is merged into the last queued one
+
+Every stage records queue depth, throughput, drops/merges, queue wait and
+processing time; render_stage_metrics() exposes them for /metrics.
+"""
+
+from collections import deque
+from time import monotonic
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+import asyncio
+import weakref
+
+from app.utils.log import get_logger
+
+log = get_logger(__name__)
+
+BLOCK = "block"
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+MERGE = "merge"
+
+POLICIES = (BLOCK, DROP_OLDEST, DROP_NEWEST, MERGE)
+
+
+class StageMetrics:
+    """Counters for one stage."""
+
+    __slots__ = ('processed', 'dropped', 'merged', 'errors', 'wait_seconds', 'busy_seconds', 'max_busy_seconds')
+
+    def __init__(self):
+        self.processed = 0
+        self.dropped = 0
+        self.merged = 0
+        self.errors = 0
+        self.wait_seconds = 0.0  # Total time items spent queued
+        self.busy_seconds = 0.0  # Total time spent in the handler
+        self.max_busy_seconds = 0.0
+
+    def as_dict(self) -> Dict:
+        processed = self.processed or 1
+        return {
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'merged': self.merged,
+            'errors': self.errors,
+            'avg_wait_ms': round(1000 * self.wait_seconds / processed, 2),
+            'avg_busy_ms': round(1000 * self.busy_seconds / processed, 2),
+            'max_busy_ms': round(1000 * self.max_busy_seconds, 2),
+        }
+
+
+class Stage:
+    """A bounded queue drained by one handler task."""
+
+    def __init__(self, name: str, handler: Callable[[Any], Awaitable[None]], maxsize: int,
+                 policy: str = BLOCK, merge: Optional[Callable[[Any, Any], Any]] = None,
+                 fatal: Tuple[type, ...] = ()):
+        """
+        Args:
+            name: Stage name used in metrics and logs
+            handler: Coroutine function called with each item, in order
+            maxsize: Queue capacity
+            policy: What to do when the queue is full (see module docstring)
+            merge: For MERGE, combines (queued_item, new_item) into one item
+            fatal: Handler exceptions that stop the stage (others are logged and skipped)
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"unknown stage policy {policy!r}")
+        if policy == MERGE and merge is None:
+            raise ValueError("MERGE stages need a merge function")
+        self.name = name
+        self.label: Optional[str] = None  # Lecture of the graph the stage belongs to (for logs)
+        self.handler = handler
+        self.maxsize = max(maxsize, 1)
+        self.policy = policy
+        self.merge = merge
+        self.fatal = fatal
+        self.metrics = StageMetrics()
+        self._items: Deque[Tuple[float, Any]] = deque()
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self._closed = False
+
+    @property
+    def depth(self) -> int:
+        return len(self._items)
+
+    def _append(self, item: Any) -> None:
+        self._items.append((monotonic(), item))
+        self._not_empty.set()
+        if len(self._items) >= self.maxsize:
+            self._not_full.clear()
+
+    def put_nowait(self, item: Any) -> bool:
+        """Queue an item without waiting. Returns False if it was dropped."""
+        if self._closed:
+            return False
+        if len(self._items) < self.maxsize:
+            self._append(item)
+            return True
+        if self.policy == DROP_OLDEST:
+            self._items.popleft()
+            self.metrics.dropped += 1
+            self._append(item)
+            return True
+        if self.policy == MERGE:
+            queued_at, queued = self._items[-1]
+            self._items[-1] = (queued_at, self.merge(queued, item))
+            self.metrics.merged += 1
+            return True
+        # DROP_NEWEST, or BLOCK called without waiting
+        self.metrics.dropped += 1
+        return False
+
+    async def put(self, item: Any) -> bool:
+        """Queue an item, waiting for room if the stage blocks. Returns False if it was dropped."""
+        if self.policy == BLOCK:
+            while len(self._items) >= self.maxsize and not self._closed:
+                await self._not_full.wait()
+        return self.put_nowait(item)
+
+    def close(self) -> None:
+        """Stop accepting items; the stage finishes what is queued, then run() returns."""
+        self._closed = True
+        self._not_empty.set()
+        self._not_full.set()
+
+    async def run(self) -> None:
+        """Drain the queue until closed. Handler errors are counted and logged unless fatal."""
+        while True:
+            while not self._items:
+                if self._closed:
+                    return
+                self._not_empty.clear()
+                await self._not_empty.wait()
+
+            queued_at, item = self._items.popleft()
+            if len(self._items) < self.maxsize:
+                self._not_full.set()
+
+            started = monotonic()
+            self.metrics.wait_seconds += started - queued_at
+            try:
+                await self.handler(item)
+            except asyncio.CancelledError:
+                raise
+            except self.fatal:
+                self.close()
+                raise
+            except Exception as e:
+                self.metrics.errors += 1
+                log.exception("audio_stage_error", lecture_id=self.label, stage=self.name, error=e, every=5.0)
+            busy = monotonic() - started
+            self.metrics.processed += 1
+            self.metrics.busy_seconds += busy
+            self.metrics.max_busy_seconds = max(self.metrics.max_busy_seconds, busy)
+
+
+# Live stage graphs, for /metrics
+_live_graphs: "weakref.WeakSet[StageGraph]" = weakref.WeakSet()
+
+
+class StageGraph:
+    """The stages of one connection, in pipeline order."""
+
+    def __init__(self, label: str, stages: List[Stage]):
+        self.label = label
+        self.stages = stages
+        for stage in stages:
+            stage.label = label
+        self._tasks: Dict[str, asyncio.Task] = {}
+        _live_graphs.add(self)
+
+    def __getitem__(self, name: str) -> Stage:
+        for stage in self.stages:
+            if stage.name == name:
+                return stage
+        raise KeyError(name)
+
+    def start(self) -> None:
+        for stage in self.stages:
+            self._tasks[stage.name] = asyncio.create_task(stage.run(), name=f"{self.label}:{stage.name}")
+
+    def task(self, name: str) -> asyncio.Task:
+        return self._tasks[name]
+
+    def tasks(self) -> List[asyncio.Task]:
+        return list(self._tasks.values())
+
+    async def drain(self, name: str, timeout: Optional[float] = None) -> None:
+        """Close a stage and wait for it to finish its queue (cancelled after timeout)."""
+        stage = self[name]
+        stage.close()
+        task = self._tasks.get(name)
+        if task is None or task.done():
+            return
+        # Errors stay on the task (see task()); they are not raised here
+        await asyncio.wait({task}, timeout=timeout)
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def stop(self) -> None:
+        """Cancel any stage still running."""
+        for stage in self.stages:
+            stage.close()
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        _live_graphs.discard(self)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Per-stage depth and metrics."""
+        return {
+            stage.name: {'depth': stage.depth, 'capacity': stage.maxsize, 'policy': stage.policy,
+                         **stage.metrics.as_dict()}
+            for stage in self.stages
+        }
+
+
+def render_stage_metrics() -> str:
+    """Prometheus text exposition of all live stage graphs."""
+    lines = []
+    for graph in list(_live_graphs):
+        for stage in graph.stages:
+            labels = f'lecture="{graph.label}",stage="{stage.name}"'
+            m = stage.metrics
+            lines.append(f"audio_stage_queue_depth{{{labels}}} {stage.depth}")
+            lines.append(f"audio_stage_processed_total{{{labels}}} {m.processed}")
+            lines.append(f"audio_stage_dropped_total{{{labels}}} {m.dropped}")
+            lines.append(f"audio_stage_merged_total{{{labels}}} {m.merged}")
+            lines.append(f"audio_stage_errors_total{{{labels}}} {m.errors}")
+            lines.append(f"audio_stage_wait_seconds_sum{{{labels}}} {m.wait_seconds:g}")
+            lines.append(f"audio_stage_busy_seconds_sum{{{labels}}} {m.busy_seconds:g}")
+    return "\n".join(lines) + ("\n" if lines else "")
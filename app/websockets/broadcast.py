@@ -0,0 +1,201 @@
+"""
+Fan-out of lecture broadcasts to student WebSockets.
+
+Every socket has its own small bounded send queue drained by its own
+writer task. broadcast() serializes the message once and only enqueues it,
+so one slow phone no longer delays the question for everyone after it.
+
+When a socket's queue is full, the broadcast's policy decides:
+
+- DROP: the message is skipped for that socket (for updates that the next
+  one supersedes, like timer ticks)
+- EVICT: the socket is closed and removed; the client reconnects and
+  starts from the current state (for messages that must not be missed)
+
+A socket whose send fails, or takes longer than BROADCAST_SEND_TIMEOUT,
+is removed as well.
+
+Fan-out latency (broadcast() to the message being written to a socket) is
+sampled per delivery; snapshot() and render_broadcast_metrics() report
+p50/p99.
+"""
+
+from collections import deque
+from time import monotonic
+from typing import Deque, Dict, Optional, Tuple
+import asyncio
+import json
+import os
+
+from fastapi import WebSocket
+
+from app.utils.log import get_logger
+
+log = get_logger(__name__)
+
+DROP = "drop"
+EVICT = "evict"
+
+BROADCAST_QUEUE_SIZE = int(os.getenv("BROADCAST_QUEUE_SIZE", "8"))  # messages waiting per socket
+BROADCAST_SEND_TIMEOUT = float(os.getenv("BROADCAST_SEND_TIMEOUT", "5"))  # seconds one send may take
+EVICT_CLOSE_CODE = 1013  # "try again later": the client should reconnect
+LATENCY_SAMPLES = 4096  # recent deliveries the percentiles are computed over
+
+
+class _Subscriber:
+    """One student socket with its send queue and writer task."""
+
+    __slots__ = ('lecture_id', 'websocket', 'queue', 'task', 'sent', 'dropped')
+
+    def __init__(self, lecture_id: str, websocket: WebSocket, queue_size: int):
+        self.lecture_id = lecture_id
+        self.websocket = websocket
+        self.queue: "asyncio.Queue[Tuple[str, float]]" = asyncio.Queue(maxsize=queue_size)
+        self.task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.dropped = 0
+
+
+class BroadcastHub:
+    """Student sockets per lecture, each fed through its own bounded queue."""
+
+    def __init__(self, queue_size: int = BROADCAST_QUEUE_SIZE, send_timeout: float = BROADCAST_SEND_TIMEOUT):
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self._lectures: Dict[str, Dict[WebSocket, _Subscriber]] = {}
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+
+        self.broadcasts = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.evicted = 0
+
+    def connections(self, lecture_id: str) -> int:
+        return len(self._lectures.get(lecture_id, ()))
+
+    def add(self, lecture_id: str, websocket: WebSocket) -> None:
+        """Start delivering the lecture's broadcasts to an accepted socket."""
+        subscriber = _Subscriber(lecture_id, websocket, self.queue_size)
+        self._lectures.setdefault(lecture_id, {})[websocket] = subscriber
+        subscriber.task = asyncio.create_task(self._writer(subscriber))
+
+    def discard(self, lecture_id: str, websocket: WebSocket) -> None:
+        """Stop delivering to a socket (no-op if it was already removed)."""
+        subscribers = self._lectures.get(lecture_id)
+        subscriber = subscribers.get(websocket) if subscribers else None
+        if subscriber is not None:
+            self._remove(subscriber)
+            if subscriber.task is not None and subscriber.task is not asyncio.current_task():
+                subscriber.task.cancel()
+
+    def _remove(self, subscriber: _Subscriber) -> None:
+        subscribers = self._lectures.get(subscriber.lecture_id)
+        if subscribers is not None and subscribers.get(subscriber.websocket) is subscriber:
+            del subscribers[subscriber.websocket]
+            if not subscribers:
+                del self._lectures[subscriber.lecture_id]
+
+    def broadcast(self, lecture_id: str, message: dict, policy: str = EVICT) -> int:
+        """
+        Queue a message for every socket of the lecture (never waits on a socket).
+
+        Args:
+            lecture_id: Lecture whose students receive the message
+            message: JSON-serializable message
+            policy: What to do for a socket whose queue is full (DROP or EVICT)
+
+        Returns:
+            Number of sockets the message was queued for
+        """
+        subscribers = self._lectures.get(lecture_id)
+        if not subscribers:
+            return 0
+        self.broadcasts += 1
+        text = json.dumps(message)  # Serialized once for all sockets
+        queued_at = monotonic()
+        queued = 0
+        for subscriber in list(subscribers.values()):
+            try:
+                subscriber.queue.put_nowait((text, queued_at))
+                queued += 1
+            except asyncio.QueueFull:
+                if policy == EVICT:
+                    self._evict(subscriber, "queue_full")
+                else:
+                    subscriber.dropped += 1
+                    self.dropped += 1
+                    log.debug("broadcast_dropped", lecture_id=lecture_id, type=message.get("type"), every=5.0)
+        return queued
+
+    def _evict(self, subscriber: _Subscriber, reason: str) -> None:
+        """Remove a socket that can't keep up and close it so the client reconnects."""
+        self.evicted += 1
+        log.info("broadcast_socket_evicted", lecture_id=subscriber.lecture_id, reason=reason,
+                 sent=subscriber.sent, dropped=subscriber.dropped)
+        self.discard(subscriber.lecture_id, subscriber.websocket)
+        asyncio.create_task(self._close(subscriber.websocket))
+
+    @staticmethod
+    async def _close(websocket: WebSocket) -> None:
+        try:
+            await websocket.close(code=EVICT_CLOSE_CODE)
+        except Exception:
+            pass  # Already gone
+
+    async def _writer(self, subscriber: _Subscriber) -> None:
+        """Send a socket's queued messages in order."""
+        while True:
+            text, queued_at = await subscriber.queue.get()
+            try:
+                await asyncio.wait_for(subscriber.websocket.send_text(text), timeout=self.send_timeout)
+            except asyncio.TimeoutError:
+                self._evict(subscriber, "send_timeout")
+                return
+            except Exception:
+                # Disconnected; the endpoint's receive loop notices too
+                self._remove(subscriber)
+                return
+            subscriber.sent += 1
+            self.delivered += 1
+            self._latencies.append(monotonic() - queued_at)
+
+    def latency_percentiles(self) -> Dict[str, float]:
+        """p50/p99 fan-out latency in milliseconds over the recent deliveries."""
+        if not self._latencies:
+            return {'p50_ms': 0.0, 'p99_ms': 0.0}
+        samples = sorted(self._latencies)
+        last = len(samples) - 1
+        return {
+            'p50_ms': round(1000 * samples[int(last * 0.50)], 2),
+            'p99_ms': round(1000 * samples[int(last * 0.99)], 2),
+        }
+
+    def snapshot(self) -> Dict:
+        return {
+            'lectures': {lecture_id: len(subscribers) for lecture_id, subscribers in self._lectures.items()},
+            'broadcasts': self.broadcasts,
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'evicted': self.evicted,
+            **self.latency_percentiles(),
+        }
+
+
+# Student question sockets of this worker
+student_broadcasts = BroadcastHub()
+
+
+def render_broadcast_metrics() -> str:
+    """Prometheus text exposition of the student broadcast hub."""
+    hub = student_broadcasts
+    latency = hub.latency_percentiles()
+    lines = [
+        f"broadcast_sockets {sum(hub.connections(lecture_id) for lecture_id in list(hub._lectures))}",
+        f"broadcast_messages_total {hub.broadcasts}",
+        f"broadcast_delivered_total {hub.delivered}",
+        f"broadcast_dropped_total {hub.dropped}",
+        f"broadcast_evicted_total {hub.evicted}",
+        f'broadcast_fanout_latency_seconds{{quantile="0.5"}} {latency["p50_ms"] / 1000:g}',
+        f'broadcast_fanout_latency_seconds{{quantile="0.99"}} {latency["p99_ms"] / 1000:g}',
+    ]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,99 @@
+"""
+In-process lecture lifecycle events.
+
+Background tasks of a live lecture (the AI question suggestion timer, ...)
+wait on these events instead of polling the database for the lecture's
+status. Routes and the audio handler publish them:
+
+- STARTED / ENDED: the lecture was started or ended
+- PAUSED / RESUMED: the professor's audio connection dropped / came back
+- QUESTION_TRIGGERED: the professor triggered a question (restarts the suggestion window)
+- SUGGESTION_REJECTED: an AI suggestion was rejected (data: delay in seconds)
+
+Events are only delivered within this worker; lecture routes are forwarded
+to the worker that owns the lecture (see app.sharding), so that is where
+its subscribers run.
+"""
+
+from datetime import datetime
+from typing import Dict, Optional, Set
+import asyncio
+
+STARTED = "started"
+PAUSED = "paused"
+RESUMED = "resumed"
+ENDED = "ended"
+QUESTION_TRIGGERED = "question_triggered"
+SUGGESTION_REJECTED = "suggestion_rejected"
+
+
+class LectureEvent:
+    """One published event."""
+
+    __slots__ = ('kind', 'lecture_id', 'data', 'at')
+
+    def __init__(self, kind: str, lecture_id: str, data: Dict):
+        self.kind = kind
+        self.lecture_id = lecture_id
+        self.data = data
+        self.at = datetime.utcnow()
+
+
+class Subscription:
+    """Events for one lecture, in publish order, from the moment of subscribing."""
+
+    def __init__(self, bus: "LectureEventBus", lecture_id: str):
+        self.bus = bus
+        self.lecture_id = lecture_id
+        self._queue: "asyncio.Queue[LectureEvent]" = asyncio.Queue()
+
+    def _deliver(self, event: LectureEvent) -> None:
+        self._queue.put_nowait(event)
+
+    async def next(self, timeout: Optional[float] = None) -> Optional[LectureEvent]:
+        """The next event, or None if none arrives within timeout seconds."""
+        if timeout is None:
+            return await self._queue.get()
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout=max(timeout, 0.0))
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self) -> None:
+        self.bus._unsubscribe(self)
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class LectureEventBus:
+    """Fan-out of lecture events to their subscribers."""
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+
+    def subscribe(self, lecture_id: str) -> Subscription:
+        subscription = Subscription(self, lecture_id)
+        self._subscribers.setdefault(lecture_id, set()).add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._subscribers.get(subscription.lecture_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.lecture_id]
+
+    def publish(self, lecture_id: str, kind: str, **data) -> LectureEvent:
+        """Deliver an event to the lecture's current subscribers (never blocks)."""
+        event = LectureEvent(kind, lecture_id, data)
+        for subscription in list(self._subscribers.get(lecture_id, ())):
+            subscription._deliver(event)
+        return event
+
+
+# Process-wide bus
+lecture_events = LectureEventBus()
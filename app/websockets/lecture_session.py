@@ -0,0 +1,210 @@
+"""
+Live lecture sessions.
+
+All per-lecture state of the professor's audio stream (voice pipeline,
+transcription batch, UI smoothing, question suggestion timer, ...) lives on
+one LectureSession held in a single registry. A session is opened when the
+audio WebSocket connects and closed when it disconnects; closing cancels the
+lecture's background tasks and releases its buffers, so nothing is left
+behind once a lecture is over.
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional
+import asyncio
+import secrets
+
+from app.utils.log import set_lecture_debug
+from ai_assistant.voice_pipeline.transcript_store import TranscriptStore
+
+
+class LectureSession:
+    """Live state of one lecture's audio stream."""
+
+    __slots__ = (
+        'lecture_id', 'professor_id', 'created_at', 'websocket',
+        # Voice pipeline
+        'pipeline', 'stages', 'outbound_queue',
+        # Incoming audio
+        'first_chunk_received', 'webm_decoder', 'pcm_metadata', 'pcm_scratch', 'talk_time', 'audio_archive',
+        # Transcription batching
+        'chunk_count', 'audio_ring', 'batch_chunk_indices', 'accumulated_duration',
+        'chunk_transcripts', 'chunk_metric_indices', 'transcript', 'checkpointer',
+        # Last smoothed metrics sent to the UI
+        'metrics_emitter', 'last_clarity', 'last_pace', 'last_pitch',
+        # AI question suggestions
+        'suggestion_timer', 'question_draft', 'last_question_time', 'rejection_delay',
+        # Lifecycle (a dropped connection leaves the session detached for a grace period)
+        'resume_token', 'acked_seq', 'grace_task', 'expiring', 'ended_event', 'closed',
+    )
+
+    def __init__(self, lecture_id: str, professor_id: Optional[str] = None):
+        self.lecture_id = lecture_id
+        self.professor_id = professor_id
+        self.created_at = datetime.utcnow()
+        self.websocket = None  # Professor's audio WebSocket while connected
+
+        self.pipeline = None  # VoicePipelineManager, set up by the audio handler
+        self.stages = None  # StageGraph of the current connection
+        self.outbound_queue = None  # Its emit stage: messages for the professor's socket
+
+        self.first_chunk_received = False
+        self.webm_decoder = None  # StreamingWebmDecoder for legacy WebM clients
+        self.pcm_metadata: Optional[dict] = None  # Metadata of the binary PCM frame expected next
+        self.pcm_scratch = None  # Reusable float32 buffer incoming PCM is converted into
+        self.talk_time = 0.0  # Seconds of professor speech (from audio chunks)
+        self.audio_archive = None  # AudioArchiveWriter when raw audio archiving is on
+
+        self.chunk_count = 0  # Chunks processed so far (indexes chunk_transcripts)
+        self.audio_ring = None  # AudioRingBuffer holding the current batch, set up by the audio handler
+        self.batch_chunk_indices: List[int] = []
+        self.accumulated_duration = 0.0
+        self.chunk_transcripts: Dict[int, str] = {}
+        self.chunk_metric_indices: Dict[int, int] = {}
+        self.transcript = TranscriptStore()
+        self.checkpointer = None  # TranscriptCheckpointer, started by the audio handler
+
+        self.metrics_emitter = None  # CoalescingEmitter for voice_metrics, set up by the audio handler
+        self.last_clarity: Optional[float] = None
+        self.last_pace: Optional[float] = None
+        self.last_pitch: Optional[float] = None
+
+        self.suggestion_timer: Optional[asyncio.Task] = None
+        self.question_draft: Optional[dict] = None  # {"task", "context", "transcript_len"}
+        self.last_question_time = datetime.utcnow()
+        self.rejection_delay = 0.0  # Extra seconds before the next AI suggestion
+
+        self.resume_token = secrets.token_urlsafe(16)  # Lets the professor's client resume after a drop
+        self.acked_seq = 0  # Last framed audio chunk received (and acknowledged)
+        self.grace_task: Optional[asyncio.Task] = None  # Finishes the session unless reattached in time
+        self.expiring = False  # Grace period over, session being written out
+        self.ended_event = asyncio.Event()  # Set by the end-lecture route so the audio tasks stop
+        self.closed = False
+
+    @property
+    def ended(self) -> bool:
+        """Whether the lecture was ended via the end-lecture route."""
+        return self.ended_event.is_set()
+
+    @property
+    def detached(self) -> bool:
+        """Connection dropped; waiting for the professor to reconnect within the grace period."""
+        return self.grace_task is not None and not self.expiring
+
+    def attach(self, websocket) -> bool:
+        """Make websocket the session's connection. False if the session is already being finished."""
+        if self.expiring:
+            return False
+        if self.grace_task is not None:
+            self.grace_task.cancel()
+            self.grace_task = None
+        self.websocket = websocket
+        return True
+
+    def mark_ended(self) -> None:
+        """Mark the lecture ended; wakes the audio handler so it stops promptly."""
+        self.ended_event.set()
+
+    def reset_batch(self) -> None:
+        """Start a new transcription batch."""
+        if self.audio_ring is not None:
+            self.audio_ring.consume()
+        self.batch_chunk_indices = []
+        self.accumulated_duration = 0.0
+
+    def cancel_question_draft(self) -> None:
+        """Drop any in-flight speculative question."""
+        draft = self.question_draft
+        self.question_draft = None
+        if draft and not draft["task"].done():
+            draft["task"].cancel()
+
+    def cancel_suggestion_timer(self) -> None:
+        """Stop the AI question suggestion timer."""
+        if self.suggestion_timer is not None:
+            self.suggestion_timer.cancel()
+            self.suggestion_timer = None
+
+    def close(self) -> None:
+        """Cancel background work and release buffers (idempotent)."""
+        if self.closed:
+            return
+        self.closed = True
+        self.cancel_suggestion_timer()
+        self.cancel_question_draft()
+        if self.grace_task is not None:
+            self.grace_task.cancel()
+            self.grace_task = None
+        if self.metrics_emitter is not None:
+            self.metrics_emitter.cancel()
+        if self.checkpointer is not None:
+            self.checkpointer.cancel()
+        if self.webm_decoder is not None:
+            self.webm_decoder.close()
+            self.webm_decoder = None
+        if self.audio_archive is not None:
+            self.audio_archive.close()  # Normally already closed off the event loop by the audio handler
+            self.audio_archive = None
+        self.websocket = None
+        self.stages = None
+        self.outbound_queue = None
+        self.pcm_metadata = None
+        self.pcm_scratch = None
+        self.reset_batch()
+        self.audio_ring = None
+        self.chunk_transcripts = {}
+        self.chunk_metric_indices = {}
+
+    def snapshot(self) -> Dict:
+        """JSON-serializable summary of the session (for debugging or hand-off)."""
+        return {
+            "lecture_id": self.lecture_id,
+            "professor_id": self.professor_id,
+            "created_at": self.created_at.isoformat(),
+            "connected": self.websocket is not None,
+            "detached": self.detached,
+            "acked_seq": self.acked_seq,
+            "ended": self.ended,
+            "talk_time": self.talk_time,
+            "transcript": self.transcript.text(),
+            "buffered_seconds": self.accumulated_duration,
+            "stages": self.stages.snapshot() if self.stages is not None else None,
+            "last_metrics": {
+                "clarity": self.last_clarity,
+                "pace": self.last_pace,
+                "pitch": self.last_pitch,
+            },
+            "metrics_frames": {
+                "submitted": self.metrics_emitter.submitted,
+                "sent": self.metrics_emitter.sent,
+            } if self.metrics_emitter is not None else None,
+            "rejection_delay": self.rejection_delay,
+            "last_question_time": self.last_question_time.isoformat(),
+            "sentiment_checkpoints": len(getattr(self.pipeline, "sentiment_history", []) or []),
+        }
+
+
+# Registry of live sessions
+lecture_sessions: Dict[str, LectureSession] = {}  # lecture_id -> LectureSession
+
+
+def get_session(lecture_id: str) -> Optional[LectureSession]:
+    """Get the live session for a lecture, if its audio stream is running."""
+    return lecture_sessions.get(lecture_id)
+
+
+def open_session(lecture_id: str, professor_id: Optional[str] = None) -> LectureSession:
+    """Get the lecture's session, creating it if needed."""
+    session = lecture_sessions.get(lecture_id)
+    if session is None or session.closed:
+        session = LectureSession(lecture_id, professor_id)
+        lecture_sessions[lecture_id] = session
+    return session
+
+
+def close_session(session: LectureSession) -> None:
+    """Tear down a session and remove it from the registry."""
+    session.close()
+    if lecture_sessions.get(session.lecture_id) is session:
+        del lecture_sessions[session.lecture_id]
+        set_lecture_debug(session.lecture_id, False)
@@ -0,0 +1,80 @@
+"""
+Coalescing, rate-limited emitter for live metric updates.
+
+Voice metrics are produced per audio chunk and again for every chunk of a
+transcription batch when Whisper returns. The UI only shows the latest
+values, so updates are coalesced: the first one after a quiet period goes
+out at once, later ones within VOICE_METRICS_INTERVAL replace each other
+and only the last is sent when the interval ends.
+"""
+
+from typing import Any, Callable, Optional
+import asyncio
+import os
+import time
+
+from app.utils.log import get_logger
+
+log = get_logger(__name__)
+
+VOICE_METRICS_INTERVAL = float(os.getenv("VOICE_METRICS_INTERVAL", "1.0"))  # seconds between frames
+
+
+class CoalescingEmitter:
+    """Sends at most one update per interval, always the most recent one."""
+
+    def __init__(self, send: Callable[[Any], None], interval: float = VOICE_METRICS_INTERVAL):
+        """
+        Args:
+            send: Called with the update to send (synchronously, from the event loop)
+            interval: Minimum seconds between two sends
+        """
+        self.send = send
+        self.interval = interval
+        self.submitted = 0
+        self.sent = 0
+        self._pending: Any = None
+        self._has_pending = False
+        self._last_sent = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def submit(self, update: Any) -> None:
+        """Offer an update; it replaces any update still waiting to be sent."""
+        self.submitted += 1
+        self._pending = update
+        self._has_pending = True
+        if self._timer is not None:
+            return  # A send is already scheduled; it will pick this update up
+        wait = self._last_sent + self.interval - time.monotonic()
+        if wait <= 0:
+            self._flush()
+        else:
+            self._timer = asyncio.get_running_loop().call_later(wait, self._flush)
+
+    def _flush(self) -> None:
+        self._timer = None
+        if not self._has_pending:
+            return
+        update = self._pending
+        self._pending = None
+        self._has_pending = False
+        self._last_sent = time.monotonic()
+        self.sent += 1
+        try:
+            self.send(update)
+        except Exception as e:
+            log.warning("metrics_send_failed", error=e, every=5.0)
+
+    def flush(self) -> None:
+        """Send a waiting update now (e.g. before disconnecting)."""
+        if self._timer is not None:
+            self._timer.cancel()
+        self._flush()
+
+    def cancel(self) -> None:
+        """Drop any waiting update."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._pending = None
+        self._has_pending = False
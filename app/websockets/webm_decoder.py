@@ -0,0 +1,140 @@
+"""
+Streaming WebM/Opus decoder for the legacy `audio_chunk` path.
+
+MediaRecorder sends one WebM stream cut into timeslices: only the first
+chunk carries the container header, the rest are continuation segments.
+Instead of spawning ffmpeg (and two temp files) per chunk, each lecture
+keeps one ffmpeg process alive and feeds it the stream over stdin; decoded
+mono float32 PCM is read back from stdout as it is produced.
+"""
+
+from typing import Optional
+import asyncio
+import glob
+import os
+import shutil
+
+import numpy as np
+
+from app.utils.log import get_logger
+
+log = get_logger(__name__)
+
+DECODE_WAIT_SECONDS = 0.25  # how long decode() waits for ffmpeg to emit the chunk's samples
+READ_SIZE = 65536
+
+# Common Windows install locations, checked when ffmpeg is not on PATH
+_FFMPEG_CANDIDATES = [
+    r"C:\ffmpeg\bin\ffmpeg.exe",
+    r"C:\Program Files\ffmpeg\bin\ffmpeg.exe",
+    r"C:\Program Files (x86)\ffmpeg\bin\ffmpeg.exe",
+    os.path.expanduser(r"~\AppData\Local\Microsoft\WinGet\Packages\Gyan.FFmpeg*\ffmpeg*\bin\ffmpeg.exe"),
+    os.path.expanduser(r"~\AppData\Local\ffmpeg\bin\ffmpeg.exe"),
+]
+
+
+def find_ffmpeg() -> Optional[str]:
+    """Locate the ffmpeg executable (PATH first, then common install locations)."""
+    path = shutil.which("ffmpeg")
+    if path:
+        return path
+    for candidate in _FFMPEG_CANDIDATES:
+        if "*" in candidate:
+            matches = glob.glob(candidate)
+            if matches:
+                return matches[0]
+        elif os.path.exists(candidate):
+            return candidate
+    return None
+
+
+class StreamingWebmDecoder:
+    """One long-running ffmpeg process decoding a lecture's WebM stream to PCM."""
+
+    def __init__(self, sample_rate: int):
+        self.sample_rate = sample_rate
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self._pcm = bytearray()
+        self._output = asyncio.Event()
+        self._reader: Optional[asyncio.Task] = None
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def start(self) -> bool:
+        """Start ffmpeg. Returns False if ffmpeg is not available."""
+        ffmpeg = find_ffmpeg()
+        if ffmpeg is None:
+            return False
+        try:
+            self.process = await asyncio.create_subprocess_exec(
+                ffmpeg, "-hide_banner", "-loglevel", "error",
+                "-fflags", "nobuffer", "-f", "webm", "-i", "pipe:0",
+                "-ac", "1", "-ar", str(self.sample_rate),
+                "-f", "f32le", "-flush_packets", "1", "pipe:1",
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+        except (OSError, NotImplementedError) as e:
+            # NotImplementedError: event loop without subprocess support (e.g. Windows selector loop)
+            log.warning("webm_decoder_start_failed", error=e, every=60.0)
+            return False
+        self._reader = asyncio.create_task(self._read_stdout())
+        return True
+
+    async def _read_stdout(self) -> None:
+        while True:
+            data = await self.process.stdout.read(READ_SIZE)
+            if not data:
+                self._output.set()
+                return
+            self._pcm += data
+            self._output.set()
+
+    def take(self) -> np.ndarray:
+        """Return (and consume) all samples decoded so far."""
+        usable = len(self._pcm) - len(self._pcm) % 4
+        if usable == 0:
+            return np.array([], dtype=np.float32)
+        audio = np.frombuffer(bytes(self._pcm[:usable]), dtype=np.float32)
+        del self._pcm[:usable]
+        return audio
+
+    async def decode(self, chunk: bytes) -> np.ndarray:
+        """
+        Feed one WebM segment and return the samples decoded so far.
+
+        Opus frames straddling a segment boundary come out with the next call,
+        so the returned length varies slightly around the chunk duration.
+
+        Raises:
+            ConnectionError: If ffmpeg has exited (e.g. on a corrupt stream)
+        """
+        if not self.alive:
+            raise ConnectionError("WebM decoder is not running")
+        self._output.clear()
+        self.process.stdin.write(chunk)
+        await self.process.stdin.drain()
+        try:
+            await asyncio.wait_for(self._output.wait(), timeout=DECODE_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            pass  # Not enough data for a full Opus frame yet
+        return self.take()
+
+    def close(self) -> None:
+        """Stop ffmpeg (safe to call from synchronous cleanup)."""
+        if self._reader is not None:
+            self._reader.cancel()
+            self._reader = None
+        if self.alive:
+            try:
+                self.process.stdin.close()
+            except Exception:
+                pass
+            try:
+                self.process.kill()
+            except ProcessLookupError:
+                pass
+        self._pcm.clear()
@@ -255,6 +255,25 @@ CREATE TABLE IF NOT EXISTS lecture_reports (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Extracted slide text per lecture (source for the slide retrieval index)
+CREATE TABLE IF NOT EXISTS lecture_slides (
+    lecture_id UUID NOT NULL REFERENCES lectures(lecture_id) ON DELETE CASCADE,
+    slide_number INTEGER NOT NULL,
+    content TEXT NOT NULL DEFAULT '',
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (lecture_id, slide_number)
+);
+
+-- Live transcript checkpoints (one row per transcription batch, written during the lecture)
+CREATE TABLE IF NOT EXISTS lecture_transcript_segments (
+    lecture_id UUID NOT NULL REFERENCES lectures(lecture_id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    started_at TIMESTAMP WITH TIME ZONE,
+    ended_at TIMESTAMP WITH TIME ZONE,
+    PRIMARY KEY (lecture_id, seq)
+);
+
 -- ============================================
 -- Indexes for Performance
 -- ============================================
@@ -5,6 +5,28 @@ import { motion, AnimatePresence } from 'framer-motion';
 import { useAuth } from '../../context/AuthContext';
 import { lecturesAPI, classesAPI, questionsAPI } from '../../services/api';
 
+// Single-frame audio protocol (see app/websockets/audio_protocol.py):
+// 16-byte little-endian header (version, flags, header size, seq, sample rate, sample count) + Int16 PCM
+const AUDIO_FRAME_VERSION = 1;
+const AUDIO_FRAME_HEADER_SIZE = 16;
+const AUDIO_FRAME_FLAG_FINAL = 0x01;
+// Resumption: unacknowledged frames are kept (up to ~60s of 0.5s chunks) and resent after a reconnect
+const AUDIO_RESEND_MAX_FRAMES = 120;
+const AUDIO_RECONNECT_DELAYS_MS = [500, 1000, 2000, 4000, 8000, 8000, 8000];
+
+const buildAudioFrame = (seq, sampleRate, pcmArray, flags = 0) => {
+  const frame = new ArrayBuffer(AUDIO_FRAME_HEADER_SIZE + pcmArray.byteLength);
+  const header = new DataView(frame);
+  header.setUint8(0, AUDIO_FRAME_VERSION);
+  header.setUint8(1, flags);
+  header.setUint16(2, AUDIO_FRAME_HEADER_SIZE, true);
+  header.setUint32(4, seq, true);
+  header.setUint32(8, sampleRate, true);
+  header.setUint32(12, pcmArray.length, true);
+  new Uint8Array(frame, AUDIO_FRAME_HEADER_SIZE).set(new Uint8Array(pcmArray.buffer, pcmArray.byteOffset, pcmArray.byteLength));
+  return frame;
+};
+
 const LiveLecture = () => {
   const navigate = useNavigate();
   const { lectureId } = useParams();
@@ -375,20 +397,71 @@ const LiveLecture = () => {
         return;
       }
       const wsUrl = `ws://localhost:8000/audio/stream/${lectureId}?professor_id=${professorId}`;
-      const ws = new WebSocket(wsUrl);
-      ws.binaryType = 'arraybuffer'; // Enable binary data support for PCM
-      wsRef.current = ws;
+      let ws = null;
+      // Framed protocol version acknowledged by the server (null = legacy metadata + binary messages)
+      let frameVersion = null;
+      // Sequence number of the last transcript segment appended (updates are deltas)
+      let transcriptSeq = 0;
+      // Resumption state: token from hello_ack and the framed chunks the server hasn't acknowledged yet
+      let sessionToken = null;
+      let unackedFrames = []; // [{ seq, frame }] in sequence order
+      let reconnectAttempt = 0;
+      let reconnectTimer = null;
+      let isStillRecording = true;
+      
+      const dropAckedFrames = (seq) => {
+        unackedFrames = unackedFrames.filter(entry => entry.seq > seq);
+      };
+      
+      const connect = () => {
+        ws = new WebSocket(wsUrl);
+        ws.binaryType = 'arraybuffer'; // Enable binary data support for PCM
+        wsRef.current = ws;
+        ws.onopen = handleOpen;
+        ws.onmessage = handleMessage;
+        ws.onerror = handleError;
+        ws.onclose = handleClose;
+      };
       
-      ws.onopen = () => {
+      const handleOpen = () => {
         console.log('✅ WebSocket connected');
         setIsConnected(true);
+        reconnectAttempt = 0;
+        // After a drop, the token lets the server reattach this stream to the live session
+        ws.send(JSON.stringify({
+          type: 'hello',
+          protocol: 'pcm-frame',
+          versions: [AUDIO_FRAME_VERSION],
+          ...(sessionToken ? { resume_token: sessionToken } : {})
+        }));
       };
       
-      ws.onmessage = (event) => {
+      const handleMessage = (event) => {
         try {
           const data = JSON.parse(event.data);
           console.log('📊 Received WebSocket message:', data);
           
+          // Audio protocol negotiation
+          if (data.type === 'hello_ack') {
+            frameVersion = data.protocol === 'pcm-frame' ? data.version : null;
+            sessionToken = data.session_token || null;
+            if (data.resumed) {
+              // Resend what the server didn't get before the drop, with the original sequence numbers
+              dropAckedFrames(data.ack_seq);
+              unackedFrames.forEach(entry => ws.send(entry.frame));
+              console.log(`🔁 Resumed audio session, resent ${unackedFrames.length} chunk(s) after #${data.ack_seq}`);
+            } else {
+              // New server session: chunks from before can't be attached to it
+              unackedFrames = [];
+            }
+            return;
+          }
+          
+          if (data.type === 'audio_ack') {
+            dropAckedFrames(data.seq);
+            return;
+          }
+          
           // Update voice metrics (from AI assistant backend)
           if (data.type === 'voice_metrics' && data.metrics) {
             console.log('✅ Updating voice metrics:', data.metrics);
@@ -413,8 +486,12 @@ const LiveLecture = () => {
           // Update live transcription
           if (data.type === 'transcript_update') {
             console.log('📝 Received transcript update:', data);
-            if (data.transcript) {
-              setTranscript(data.transcript);
+            if (data.seq !== transcriptSeq + 1) {
+              // Missed a segment (or joined late) - ask for the full transcript
+              ws.send(JSON.stringify({ type: 'transcript_resync' }));
+            } else if (data.new_segment) {
+              transcriptSeq = data.seq;
+              setTranscript(prev => (prev ? `${prev} ${data.new_segment}` : data.new_segment));
             }
             // Add new segment to transcript segments for animation
             if (data.new_segment) {
@@ -427,6 +504,12 @@ const LiveLecture = () => {
             }
           }
           
+          // Full transcript after a resync request
+          if (data.type === 'transcript_resync') {
+            transcriptSeq = data.seq;
+            setTranscript(data.transcript || '');
+          }
+          
           // Update AI feedback (sentiment analysis, tone, engagement)
           if (data.type === 'ai_feedback' && data.feedback) {
             const feedback = data.feedback;
@@ -447,16 +530,24 @@ const LiveLecture = () => {
         }
       };
       
-      ws.onerror = (error) => {
+      const handleError = (error) => {
         console.error('❌ WebSocket error:', error);
         setIsConnected(false);
       };
       
-      ws.onclose = () => {
+      const handleClose = (event) => {
         console.log('🔌 WebSocket disconnected');
         setIsConnected(false);
+        // Dropped mid-recording: reconnect while the server still holds the session
+        if (isStillRecording && event.code !== 1000 && reconnectAttempt < AUDIO_RECONNECT_DELAYS_MS.length) {
+          const delay = AUDIO_RECONNECT_DELAYS_MS[reconnectAttempt++];
+          console.log(`🔁 Reconnecting audio stream in ${delay}ms (attempt ${reconnectAttempt})`);
+          reconnectTimer = setTimeout(connect, delay);
+        }
       };
       
+      connect();
+      
       // Setup ScriptProcessor for real-time PCM capture (replaces MediaRecorder)
       // ScriptProcessor is deprecated but widely supported; AudioWorklet is preferred but needs separate file
       // Buffer size: 4096 samples = ~0.25 seconds at 16kHz (good balance between latency and performance)
@@ -476,14 +567,44 @@ const LiveLecture = () => {
       
       // Track chunk count and buffer for batching
       let chunkCount = 0;
-      let isStillRecording = true;
       const pcmBuffer = []; // Buffer to accumulate PCM data before sending
       const bufferDuration = 0.5; // Send PCM chunks every 0.5 seconds (500ms)
       const bufferSampleCount = Math.floor(targetSampleRate * bufferDuration); // Samples per buffer
       
+      // Send one PCM chunk: a single frame if the server speaks the framed protocol, else metadata + binary.
+      // Frames are kept until acknowledged (and only queued while reconnecting)
+      const sendPcmChunk = (pcmArray, index, isFinal = false) => {
+        if (frameVersion) {
+          const frame = buildAudioFrame(index, targetSampleRate, pcmArray, isFinal ? AUDIO_FRAME_FLAG_FINAL : 0);
+          unackedFrames.push({ seq: index, frame });
+          if (unackedFrames.length > AUDIO_RESEND_MAX_FRAMES) {
+            unackedFrames.shift();
+          }
+          if (ws.readyState === WebSocket.OPEN) {
+            ws.send(frame);
+          }
+          return;
+        }
+        if (ws.readyState !== WebSocket.OPEN) {
+          return; // Legacy format can't be resumed
+        }
+        ws.send(JSON.stringify({
+          type: 'audio_chunk_pcm',
+          sample_rate: targetSampleRate,
+          samples: pcmArray.length,
+          duration: pcmArray.length / targetSampleRate,
+          timestamp: Date.now(),
+          chunk_index: index,
+          format: 'pcm_int16',
+          ...(isFinal ? { is_final: true } : {})
+        }));
+        ws.send(pcmArray.buffer);
+      };
+      
       // Process audio data in real-time
       scriptProcessor.onaudioprocess = (event) => {
-        if (!isStillRecording || ws.readyState !== WebSocket.OPEN) {
+        // Keep capturing while a framed stream reconnects; the chunks are resent on resume
+        if (!isStillRecording || (ws.readyState !== WebSocket.OPEN && !frameVersion)) {
           return;
         }
         
@@ -511,23 +632,9 @@ const LiveLecture = () => {
             const pcmArray = new Int16Array(pcmBuffer.splice(0, bufferSampleCount));
             const pcmBytes = pcmArray.buffer;
             
-            // Send PCM data as binary with metadata
-            // Use ArrayBuffer directly for binary WebSocket transmission (more efficient than base64)
-            // We'll send metadata separately via JSON, then binary data
+            // Send PCM data as binary (more efficient than base64)
             try {
-              // Send metadata first (JSON)
-              ws.send(JSON.stringify({
-                type: 'audio_chunk_pcm',
-                sample_rate: targetSampleRate,
-                samples: pcmArray.length,
-                duration: pcmArray.length / targetSampleRate,
-                timestamp: Date.now(),
-                chunk_index: chunkCount,
-                format: 'pcm_int16'
-              }));
-              
-              // Send PCM binary data (ArrayBuffer)
-              ws.send(pcmBytes);
+              sendPcmChunk(pcmArray, chunkCount);
               
               console.log(`✅ Sent PCM chunk #${chunkCount}: ${pcmArray.length} samples (${(pcmArray.length / targetSampleRate).toFixed(2)}s, ${pcmBytes.byteLength} bytes)`);
             } catch (error) {
@@ -549,25 +656,14 @@ const LiveLecture = () => {
       // Cleanup function
       const stopFunction = () => {
         isStillRecording = false;
+        clearTimeout(reconnectTimer);
         
         // Send any remaining buffered PCM data
         if (pcmBuffer.length > 0 && ws.readyState === WebSocket.OPEN) {
           try {
             const remainingPcm = new Int16Array(pcmBuffer);
-            const remainingBytes = remainingPcm.buffer;
-            
-            ws.send(JSON.stringify({
-              type: 'audio_chunk_pcm',
-              sample_rate: targetSampleRate,
-              samples: remainingPcm.length,
-              duration: remainingPcm.length / targetSampleRate,
-              timestamp: Date.now(),
-              chunk_index: chunkCount + 1,
-              format: 'pcm_int16',
-              is_final: true
-            }));
             
-            ws.send(remainingBytes);
+            sendPcmChunk(remainingPcm, chunkCount + 1, true);
             pcmBuffer.length = 0; // Clear buffer
             console.log(`✅ Sent final PCM chunk: ${remainingPcm.length} samples`);
           } catch (error) {
@@ -634,7 +730,8 @@ const LiveLecture = () => {
     }
     
     if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
-      wsRef.current.close();
+      // Normal closure tells the server not to hold the session for a reconnect
+      wsRef.current.close(1000, 'recording stopped');
     }
     
     if (audioContextRef.current && audioContextRef.current.state !== 'closed') {